@@ -0,0 +1,29 @@
+"""
+run all benchmarks: python -m benchmarks [--json results.json]
+
+compare the json output between commits to spot regressions.
+"""
+import argparse
+import json
+
+from . import bench_e2e, bench_protocol
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="mipc_camera_client benchmarks")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument(
+        "--snapshots", type=int, default=500, help="get_image calls in the load test"
+    )
+    args = parser.parse_args()
+
+    results = bench_protocol.run() + bench_e2e.run(args.snapshots)
+    for result in results:
+        print(result)
+    if args.json:
+        with open(args.json, "w") as fd:
+            json.dump([r._asdict() for r in results], fd, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""shared timing/allocation helpers for the benchmarks"""
+import statistics
+import time
+import tracemalloc
+from typing import Callable, List, NamedTuple
+
+
+class Result(NamedTuple):
+    name: str
+    calls: int
+    ops_per_s: float
+    p50_us: float
+    p99_us: float
+    peak_alloc_bytes: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:36s} {self.ops_per_s:12,.0f}/s "
+            f"p50 {self.p50_us:9.2f}us  p99 {self.p99_us:9.2f}us  "
+            f"peak alloc {self.peak_alloc_bytes:8,d}B"
+        )
+
+
+def _percentile(sorted_samples: List[float], pct: float) -> float:
+    idx = min(len(sorted_samples) - 1, int(len(sorted_samples) * pct / 100))
+    return sorted_samples[idx]
+
+
+def _peak_alloc(fn: Callable[[], object], calls: int) -> int:
+    """median of the per-call tracemalloc peak, i.e. how much one call allocates at most"""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def measure(
+    name: str,
+    fn: Callable[[], object],
+    calls: int = 10_000,
+    warmup: int = 100,
+    max_seconds: float = 1.0,
+) -> Result:
+    """call `fn` up to `calls` times (or for `max_seconds`, whichever comes first)"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    clock = time.perf_counter_ns
+    started = clock()
+    deadline = started + max_seconds * 1e9
+    while len(samples) < calls:
+        t0 = clock()
+        fn()
+        t1 = clock()
+        samples.append(t1 - t0)
+        if t1 > deadline:
+            break
+    elapsed = clock() - started
+    calls = len(samples)
+    samples.sort()
+    return Result(
+        name=name,
+        calls=calls,
+        ops_per_s=calls / (elapsed / 1e9),
+        p50_us=_percentile(samples, 50) / 1e3,
+        p99_us=_percentile(samples, 99) / 1e3,
+        peak_alloc_bytes=_peak_alloc(fn, min(calls, 200)),
+    )
@@ -0,0 +1,42 @@
+"""
+end-to-end load test: log in to an in-process fake camera and pull N snapshots.
+
+    python -m benchmarks.bench_e2e [N]
+"""
+import sys
+from typing import List
+
+from mipc_camera_client import MipcCameraClient
+from tests.fake_camera import FakeCamera
+
+from ._harness import Result, measure
+
+
+def run(snapshots: int = 500) -> List[Result]:
+    with FakeCamera() as camera:
+        # a realistic-ish 100 KiB frame so body handling shows up in the numbers
+        camera.jpeg = camera.jpeg[:-2] + bytes(100 * 1024) + b"\xff\xd9"
+
+        def login():
+            c = MipcCameraClient(camera.host)
+            c.login(camera.username, camera.password)
+            return c
+
+        results = [
+            measure(
+                "login (dh + cacs_login_req)", login, calls=50, warmup=5, max_seconds=5
+            )
+        ]
+        client = login()
+        snaps = measure(
+            "get_image", client.get_image, calls=snapshots, warmup=10, max_seconds=10
+        )
+        results.append(snaps)
+        mb = snaps.ops_per_s * len(camera.jpeg) / 2**20
+        print(f"get_image throughput ~{mb:.1f} MiB/s", file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    for result in run(int(sys.argv[1]) if len(sys.argv) > 1 else 500):
+        print(result)
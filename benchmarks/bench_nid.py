@@ -0,0 +1,34 @@
+"""
+microbenchmark: js-emulating format_nid vs the bytes-based NidEncoder.
+
+    python -m benchmarks.bench_nid
+"""
+import timeit
+
+from mipc_camera_client.crypto_helpers import NidEncoder, format_nid
+
+SID = "0x1e"
+SECRET = "703713319380997337899942106288320558"
+
+
+def main(number: int = 20_000) -> None:
+    encoder = NidEncoder(SID, SECRET, 0)
+    assert encoder(492) == format_nid(492, SID, SECRET, 0, None, None)
+    assert encoder._fast
+
+    cases = {
+        "format_nid (js emulation)": lambda: format_nid(
+            492, SID, SECRET, 0, None, None
+        ),
+        "NidEncoder (per call)": lambda: NidEncoder(SID, SECRET, 0)(492),
+        "NidEncoder (per session)": lambda: encoder(492),
+    }
+    baseline = None
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        baseline = baseline or best
+        print(f"{name:28s} {best * 1e6:8.2f} us/call  {baseline / best:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
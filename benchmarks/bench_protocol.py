@@ -0,0 +1,64 @@
+"""
+microbenchmarks for the per-request protocol work: nid, "base64", DES and JSONP parsing.
+
+    python -m benchmarks.bench_protocol
+"""
+from typing import List
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.crypto_helpers import (
+    NidEncoder,
+    _encode_magic,
+    des_encrypt_password_hash,
+    format_nid,
+    str_2_b64,
+)
+
+from ._harness import Result, measure
+
+SID = "0x1e"
+SECRET = "703713319380997337899942106288320558"
+PASSWORD_HASH = "935147339ce7ac869200843edf680e52"
+MD5_HEX = "0x0123456789abcdef0123456789abcdef"
+# what cacs_login_ack / ccm_info_get_ack look like on the wire
+LOGIN_ACK = (
+    "message({type:'cacs_login_ack',data:{result:'',sid:'0x1e',seq:1,"
+    "lid:'0x4c',addr:'192.168.1.10'}});"
+)
+INFO_ACK = (
+    "message({type:'ccm_info_get_ack',data:{sn:'1jfiegbq1234',model:'C6F0SgZ3N0PmL2',"
+    "fw:'v5.4.5.2301161410',spv:'v1',wifi_mac:'aa:bb:cc:dd:ee:ff',"
+    "p:[{n:'s.mode',v:'day'},{n:'s.flip',v:'0'}]}});"
+)
+
+
+def run(calls: int = 5_000) -> List[Result]:
+    encoder = NidEncoder(SID, SECRET, 0)
+    cases = {
+        "format_nid": lambda: format_nid(492, SID, SECRET, 0, None, None),
+        "NidEncoder": lambda: encoder(492),
+        "str_2_b64": lambda: str_2_b64("0" + "x" * 30, 1),
+        "_encode_magic (hex)": lambda: _encode_magic(MD5_HEX),
+        "_encode_magic (int)": lambda: _encode_magic(492),
+        "des_encrypt_password_hash": lambda: des_encrypt_password_hash(
+            PASSWORD_HASH, SECRET
+        ),
+        "_parse_jsonp json5 (login ack)": lambda: MipcCameraClient._parse_jsonp(
+            LOGIN_ACK, "json5"
+        ),
+        "_parse_jsonp fast (login ack)": lambda: MipcCameraClient._parse_jsonp(
+            LOGIN_ACK, "fast"
+        ),
+        "_parse_jsonp json5 (info ack)": lambda: MipcCameraClient._parse_jsonp(
+            INFO_ACK, "json5"
+        ),
+        "_parse_jsonp fast (info ack)": lambda: MipcCameraClient._parse_jsonp(
+            INFO_ACK, "fast"
+        ),
+    }
+    return [measure(name, fn, calls=calls) for name, fn in cases.items()]
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
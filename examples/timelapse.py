@@ -6,9 +6,9 @@ aka timelapse mode. Set CAMERA_HOST, CAMERA_USER and CAMERA_PASSWORD, and run.
 import datetime
 import os
 from pathlib import Path
-import time
 
 from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.grabber import FrameGrabber
 
 camera_ip = os.environ["CAMERA_HOST"]
 camera_user = os.environ["CAMERA_USER"]
@@ -19,22 +19,26 @@ c.login(camera_user, os.environ["CAMERA_PASSWORD"])
 # stop taking pictures in 2 hours from now
 stop_time = datetime.datetime.now() + datetime.timedelta(hours=2)
 # take a picture every 5 seconds
-sleep_interval = datetime.timedelta(seconds=5)
+interval = datetime.timedelta(seconds=5)
 
-def _generate_filename():
-    """Generate filename based on camera serial number and current timestamp"""
-    now = datetime.datetime.now(datetime.timezone.utc)
-    timestamp_str = now.strftime("%Y-%m-%dT%H-%M-%S.%f%Z")
+
+def _generate_filename(timestamp: float):
+    """Generate filename based on camera serial number and capture timestamp"""
+    when = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    timestamp_str = when.strftime("%Y-%m-%dT%H-%M-%S.%f%Z")
     return f"{timestamp_str}_{c.get_device_sn()}.jpeg"
 
+
 # Create an output directory
 output_dir = Path("pictures/")
 output_dir.mkdir(exist_ok=True)
 
-while datetime.datetime.now() <= stop_time:
-    print("taking snapshot... ", end='')
-    jpeg_data = c.get_image()
-    snapshot_path = output_dir / _generate_filename()
-    snapshot_path.write_bytes(jpeg_data)
-    print(f"saved to {snapshot_path}")
-    time.sleep(sleep_interval.seconds)
+# the grabber keeps a fixed 5s rhythm no matter how long each request takes
+with FrameGrabber(c, fps=1 / interval.total_seconds()) as grabber:
+    for frame in grabber:
+        snapshot_path = output_dir / _generate_filename(frame.timestamp)
+        snapshot_path.write_bytes(frame.data)
+        print(f"saved to {snapshot_path} (took {frame.latency:.2f}s)")
+        if datetime.datetime.now() > stop_time:
+            break
+    print(grabber.stats)
@@ -1,8 +1,11 @@
 import logging
 import pprint
-from typing import Literal, Union
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, Literal, Optional, Tuple, Union
 
-import json5
 import requests
 from .crypto_helpers import (
     des_encrypt_password_hash,
@@ -10,45 +13,84 @@ from .crypto_helpers import (
     dh_gen_public,
     dh_req_data,
     dh_shared_secret,
-    format_nid,
     hash_password,
+    NidEncoder,
 )
+from .jsonp import JsonpParser, loads as _loads_jsonp
+from .metrics import MetricsHook, RequestEvent
+from .session_cache import SessionCache
+from .singleflight import SingleFlight
+from .throttle import Throttle
+from .transport import Timeout, Transport
 
 LOGGER = logging.getLogger(__name__)
 
 JSONP_PREFIX = "message("
 
-__all__ = ["MipcCameraClient"]
+# how much of the JPEG body is read at a time when streaming snapshots
+IMAGE_CHUNK_SIZE = 64 * 1024
 
+# a ccm_* response with data.result like err.sess.invalid or err.nid.expired means our
+# nid/sid isn't accepted anymore. Whole tokens only, err.params.invalid is an ordinary error
+SESSION_ERROR_RE = re.compile(
+    r"^err\.(sess|session|nid|sid|lid|tid|auth|login|user|pass|passwd)(\.|$)",
+    re.IGNORECASE,
+)
+
+# requests that set up the session, never retried with a new login
+LOGIN_MSG_TYPES = ("cacs_dh_req", "cacs_login_req")
+
+# requests that aren't safe to repeat once the camera may have received them,
+# these are only retried when we couldn't even connect
+NON_IDEMPOTENT_MSG_TYPES = ("ccm_ptz_ctl",)
+
+# seqs reserved at a time from the session cache, processes sharing a cached
+# session each take their own blocks so their nids never repeat
+SEQ_BLOCK = 256
+
+__all__ = ["MipcCameraClient", "SessionExpiredError"]
+
+
+class SessionExpiredError(Exception):
+    """the camera rejected our session (rebooted, timed out, logged in elsewhere...)"""
+
+
+class _MipcCameraClientBase:
+    """Session state and request building shared by the sync and async clients.
 
-class MipcCameraClient:
-    """HTTP Client for MIPC-compatible cameras."""
+    Nothing in here does any I/O, subclasses provide `run_rpc` and the public API."""
 
     _sn: Union[str, None]
 
-    def __init__(self, host: str) -> None:
+    def __init__(self, host: str, jsonp_parser: JsonpParser = "fast") -> None:
         self.tid = 0
         self.sid = ""
         self.lid = ""
         self.seq = 0
+        # the seq can't go past this without reserving more, None when it's ours alone
+        self._seq_limit: Optional[int] = None
         self._sn = None
         self.shared_secret = None
         self.host = host
+        self.jsonp_parser = jsonp_parser
+        self._nid_encoders = {}
+        # guards seq and the nid encoders, requests from several threads take nids
+        self._nid_lock = threading.Lock()
+        # bumped on every login, so concurrent requests rejected with the same
+        # session only log in again once
+        self._session_generation = 0
+        self.metrics: Optional[MetricsHook] = None
         self.init_keys()
-        self._r: requests.Session = requests.Session()
 
     def __repr__(self) -> str:
-        return f"MipcCameraClient(host={repr(self.host)})"
+        return f"{type(self).__name__}(host={repr(self.host)})"
 
     def init_keys(self, priv_key=None) -> None:
         self.priv_key = priv_key or dh_gen_private()
         self.pub_key = dh_gen_public(self.priv_key)
 
-    def run_dh(self) -> None:
-        dh_resp = self.run_rpc("cacs_dh_req", dh_req_data(self.pub_key, self.tid))
-
-        resp_data = dh_resp["data"]
-        self._handle_dh_ack(resp_data)
+    def _dh_req_data(self):
+        return dh_req_data(self.pub_key, self.tid)
 
     def _handle_dh_ack(self, resp_data) -> None:
         self.shared_secret = dh_shared_secret(resp_data["key_b2a"], self.priv_key)
@@ -58,17 +100,29 @@ class MipcCameraClient:
     def nid(self) -> str:
         return self._create_nid_ex(0)
 
+    def _reserve_seq(self) -> None:
+        """called with `_nid_lock` held when the seq reached `_seq_limit`"""
+        self._seq_limit = None
+
     def _create_nid_ex(self, nid_type, incr_seq=True):
-        if incr_seq:
-            self.seq += 1
-        return format_nid(
-            self.seq,
-            self.lid if nid_type > 0 else self.sid,
-            str(self.shared_secret),
-            nid_type,
-            None,
-            None,
-        )
+        with self._nid_lock:
+            if incr_seq:
+                if self._seq_limit is not None and self.seq >= self._seq_limit:
+                    self._reserve_seq()
+                self.seq += 1
+            seq = self.seq
+            # everything but the seq is constant for the session, so encoders are reused
+            key = (
+                self.lid if nid_type > 0 else self.sid,
+                str(self.shared_secret),
+                nid_type,
+            )
+            encoder = self._nid_encoders.get(key)
+            if encoder is None:
+                if len(self._nid_encoders) > 8:
+                    self._nid_encoders.clear()
+                encoder = self._nid_encoders[key] = NidEncoder(*key)
+        return encoder(seq)
 
     def _login_data(self, username, password, incr_nid=True):
         data = {
@@ -99,110 +153,482 @@ class MipcCameraClient:
         self.seq = data["seq"]
         self.lid = data["lid"]
         self.client_addr = data["addr"]
+        self.logged_in_at = time.time()
+        self._session_generation += 1
 
-    def run_rpc(self, msg_type, data, response_type="js"):
-        query_params = data
+    def _session_state(self) -> Dict[str, Any]:
+        return {
+            "priv_key": self.priv_key,
+            "shared_secret": self.shared_secret,
+            "tid": self.tid,
+            "lid": self.lid,
+            "sid": self.sid,
+            "seq": self.seq,
+            "sn": self._sn,
+            "created_at": self.logged_in_at,
+        }
 
-        LOGGER.debug(
-            f"{self.host=} {msg_type=} data={pprint.pformat(data, compact=True)}"
-        )
-        resp = self._r.request(
-            method="GET",
-            url=f"http://{self.host}/ccm/{msg_type}.{response_type}",
-            params=query_params,
+    def _restore_session(self, state: Dict[str, Any]) -> None:
+        self.init_keys(state["priv_key"])
+        self.shared_secret = state["shared_secret"]
+        self.tid = state["tid"]
+        self.lid = state["lid"]
+        self.sid = state["sid"]
+        self.seq = state["seq"]
+        self._seq_limit = self.seq + SEQ_BLOCK
+        self._sn = state["sn"]
+        self.logged_in_at = state["created_at"]
+        self._session_generation += 1
+
+    def _reset_session(self) -> None:
+        self.init_keys()
+        self.shared_secret = None
+        self.tid = 0
+        self.sid = ""
+        with self._nid_lock:
+            self._nid_encoders.clear()
+            self._seq_limit = None
+
+    def _check_session(self, msg_type, parsed) -> None:
+        if msg_type in LOGIN_MSG_TYPES or not isinstance(parsed, dict):
+            return
+        data = parsed.get("data")
+        result = data.get("result") if isinstance(data, dict) else None
+        if isinstance(result, str) and SESSION_ERROR_RE.search(result):
+            raise SessionExpiredError(f"{self.host} rejected {msg_type}: {result}")
+
+    def _observe(self, msg_type, started, status, size, error) -> None:
+        """report a finished request to the metrics hook, `started` is a perf_counter()"""
+        if self.metrics is None:
+            return
+        event = RequestEvent(
+            self.host,
+            msg_type,
+            time.perf_counter() - started,
+            status,
+            size,
+            type(error).__name__ if error is not None else None,
         )
-        resp.raise_for_status()
-        if response_type == "js":
-            parsed = MipcCameraClient._parse_jsonp(resp.text)
+        try:
+            self.metrics(event)
+        except Exception as e:
+            LOGGER.warning(f"metrics hook failed: {e!r}")
+
+    def _restamp(self, data):
+        """the same request data with a fresh nid, for retrying after logging in again"""
+        if "dsess_nid" not in data:
+            return data
+        return {**data, "dsess_nid": self.nid()}
+
+    def _url(self, msg_type, response_type="js"):
+        return f"http://{self.host}/ccm/{msg_type}.{response_type}"
+
+    @classmethod
+    def _parse_jsonp(cls, text: str, parser: JsonpParser = "fast") -> any:
+        unwrapped_es_obj = text.removeprefix(JSONP_PREFIX).removesuffix(");")
+        return _loads_jsonp(unwrapped_es_obj, parser)
+
+    def _handle_info_response(self, api_result) -> Union[str, None]:
+        sn = api_result.get("data", dict()).get("sn")
+        if not sn:
+            # maybe this should be a ValueError?
+            LOGGER.warn(
+                f"ccm_info_get did not contain a valid camera SN! response JSON was {api_result}"
+            )
+        self._sn = sn
+        return sn
+
+    def _pic_get_data(self, sn):
+        return {
+            "dsess": 1,
+            "dsess_nid": self.nid(),
+            "dsess_sn": sn,
+            "dtoken": "p0_xxxxxxxxxx",  # (sic)
+        }
+
+    def _play_data(self, sn, token):
+        return {
+            "dsess": 1,
+            "dsess_nid": self.nid(),
+            "dsess_sn": sn,
+            "dsetup": 1,
+            "dsetup_stream": "RTP_Unicast",
+            "dsetup_trans": 1,
+            "dsetup_trans_proto": "rtmp",
+            "dtoken": token,
+        }
+
+    def _ptz_data(self, sn, tilt_x, tilt_y, speed_x, speed_y):
+        return {
+            "dsess": 1,
+            "dsess_nid": self.nid(),
+            "dsess_sn": sn,
+            "dtoken": "ptz0",
+            "dtrans": 1,
+            "dtrans_pan_tilt": 1,
+            "dtrans_pan_tilt_x": tilt_x,
+            "dtrans_pan_tilt_y": tilt_y,
+            "dtrans_pan_tilt_z": 0,
+            "dspeed": 1,
+            "dspeed_pan_tilt": 1,
+            "dspeed_pan_tilt_x": speed_x,
+            "dspeed_pan_tilt_y": speed_y,
+            "ddome_cmd": 0,
+        }
+
+    def _handle_ptz_response(self, resp) -> None:
+        if not resp["type"] == "ccm_ptz_ctl_ack":
+            LOGGER.warn(f"got unexpected response from camera: {resp}")
+
+
+class MipcCameraClient(_MipcCameraClientBase):
+    """HTTP Client for MIPC-compatible cameras.
+
+    Requests that fail with connection errors, timeouts or 5xx responses are retried
+    up to `retries` times with exponential backoff (`backoff * 2**n` seconds, capped at
+    `max_backoff`, with full jitter). When the camera rejects the session, the client
+    logs in again with the credentials from `login` and retries once.
+
+    With a `session_cache`, `login` restores a previously saved session without
+    talking to the camera, and only logs in for real when the camera rejects it.
+
+    Pass a `transport` (a `Transport` or a plain `requests.Session`) to tune connection
+    pooling or share connections between many clients. `timeout` overrides the
+    transport's timeout for this client.
+
+    The client is thread safe. Concurrent `get_image()` and `get_device_sn()` calls
+    are coalesced: callers arriving while the same request is in flight wait for it
+    and get its result, instead of sending their own (`coalesce=False` to disable).
+
+    Share a `Throttle` between all clients of the same cameras to rate limit and cap
+    concurrent requests per camera. `metrics` is called with a `RequestEvent` after
+    every request, see `metrics.Metrics`."""
+
+    def __init__(
+        self,
+        host: str,
+        timeout: Timeout = None,
+        jsonp_parser: JsonpParser = "fast",
+        session_cache: Optional[SessionCache] = None,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        transport: Union[Transport, requests.Session, None] = None,
+        coalesce: bool = True,
+        throttle: Optional[Throttle] = None,
+        metrics: Optional[MetricsHook] = None,
+    ) -> None:
+        super().__init__(host, jsonp_parser)
+        if transport is None:
+            transport = Transport()
+        elif isinstance(transport, requests.Session):
+            transport = Transport(session=transport)
+        self.transport = transport
+        self.timeout = timeout if timeout is not None else transport.timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session_cache = session_cache
+        self._credentials: Optional[Tuple[str, str]] = None
+        self._r: requests.Session = transport.session
+        self.coalesce = coalesce
+        self.throttle = throttle
+        self.metrics = metrics
+        self._flights = SingleFlight()
+        self._login_lock = threading.Lock()
+        # set while this thread is in `_login`, whose failures mustn't log in again
+        self._local = threading.local()
+
+    def run_dh(self) -> None:
+        dh_resp = self.run_rpc("cacs_dh_req", self._dh_req_data())
+
+        resp_data = dh_resp["data"]
+        self._handle_dh_ack(resp_data)
+
+    def _send(
+        self, msg_type, data, response_type="js", stream=False
+    ) -> Tuple[requests.Response, Any]:
+        if self.throttle is None:
+            return self._send_now(msg_type, data, response_type, stream)
+        slot = self.throttle.acquire(self.host, msg_type)
+        try:
+            resp, parsed = self._send_now(msg_type, data, response_type, stream)
+        except BaseException:
+            slot.release()
+            raise
+        if stream:
+            # the camera is still busy until the body has been read
+            close = resp.close
+
+            def close_and_release():
+                try:
+                    close()
+                finally:
+                    slot.release()
+
+            resp.close = close_and_release
+        else:
+            slot.release()
+        return resp, parsed
+
+    def _send_now(
+        self, msg_type, data, response_type="js", stream=False
+    ) -> Tuple[requests.Response, Any]:
+        query_params = data
+
+        if LOGGER.isEnabledFor(logging.DEBUG):
             LOGGER.debug(
-                f"{resp.request.url} {resp} {pprint.pformat(parsed, compact=True)}"
+                f"{self.host=} {msg_type=} data={pprint.pformat(data, compact=True)}"
             )
+        started = time.perf_counter()
+        resp = None
+        try:
+            resp = self._r.request(
+                method="GET",
+                url=self._url(msg_type, response_type),
+                params=query_params,
+                timeout=self.timeout,
+                stream=stream,
+            )
+            if resp.status_code in (401, 403):
+                raise SessionExpiredError(
+                    f"{self.host} rejected {msg_type}: HTTP {resp.status_code}"
+                )
+            resp.raise_for_status()
+            parsed = None
+            if response_type == "js" or not resp.headers.get(
+                "Content-Type", "image/"
+            ).startswith("image/"):
+                # binary requests get a JSONP error instead of the data when they fail
+                parsed = self._parse_jsonp(resp.text, self.jsonp_parser)
+                if LOGGER.isEnabledFor(logging.DEBUG):
+                    LOGGER.debug(
+                        f"{resp.request.url} {resp} {pprint.pformat(parsed, compact=True)}"
+                    )
+                self._check_session(msg_type, parsed)
+            if response_type != "js" and parsed is not None:
+                raise Exception(f"{self.host} {msg_type} failed: {parsed}")
+        except Exception as e:
+            if resp is not None:
+                resp.close()
+            self._observe(
+                msg_type,
+                started,
+                resp.status_code if resp is not None else None,
+                len(resp.content) if resp is not None and not stream else 0,
+                e,
+            )
+            raise
+        size = (
+            int(resp.headers.get("Content-Length", 0)) if stream else len(resp.content)
+        )
+        self._observe(msg_type, started, resp.status_code, size, None)
+        return resp, parsed
+
+    def _request(
+        self, msg_type, data, response_type="js", stream=False
+    ) -> Tuple[requests.Response, Any]:
+        """sends the request, with retries and logging in again if the session was rejected"""
+        attempt = 0
+        logged_in_again = False
+        while True:
+            generation = self._session_generation
+            try:
+                return self._send(msg_type, data, response_type, stream)
+            except SessionExpiredError as e:
+                if (
+                    self._credentials is None
+                    or logged_in_again
+                    or msg_type in LOGIN_MSG_TYPES
+                    or getattr(self._local, "logging_in", False)
+                ):
+                    # logging in again would only send the rejected messages again
+                    raise
+                with self._login_lock:
+                    # another thread may have logged in again while we waited
+                    if self._session_generation == generation:
+                        LOGGER.info(f"{e}, logging in again")
+                        self._relogin()
+                logged_in_again = True
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.HTTPError,
+            ) as e:
+                if attempt >= self.retries or not self._should_retry(msg_type, e):
+                    raise
+                attempt += 1
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                )
+                LOGGER.warning(
+                    f"{self.host} {msg_type} failed: {e!r}, retry {attempt}/{self.retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+            # a fresh nid, the camera may have seen the old one already
+            data = self._restamp(data)
+
+    @staticmethod
+    def _should_retry(msg_type, e: requests.RequestException) -> bool:
+        if msg_type in NON_IDEMPOTENT_MSG_TYPES:
+            return isinstance(e, requests.ConnectTimeout)
+        if isinstance(e, requests.HTTPError):
+            return e.response is not None and e.response.status_code >= 500
+        return True
+
+    def run_rpc(self, msg_type, data, response_type="js"):
+        resp, parsed = self._request(msg_type, data, response_type)
+        if response_type == "js":
             return parsed
         else:
             return resp.content
 
-    @classmethod
-    def _parse_jsonp(cls, text: str) -> any:
-        unwrapped_es_obj = text.removeprefix(JSONP_PREFIX).removesuffix(");")
-        return json5.loads(unwrapped_es_obj)
-
     def login(self, username: str, password: str):
         """log in to the camera api and start a session"""
-        if not self.shared_secret:
-            self.run_dh()
-        login_data = self._login_data(username, password)
-        login_response_json = self.run_rpc("cacs_login_req", login_data)
-        LOGGER.debug(login_response_json)
-        return self._handle_login_response(login_response_json)
+        self._credentials = (username, password)
+        if self.session_cache is not None:
+            state = self.session_cache.load(self.host, username, reserve=SEQ_BLOCK)
+            if state is not None:
+                LOGGER.debug(f"restored cached session for {username}@{self.host}")
+                # not validated here: if the camera doesn't like it, the first
+                # request fails and we log in for real
+                return self._restore_session(state)
+        return self._login(username, password)
+
+    def _login(self, username: str, password: str):
+        self._local.logging_in = True
+        try:
+            if not self.shared_secret:
+                self.run_dh()
+            login_data = self._login_data(username, password)
+            login_response_json = self.run_rpc("cacs_login_req", login_data)
+            LOGGER.debug(login_response_json)
+            result = self._handle_login_response(login_response_json)
+        finally:
+            self._local.logging_in = False
+        self.save_session()
+        if self.session_cache is not None:
+            with self._nid_lock:
+                self._reserve_seq()
+        return result
+
+    def _relogin(self) -> None:
+        self._reset_session()
+        if self.session_cache is not None:
+            self.session_cache.delete(self.host, self._credentials[0])
+        self._login(*self._credentials)
+
+    def _reserve_seq(self) -> None:
+        start = None
+        if self.session_cache is not None and self._credentials is not None:
+            start = self.session_cache.reserve_seq(
+                self.host, self._credentials[0], self.sid, self.seq, SEQ_BLOCK
+            )
+        if start is None:
+            # someone else logged in since, the session is ours alone now
+            self._seq_limit = None
+            return
+        self.seq = start
+        self._seq_limit = start + SEQ_BLOCK
+
+    def save_session(self) -> None:
+        """write the current session (including the seq) to the session cache, if there is one"""
+        if self.session_cache is None or self._credentials is None:
+            return
+        self.session_cache.save(self.host, self._credentials[0], self._session_state())
+
+    def _coalesced(self, key, fn):
+        if not self.coalesce:
+            return fn()
+        return self._flights.do(key, fn)
 
     def get_image(self) -> bytes:
         """gets a JPEG snapshot of what the camera sees now"""
-        return self.run_rpc(
+        return self._coalesced(
+            "ccm_pic_get",
+            lambda: self.run_rpc(
+                "ccm_pic_get",
+                data=self._pic_get_data(self.get_device_sn()),
+                response_type="jpg",
+            ),
+        )
+
+    def _request_image(self) -> requests.Response:
+        resp, _ = self._request(
             "ccm_pic_get",
-            data={
-                "dsess": 1,
-                "dsess_nid": self.nid(),
-                "dsess_sn": self.get_device_sn(),
-                "dtoken": "p0_xxxxxxxxxx",  # (sic)
-            },
+            data=self._pic_get_data(self.get_device_sn()),
             response_type="jpg",
+            stream=True,
         )
+        return resp
+
+    def iter_image(self, chunk_size: int = IMAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        """gets a JPEG snapshot as an iterator of chunks, without holding all of it in memory"""
+        with self._request_image() as resp:
+            yield from resp.iter_content(chunk_size)
+
+    def get_image_into(self, target, chunk_size: int = IMAGE_CHUNK_SIZE) -> int:
+        """
+        streams a JPEG snapshot into `target` and returns the number of bytes written.
+
+        `target` can be a binary file object (anything with `write`), a socket
+        (anything with `sendall`) or a writable buffer like a preallocated
+        `bytearray`/`memoryview`, which is filled from the start without extra copies.
+        """
+        with self._request_image() as resp:
+            raw = resp.raw
+            if hasattr(target, "write") or hasattr(target, "sendall"):
+                write = getattr(target, "write", None) or target.sendall
+                buf = memoryview(bytearray(chunk_size))
+                total = 0
+                while n := raw.readinto(buf):
+                    write(buf[:n])
+                    total += n
+                return total
+
+            view = memoryview(target).cast("B")
+            content_length = int(resp.headers.get("Content-Length", -1))
+            if content_length > len(view):
+                raise BufferError(
+                    f"snapshot is {content_length} bytes, buffer only fits {len(view)}"
+                )
+            total = 0
+            while total < len(view) and (n := raw.readinto(view[total:])):
+                total += n
+            if total == len(view) and raw.read(1):
+                raise BufferError(
+                    f"snapshot is larger than the {len(view)} byte buffer"
+                )
+            return total
 
     def get_rtmp_stream(self, token: Literal["p0", "p1", "p2", "p3"] = "p0"):
         """gets the URL of the RTMP live stream from camera
 
         TODO: refactor quality selection"""
-        resp = self.run_rpc(
-            "ccm_play",
-            {
-                "dsess": 1,
-                "dsess_nid": self.nid(),
-                "dsess_sn": self.get_device_sn(),
-                "dsetup": 1,
-                "dsetup_stream": "RTP_Unicast",
-                "dsetup_trans": 1,
-                "dsetup_trans_proto": "rtmp",
-                "dtoken": token,
-            },
-        )
+        resp = self.run_rpc("ccm_play", self._play_data(self.get_device_sn(), token))
 
         return resp["data"]["uri"]["url"]
 
     def get_device_sn(self) -> Union[str, None]:
         """gets the camera serial number (cached for the client lifetime)"""
         if not self._sn:
-            api_result = self.run_rpc("ccm_info_get", data={})
-            sn = api_result.get("data", dict()).get("sn")
-            if not sn:
-                # maybe this should be a ValueError?
-                LOGGER.warn(
-                    f"ccm_info_get did not contain a valid camera SN! response JSON was {api_result}"
-                )
-            self._sn = sn
+            self._coalesced("ccm_info_get", self._fetch_device_sn)
         return self._sn
 
+    def _fetch_device_sn(self) -> None:
+        # a call that was in flight when we checked may have set it already
+        if not self._sn:
+            api_result = self.run_rpc("ccm_info_get", data={})
+            self._handle_info_response(api_result)
+
     def control_ptz(self, tilt_x, tilt_y, speed_x=48, speed_y=16):
         """
         move the camera by making the motors go brr
 
         TODO figure out the x, y ranges
         """
-        ptz_data = {
-            "dsess": 1,
-            "dsess_nid": self.nid(),
-            "dsess_sn": self.get_device_sn(),
-            "dtoken": "ptz0",
-            "dtrans": 1,
-            "dtrans_pan_tilt": 1,
-            "dtrans_pan_tilt_x": tilt_x,
-            "dtrans_pan_tilt_y": tilt_y,
-            "dtrans_pan_tilt_z": 0,
-            "dspeed": 1,
-            "dspeed_pan_tilt": 1,
-            "dspeed_pan_tilt_x": speed_x,
-            "dspeed_pan_tilt_y": speed_y,
-            "ddome_cmd": 0,
-        }
+        ptz_data = self._ptz_data(
+            self.get_device_sn(), tilt_x, tilt_y, speed_x, speed_y
+        )
         resp = self.run_rpc("ccm_ptz_ctl", ptz_data)
-        if not resp["type"] == "ccm_ptz_ctl_ack":
-            LOGGER.warn(f"got unexpected response from camera: {resp}")
+        self._handle_ptz_response(resp)
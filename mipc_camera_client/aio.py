@@ -0,0 +1,129 @@
+"""
+asyncio flavour of the client, so one event loop can talk to a lot of cameras at once.
+
+needs aiohttp: `pip install mipc-camera-client[async]`
+"""
+import logging
+import pprint
+import time
+from typing import Literal, Optional, Union
+
+import aiohttp
+
+from . import _MipcCameraClientBase
+from .jsonp import JsonpParser
+from .metrics import MetricsHook
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["AsyncMipcCameraClient"]
+
+
+class AsyncMipcCameraClient(_MipcCameraClientBase):
+    """asyncio HTTP Client for MIPC-compatible cameras.
+
+    Pass a shared `aiohttp.ClientSession` when driving many cameras, otherwise
+    the client creates (and closes) its own."""
+
+    def __init__(
+        self,
+        host: str,
+        session: Optional[aiohttp.ClientSession] = None,
+        jsonp_parser: JsonpParser = "fast",
+        metrics: Optional[MetricsHook] = None,
+    ) -> None:
+        super().__init__(host, jsonp_parser)
+        self.metrics = metrics
+        self._r = session
+        self._owns_session = session is None
+
+    async def __aenter__(self) -> "AsyncMipcCameraClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """close the HTTP session, unless it was passed in by the caller"""
+        if self._owns_session and self._r is not None:
+            await self._r.close()
+            self._r = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._r is None:
+            self._r = aiohttp.ClientSession()
+        return self._r
+
+    async def run_dh(self) -> None:
+        dh_resp = await self.run_rpc("cacs_dh_req", self._dh_req_data())
+
+        resp_data = dh_resp["data"]
+        self._handle_dh_ack(resp_data)
+
+    async def run_rpc(self, msg_type, data, response_type="js"):
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(
+                f"{self.host=} {msg_type=} data={pprint.pformat(data, compact=True)}"
+            )
+        started = time.perf_counter()
+        status, size = None, 0
+        try:
+            async with self._session().get(
+                self._url(msg_type, response_type), params=data
+            ) as resp:
+                status = resp.status
+                resp.raise_for_status()
+                body = await resp.read()
+                size = len(body)
+        except Exception as e:
+            self._observe(msg_type, started, status, size, e)
+            raise
+        self._observe(msg_type, started, status, size, None)
+        if response_type != "js":
+            return body
+        parsed = self._parse_jsonp(body.decode(resp.get_encoding()), self.jsonp_parser)
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(
+                f"{resp.url} {resp.status} {pprint.pformat(parsed, compact=True)}"
+            )
+        return parsed
+
+    async def login(self, username: str, password: str):
+        """log in to the camera api and start a session"""
+        if not self.shared_secret:
+            await self.run_dh()
+        login_data = self._login_data(username, password)
+        login_response_json = await self.run_rpc("cacs_login_req", login_data)
+        LOGGER.debug(login_response_json)
+        return self._handle_login_response(login_response_json)
+
+    async def get_image(self) -> bytes:
+        """gets a JPEG snapshot of what the camera sees now"""
+        return await self.run_rpc(
+            "ccm_pic_get",
+            data=self._pic_get_data(await self.get_device_sn()),
+            response_type="jpg",
+        )
+
+    async def get_rtmp_stream(self, token: Literal["p0", "p1", "p2", "p3"] = "p0"):
+        """gets the URL of the RTMP live stream from camera"""
+        resp = await self.run_rpc(
+            "ccm_play", self._play_data(await self.get_device_sn(), token)
+        )
+
+        return resp["data"]["uri"]["url"]
+
+    async def get_device_sn(self) -> Union[str, None]:
+        """gets the camera serial number (cached for the client lifetime)"""
+        if not self._sn:
+            api_result = await self.run_rpc("ccm_info_get", data={})
+            self._handle_info_response(api_result)
+        return self._sn
+
+    async def control_ptz(self, tilt_x, tilt_y, speed_x=48, speed_y=16):
+        """move the camera, see `MipcCameraClient.control_ptz`"""
+        ptz_data = self._ptz_data(
+            await self.get_device_sn(), tilt_x, tilt_y, speed_x, speed_y
+        )
+        resp = await self.run_rpc("ccm_ptz_ctl", ptz_data)
+        self._handle_ptz_response(resp)
@@ -0,0 +1,352 @@
+"""
+Append-only frame archive: lots of JPEGs in a few big segment files instead of one file each.
+
+Layout, per camera serial number:
+
+    {archive_dir}/{sn}/{first frame timestamp}_{sn}.seg   JPEG frames back to back
+    {archive_dir}/{sn}/{first frame timestamp}_{sn}.idx   index, see below
+
+A segment that starts at the same timestamp as an earlier one (the clock went back
+and timestamps were clamped) gets a `~1`, `~2`, ... suffix on its name.
+
+The index is an 8 byte magic followed by fixed size little-endian records of
+(timestamp: float64, offset: uint64, length: uint32), one per frame, in capture order.
+Frames are appended to the segment before their index record, so after a crash a
+segment may have a torn frame at the end that no index record points to; the writer
+truncates it when it reopens the segment.
+
+Several writers (say `timelapse --archive` and `snapshot --archive`) can share an
+archive: each append happens under an flock on `{archive_dir}/{sn}/.lock`, and a
+writer that finds the files changed by someone else picks up from where they are.
+
+Reading memory-maps the segment, frames come back as memoryviews into the map
+without copying.
+"""
+import array
+import bisect
+import contextlib
+import itertools
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .filenames import snapshot_filename
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "ArchiveWriter",
+    "ArchiveReader",
+    "Segment",
+    "ArchivedFrame",
+    "archived_cameras",
+]
+
+INDEX_MAGIC = b"MIPCIDX1"
+INDEX_RECORD = struct.Struct("<dQI")
+
+# start a new segment once the current one is this big
+DEFAULT_SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+class ArchivedFrame(NamedTuple):
+    timestamp: float
+    data: memoryview
+
+
+def _segment_stem(sn: str, timestamp: float) -> str:
+    return snapshot_filename(sn, timestamp).removesuffix(".jpeg")
+
+
+def _segment_key(path: Path) -> Tuple[str, int]:
+    stem, _, seq = path.stem.partition("~")
+    return stem, int(seq or 0)
+
+
+def _segments(directory: Path) -> List[Path]:
+    """segment files in the order they were written"""
+    return sorted(directory.glob("*.seg"), key=_segment_key)
+
+
+def archived_cameras(archive_dir: Union[str, Path]) -> List[str]:
+    """serial numbers of the cameras with frames in the archive"""
+    return sorted(
+        p.name
+        for p in Path(archive_dir).iterdir()
+        if p.is_dir() and any(p.glob("*.idx"))
+    )
+
+
+class ArchiveWriter:
+    """appends frames of one camera to segment files under `{archive_dir}/{sn}/`"""
+
+    def __init__(
+        self,
+        archive_dir: Union[str, Path],
+        sn: str,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+    ) -> None:
+        self.directory = Path(archive_dir) / sn
+        self.sn = sn
+        self.segment_size = segment_size
+        self._seg = None
+        self._idx = None
+        self._seg_size = 0
+        self._last_timestamp = float("-inf")
+        self._clamping = False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            self._reopen_last()
+
+    def __repr__(self) -> str:
+        return f"ArchiveWriter(directory={str(self.directory)!r})"
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        fd = os.open(self.directory / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _catch_up(self) -> None:
+        """reopen the last segment if another writer appended or started a new one"""
+        segments = _segments(self.directory)
+        if (
+            self._seg is not None
+            and segments
+            and segments[-1].name == Path(self._seg.name).name
+            and os.fstat(self._seg.fileno()).st_size == self._seg_size
+        ):
+            return
+        self.close()
+        self._reopen_last(segments)
+
+    def _reopen_last(self, segments: Optional[List[Path]] = None) -> None:
+        if segments is None:
+            segments = _segments(self.directory)
+        if not segments:
+            return
+        seg_path = segments[-1]
+        idx_path = seg_path.with_suffix(".idx")
+        if not idx_path.exists():
+            return
+        records = _read_index(idx_path, seg_path.stat().st_size)
+        if records.timestamps:
+            self._last_timestamp = records.timestamps[-1]
+        end = records.offsets[-1] + records.lengths[-1] if records.timestamps else 0
+        # drop torn frames and index records from a previous crash
+        with idx_path.open("r+b") as idx:
+            idx.truncate(len(INDEX_MAGIC) + len(records.timestamps) * INDEX_RECORD.size)
+        self._seg = seg_path.open("r+b")
+        self._seg.truncate(end)
+        self._seg.seek(end)
+        self._seg_size = end
+        self._idx = idx_path.open("ab")
+
+    def _open_segment(self, timestamp: float) -> None:
+        self.close()
+        stem = _segment_stem(self.sn, timestamp)
+        for seq in itertools.count():
+            name = f"{stem}~{seq}" if seq else stem
+            try:
+                self._seg = (self.directory / f"{name}.seg").open("xb")
+            except FileExistsError:
+                continue
+            break
+        self._idx = (self.directory / f"{name}.idx").open("xb")
+        self._idx.write(INDEX_MAGIC)
+        self._seg_size = 0
+
+    def append(self, timestamp: float, data: bytes) -> None:
+        """
+        add a frame. Timestamps older than the last frame's (the clock was set back)
+        are stored as the last frame's, the index has to stay in order.
+        """
+        with self._locked():
+            self._catch_up()
+            if timestamp < self._last_timestamp:
+                if not self._clamping:
+                    LOGGER.warning(
+                        f"{self.sn}: frame at {timestamp} is older than the last one "
+                        f"({self._last_timestamp}), did the clock change? Storing "
+                        "frames at the last timestamp until it catches up"
+                    )
+                    self._clamping = True
+                timestamp = self._last_timestamp
+            else:
+                self._clamping = False
+            if self._seg is None or self._seg_size >= self.segment_size:
+                self._open_segment(timestamp)
+            self._seg.write(data)
+            self._idx.write(INDEX_RECORD.pack(timestamp, self._seg_size, len(data)))
+            self._seg_size += len(data)
+            self._last_timestamp = timestamp
+            # out of the buffers before the next writer gets the lock
+            self.flush()
+
+    def flush(self, fsync: bool = False) -> None:
+        for f in (self._seg, self._idx):
+            if f is not None:
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        for f in (self._seg, self._idx):
+            if f is not None:
+                f.close()
+        self._seg = self._idx = None
+
+
+class _Index(NamedTuple):
+    timestamps: array.array
+    offsets: array.array
+    lengths: array.array
+
+
+def _read_index(path: Path, data_size: int) -> _Index:
+    """the index records, minus any pointing past the `data_size` bytes of the segment"""
+    raw = path.read_bytes()
+    if not raw.startswith(INDEX_MAGIC):
+        raise ValueError(f"{path} is not a frame archive index")
+    body = memoryview(raw)[len(INDEX_MAGIC) :]
+    # ignore a half written record at the end
+    body = body[: len(body) - len(body) % INDEX_RECORD.size]
+    index = _Index(array.array("d"), array.array("Q"), array.array("I"))
+    for ts, offset, length in INDEX_RECORD.iter_unpack(body):
+        if offset + length > data_size:
+            # the index got flushed but the frame didn't make it to disk
+            break
+        index.timestamps.append(ts)
+        index.offsets.append(offset)
+        index.lengths.append(length)
+    return index
+
+
+class Segment:
+    """one memory-mapped segment file and its index"""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        index = _read_index(self.path.with_suffix(".idx"), self.path.stat().st_size)
+        self.timestamps = index.timestamps
+        self._offsets = index.offsets
+        self._lengths = index.lengths
+        self._file = None
+        self._map = None
+
+    def __repr__(self) -> str:
+        return f"Segment(path={str(self.path)!r}, frames={len(self)})"
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _view(self) -> memoryview:
+        if self._map is None:
+            self._file = self.path.open("rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def close(self) -> None:
+        # frames handed out as memoryviews keep the map alive, let the GC take it then
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._file.close()
+            self._map = self._file = None
+
+    def frame(self, i: int) -> ArchivedFrame:
+        offset = self._offsets[i]
+        return ArchivedFrame(
+            self.timestamps[i], self._view()[offset : offset + self._lengths[i]]
+        )
+
+    def nearest(self, timestamp: float) -> Optional[int]:
+        if not self.timestamps:
+            return None
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        if i == len(self.timestamps):
+            return i - 1
+        if (
+            i > 0
+            and timestamp - self.timestamps[i - 1] <= self.timestamps[i] - timestamp
+        ):
+            return i - 1
+        return i
+
+    def between(self, start: float, end: float) -> Iterator[ArchivedFrame]:
+        lo = bisect.bisect_left(self.timestamps, start)
+        hi = bisect.bisect_right(self.timestamps, end)
+        for i in range(lo, hi):
+            yield self.frame(i)
+
+
+class ArchiveReader:
+    """reads the archive of one camera"""
+
+    def __init__(self, archive_dir: Union[str, Path], sn: str) -> None:
+        self.directory = Path(archive_dir) / sn
+        self.sn = sn
+        self.segments: List[Segment] = [
+            Segment(p)
+            for p in _segments(self.directory)
+            if p.with_suffix(".idx").exists()
+        ]
+        self.segments = [s for s in self.segments if len(s)]
+        self._starts = [s.timestamps[0] for s in self.segments]
+
+    def __repr__(self) -> str:
+        return f"ArchiveReader(directory={str(self.directory)!r}, segments={len(self.segments)})"
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for s in self.segments:
+            s.close()
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.segments)
+
+    def nearest(self, timestamp: float) -> Optional[ArchivedFrame]:
+        """the frame closest in time to `timestamp`"""
+        if not self.segments:
+            return None
+        i = max(0, bisect.bisect_right(self._starts, timestamp) - 1)
+        candidates = [(seg, seg.nearest(timestamp)) for seg in self.segments[i : i + 2]]
+        seg, idx = min(candidates, key=lambda c: abs(c[0].timestamps[c[1]] - timestamp))
+        return seg.frame(idx)
+
+    def between(self, start: float, end: float) -> Iterator[ArchivedFrame]:
+        """frames with start <= timestamp <= end, in order"""
+        first = max(0, bisect.bisect_right(self._starts, start) - 1)
+        for seg in self.segments[first:]:
+            if seg.timestamps[0] > end:
+                break
+            yield from seg.between(start, end)
+
+    def __iter__(self) -> Iterator[ArchivedFrame]:
+        return self.between(float("-inf"), float("inf"))
@@ -0,0 +1,264 @@
+"""
+MJPEG AVI writing: the camera's JPEGs go into a playable video as they are, no re-encoding.
+
+The file is written front to back: a fixed size header, the frames as `00dc` chunks
+in the `movi` list, and the `idx1` index at the end when the writer is closed. The
+index entries are also appended to a `.idx` sidecar file as frames come in, and
+`flush()` updates the frame counts in the header, so `MjpegAviWriter.recover()` can
+finish a file whose writer never got to close it.
+
+RIFF sizes are 32 bit, so files are kept under `DEFAULT_MAX_SIZE`; `full` says when
+to start the next one.
+"""
+import os
+import struct
+from fractions import Fraction
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+__all__ = ["MjpegAviWriter", "jpeg_size", "DEFAULT_MAX_SIZE"]
+
+# below 2 GiB, some players still choke on bigger AVI 1.0 files
+DEFAULT_MAX_SIZE = 2**31 - 64 * 1024 * 1024
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+_AVIH = struct.Struct("<14I")
+_STRH = struct.Struct("<4s4sIHHIIIIIIIIhhhh")
+_STRF = struct.Struct("<IiiHH4sIiiII")
+_IDX1_ENTRY = struct.Struct("<4sIII")
+_CHUNK = struct.Struct("<4sI")
+
+# RIFF AVI + LIST hdrl (avih, LIST strl (strh, strf)) + LIST movi
+_STRL_SIZE = 4 + (8 + _STRH.size) + (8 + _STRF.size)
+_HDRL_SIZE = 4 + (8 + _AVIH.size) + (8 + _STRL_SIZE)
+# offset of the "movi" fourcc, idx1 offsets are relative to it
+_MOVI_OFFSET = 12 + 8 + _HDRL_SIZE + 8
+HEADER_SIZE = _MOVI_OFFSET + 4
+
+# offset of the strh fields in the header, after the avih and the strl LIST header
+_STRH_OFFSET = 12 + 8 + 4 + (8 + _AVIH.size) + 12 + 8
+
+# JPEG start of frame markers, they carry the image size
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from the JPEG's SOF marker, None if there's none"""
+    view = memoryview(data)
+    i = 2
+    while i + 4 <= len(view):
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        length = (view[i + 2] << 8) | view[i + 3]
+        if marker in _SOF_MARKERS and i + 9 <= len(view):
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return width, height
+        if marker == 0xDA:
+            # start of scan, no SOF before it
+            return None
+        i += 2 + length
+    return None
+
+
+class MjpegAviWriter:
+    """appends JPEG frames to an MJPEG AVI at `path`, played back at `fps`"""
+
+    def __init__(self, path: Union[str, Path], fps: float = 25.0) -> None:
+        self.path = Path(path)
+        self.fps = fps
+        # dwRate / dwScale in the stream header, exact for rates like 30000/1001
+        rate = Fraction(fps).limit_denominator(10_000)
+        self._rate, self._scale = rate.numerator, rate.denominator
+        self.frames = 0
+        self.width = 0
+        self.height = 0
+        self._max_frame = 0
+        self._file = self.path.open("xb")
+        self._index = self._index_path(self.path).open("wb")
+        self._file.write(self._header(finished=False))
+        self._size = HEADER_SIZE
+
+    def __repr__(self) -> str:
+        return f"MjpegAviWriter(path={str(self.path)!r}, frames={self.frames})"
+
+    def __enter__(self) -> "MjpegAviWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def _index_path(path: Path) -> Path:
+        return path.with_name(path.name + ".idx")
+
+    @property
+    def size(self) -> int:
+        """bytes written so far"""
+        return self._size
+
+    def full(self, next_frame: int = 0, max_size: int = DEFAULT_MAX_SIZE) -> bool:
+        """whether a frame of `next_frame` bytes plus the index would go over `max_size`"""
+        index_size = 8 + (self.frames + 1) * _IDX1_ENTRY.size
+        return self._size + 8 + next_frame + 1 + index_size > max_size
+
+    def _header(self, finished: bool) -> bytes:
+        usec = round(1_000_000 / self.fps)
+        movi_size = self._movi_size() if self.frames or finished else 4
+        riff_size = HEADER_SIZE + movi_size - 4 - 8
+        if finished:
+            riff_size += 8 + self.frames * _IDX1_ENTRY.size
+        return b"".join(
+            [
+                _CHUNK.pack(b"RIFF", riff_size),
+                b"AVI ",
+                _CHUNK.pack(b"LIST", _HDRL_SIZE),
+                b"hdrl",
+                _CHUNK.pack(b"avih", _AVIH.size),
+                _AVIH.pack(
+                    usec,
+                    round(self._max_frame * self.fps),
+                    0,
+                    AVIF_HASINDEX if finished else 0,
+                    self.frames,
+                    0,
+                    1,
+                    self._max_frame,
+                    self.width,
+                    self.height,
+                    0,
+                    0,
+                    0,
+                    0,
+                ),
+                _CHUNK.pack(b"LIST", _STRL_SIZE),
+                b"strl",
+                _CHUNK.pack(b"strh", _STRH.size),
+                _STRH.pack(
+                    b"vids",
+                    b"MJPG",
+                    0,
+                    0,
+                    0,
+                    0,
+                    self._scale,
+                    self._rate,
+                    0,
+                    self.frames,
+                    self._max_frame,
+                    0xFFFFFFFF,
+                    0,
+                    0,
+                    0,
+                    min(self.width, 0x7FFF),
+                    min(self.height, 0x7FFF),
+                ),
+                _CHUNK.pack(b"strf", _STRF.size),
+                _STRF.pack(
+                    _STRF.size,
+                    self.width,
+                    self.height,
+                    1,
+                    24,
+                    b"MJPG",
+                    self.width * self.height * 3,
+                    0,
+                    0,
+                    0,
+                    0,
+                ),
+                _CHUNK.pack(b"LIST", movi_size),
+                b"movi",
+            ]
+        )
+
+    def _movi_size(self) -> int:
+        return self._size - _MOVI_OFFSET
+
+    def append(self, data: bytes) -> None:
+        if self.frames == 0:
+            self.width, self.height = jpeg_size(data) or (0, 0)
+        offset = self._size - _MOVI_OFFSET
+        self._file.write(_CHUNK.pack(b"00dc", len(data)))
+        self._file.write(data)
+        if len(data) % 2:
+            # chunks are word aligned
+            self._file.write(b"\0")
+        self._index.write(_IDX1_ENTRY.pack(b"00dc", AVIIF_KEYFRAME, offset, len(data)))
+        self._size += 8 + len(data) + len(data) % 2
+        self._max_frame = max(self._max_frame, len(data))
+        self.frames += 1
+        if self.frames == 1:
+            # get the size and rate into the header early, `recover` needs them
+            self.flush()
+
+    def _write_header(self, finished: bool) -> None:
+        self._file.seek(0)
+        self._file.write(self._header(finished))
+        self._file.seek(self._size)
+
+    def flush(self, fsync: bool = False) -> None:
+        """update the header so the file so far is playable, and flush to the OS (and disk)"""
+        self._write_header(finished=False)
+        for f in (self._file, self._index):
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def close(self) -> None:
+        """append the index and finish the header, the file is complete after this"""
+        if self._file.closed:
+            return
+        self._index.close()
+        index_path = self._index_path(self.path)
+        entries = index_path.read_bytes()
+        self._file.write(_CHUNK.pack(b"idx1", len(entries)))
+        self._file.write(entries)
+        self._write_header(finished=True)
+        self._file.close()
+        index_path.unlink()
+
+    @classmethod
+    def recover(cls, path: Union[str, Path]) -> "MjpegAviWriter":
+        """
+        reopen an AVI whose writer didn't close it, dropping a torn last frame.
+        Append more frames or just `close()` it to make it a complete file.
+        """
+        path = Path(path)
+        self = cls.__new__(cls)
+        self.path = path
+        self._file = path.open("r+b")
+        header = self._file.read(HEADER_SIZE)
+        avih = _AVIH.unpack_from(header, 12 + 8 + 4 + 8)
+        self.width, self.height = avih[8], avih[9]
+        # the rate, not avih's microseconds per frame, those are rounded
+        strh = _STRH.unpack_from(header, _STRH_OFFSET)
+        self._scale, self._rate = strh[6], strh[7]
+        self.fps = self._rate / self._scale
+        file_size = path.stat().st_size
+        raw = cls._index_path(path).read_bytes()
+        raw = raw[: len(raw) - len(raw) % _IDX1_ENTRY.size]
+        self.frames = 0
+        self._max_frame = 0
+        end = HEADER_SIZE
+        for _, _, offset, length in _IDX1_ENTRY.iter_unpack(raw):
+            chunk_end = _MOVI_OFFSET + offset + 8 + length + length % 2
+            if chunk_end > file_size:
+                break
+            end = chunk_end
+            self.frames += 1
+            self._max_frame = max(self._max_frame, length)
+        self._file.truncate(end)
+        self._size = end
+        self._index = cls._index_path(path).open("r+b")
+        self._index.truncate(self.frames * _IDX1_ENTRY.size)
+        self._index.seek(0, os.SEEK_END)
+        self._write_header(finished=False)
+        return self
@@ -0,0 +1,116 @@
+"""
+Change detection, to skip storing frames of a static scene that look like the last one kept.
+
+Frames are decoded straight to a small grayscale thumbnail: libjpeg scales the DCT
+while decoding (`Image.draft`), so a 1080p frame costs about as much as decoding a
+240x135 one. The thumbnail is compared to the one of the last kept frame, either as
+the mean absolute pixel difference or as the distance between perceptual hashes.
+
+needs numpy and Pillow: `pip install mipc-camera-client[change]`
+"""
+import io
+import logging
+from typing import Literal, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["ChangeDetector", "ChangeScore", "thumbnail", "dhash"]
+
+ChangeMethod = Literal["diff", "hash"]
+
+# thumbnail edge length in pixels, big enough to notice a person walking through
+DEFAULT_SIZE = 64
+
+# default fraction of change (0..1) above which a frame is kept
+DEFAULT_THRESHOLD = {"diff": 0.02, "hash": 0.1}
+
+
+class ChangeScore(NamedTuple):
+    # 0.0 for identical thumbnails, 1.0 for as different as it gets
+    score: float
+    # above the threshold, this is now the reference frame
+    changed: bool
+
+
+def thumbnail(data: bytes, size: int = DEFAULT_SIZE) -> np.ndarray:
+    """`size` x `size` grayscale float32 array (0..1) of a JPEG"""
+    image = Image.open(io.BytesIO(data))
+    # decode at 1/2, 1/4 or 1/8 scale, whatever is still at least `size` pixels
+    image.draft("L", (size, size))
+    image = image.convert("L").resize((size, size), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+def dhash(thumb: np.ndarray, bits: int = 8) -> np.ndarray:
+    """difference hash: `bits` x `bits` booleans, whether each pixel is brighter than its right neighbour"""
+    rows, cols = thumb.shape
+    # average down to bits x (bits + 1) blocks
+    small = thumb[: rows - rows % bits, : cols - cols % (bits + 1)]
+    small = small.reshape(bits, small.shape[0] // bits, bits + 1, -1).mean(axis=(1, 3))
+    return small[:, 1:] > small[:, :-1]
+
+
+class ChangeDetector:
+    """
+    scores frames against the last kept one, see the module docstring.
+
+    `method="diff"` is the mean absolute difference of the thumbnails, sensitive to
+    any change including lighting. `method="hash"` compares difference hashes, which
+    ignores overall brightness changes and JPEG noise but needs bigger changes to trigger.
+    The first frame is always kept.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        method: ChangeMethod = "diff",
+        size: int = DEFAULT_SIZE,
+    ) -> None:
+        if method not in DEFAULT_THRESHOLD:
+            raise ValueError(f"unknown change detection method {method!r}")
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLD[method] if threshold is None else threshold
+        self.size = size
+        self._reference: Optional[np.ndarray] = None
+        self.kept = 0
+        self.skipped = 0
+
+    def __repr__(self) -> str:
+        return f"ChangeDetector(method={self.method!r}, threshold={self.threshold})"
+
+    def _signature(self, data: bytes) -> np.ndarray:
+        thumb = thumbnail(data, self.size)
+        return dhash(thumb) if self.method == "hash" else thumb
+
+    def _distance(self, a: np.ndarray, b: np.ndarray) -> float:
+        if self.method == "hash":
+            return float(np.count_nonzero(a != b)) / a.size
+        return float(np.abs(a - b).mean())
+
+    def score(self, data: bytes) -> float:
+        """how different the frame is from the reference, without updating it"""
+        if self._reference is None:
+            return 1.0
+        return self._distance(self._signature(data), self._reference)
+
+    def check(self, data: bytes) -> ChangeScore:
+        """score the frame, and make it the reference if it's kept"""
+        signature = self._signature(data)
+        if self._reference is None:
+            score = 1.0
+        else:
+            score = self._distance(signature, self._reference)
+        changed = score >= self.threshold
+        if changed:
+            self._reference = signature
+            self.kept += 1
+        else:
+            self.skipped += 1
+        return ChangeScore(score, changed)
+
+    def reset(self) -> None:
+        """forget the reference, the next frame is kept"""
+        self._reference = None
@@ -3,11 +3,21 @@ import datetime
 import logging
 import os
 from pathlib import Path
+import signal
 import sys
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.filenames import snapshot_filename
+from mipc_camera_client.session_cache import SessionCache
 import inspect
 
+# the feature modules are imported by the commands that use them, so a snapshot
+# through the daemon doesn't pay for importing all of them
+if TYPE_CHECKING:
+    from mipc_camera_client.patrol import Position
+
 LOGGER = logging.getLogger("mipc_camera_client")
 
 
@@ -16,57 +26,491 @@ def print_stream_url(c: MipcCameraClient) -> None:
     print(c.get_rtmp_stream())
 
 
-def _write_bytes_stdout(bs: bytes):
+def _write_image_stdout(c: MipcCameraClient) -> int:
     with os.fdopen(sys.stdout.fileno(), "wb", closefd=False) as fd:
-        fd.write(bs)
+        size = c.get_image_into(fd)
         fd.flush()
+    return size
+
+
+def _write_image_file(c: MipcCameraClient, out_path: Path) -> int:
+    # into a temp file next to it first, so a failed snapshot neither leaves half
+    # a JPEG behind nor clobbers a file that was already there. Created like
+    # open() would, so it gets the usual permissions after the umask
+    tmp_name = out_path.with_name(f".{out_path.name}.{os.urandom(6).hex()}")
+    fd = os.open(tmp_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            size = c.get_image_into(f)
+        os.replace(tmp_name, out_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return size
 
 
 def _generate_filename(c: MipcCameraClient):
-    now = datetime.datetime.now(datetime.timezone.utc)
-    timestamp_str = now.strftime("%Y-%m-%dT%H-%M-%S.%f%Z")
-    return f"{timestamp_str}_{c.get_device_sn()}.jpeg"
+    return snapshot_filename(c.get_device_sn())
 
 
-def snapshot(c: MipcCameraClient, filename: Optional[str]) -> None:
+def snapshot(
+    c: MipcCameraClient, filename: Optional[str], archive: Optional[str]
+) -> None:
     LOGGER.info("Taking snapshot")
-    jpeg = c.get_image()
+    if archive:
+        from mipc_camera_client.archive import ArchiveWriter
+
+        frame = c.get_image()
+        with ArchiveWriter(archive, c.get_device_sn()) as writer:
+            writer.append(time.time(), frame)
+        LOGGER.info(f"appended {len(frame)} bytes to archive {writer.directory}")
+        return
     out_path = None
     match filename:
         case "-":
-            _write_bytes_stdout(jpeg)
+            pass
         case None if not sys.stdout.isatty:
-            _write_bytes_stdout(jpeg)
+            pass
         case None:
             out_path = Path(_generate_filename(c))
-        case dir if Path(dir).is_dir:
+        case dir if Path(dir).is_dir():
             out_path = Path(dir) / _generate_filename(c)
         case file:
             out_path = Path(file)
     if out_path:
-        out_path.write_bytes(jpeg)
-    LOGGER.info(f"saved {len(jpeg)} bytes to {out_path or 'stdout'}")
+        size = _write_image_file(c, out_path)
+    else:
+        size = _write_image_stdout(c)
+    LOGGER.info(f"saved {size} bytes to {out_path or 'stdout'}")
     if out_path:
         print(out_path)
 
 
+def _ptz_from_stdin(c: MipcCameraClient, speed_x: int, speed_y: int) -> None:
+    from mipc_camera_client.ptz import PtzController
+
+    with PtzController(c, max_age=1.0) as controller:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                x, y = map(int, line.split())
+            except ValueError:
+                LOGGER.warning(f"expected 'X Y', got {line.strip()!r}")
+                continue
+            controller.move(x, y, speed_x, speed_y)
+    stats = controller.stats
+    LOGGER.info(
+        f"sent={stats.sent} merged={stats.merged} dropped={stats.dropped} "
+        f"errors={stats.errors} latency {stats.latency}"
+    )
+
+
 def ptz_handler(
-    c: MipcCameraClient, x: int, y: int, zero: bool, speed_x: int, speed_y: int
+    c: MipcCameraClient,
+    x: int,
+    y: int,
+    zero: bool,
+    speed_x: int,
+    speed_y: int,
+    stdin: bool,
 ) -> None:
-    if zero:
+    if stdin:
+        _ptz_from_stdin(c, speed_x, speed_y)
+    elif zero:
+        from mipc_camera_client.ptz import HOME_MOVE
+
         LOGGER.info("resetting pan/tilt position")
-        c.control_ptz(tilt_x=-360, tilt_y=-360, speed_x=speed_x, speed_y=speed_y)
+        c.control_ptz(*HOME_MOVE, speed_x=speed_x, speed_y=speed_y)
     else:
         LOGGER.info(f"moving {x=} {y=}")
         c.control_ptz(tilt_x=x, tilt_y=y, speed_x=speed_x, speed_y=speed_y)
 
 
+def _parse_time(s: Optional[str]) -> Optional[float]:
+    if s is None:
+        return None
+    when = datetime.datetime.fromisoformat(s)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return when.timestamp()
+
+
+def export(
+    archive_dir: str,
+    output_dir: str,
+    sn: Optional[str],
+    start: Optional[str],
+    end: Optional[str],
+) -> None:
+    from mipc_camera_client.archive import ArchiveReader, archived_cameras
+
+    start_ts = _parse_time(start) or float("-inf")
+    end_ts = _parse_time(end) or float("inf")
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for camera_sn in [sn] if sn else archived_cameras(archive_dir):
+        count = 0
+        with ArchiveReader(archive_dir, camera_sn) as reader:
+            for frame in reader.between(start_ts, end_ts):
+                (out / snapshot_filename(camera_sn, frame.timestamp)).write_bytes(
+                    frame.data
+                )
+                count += 1
+        LOGGER.info(f"exported {count} frames of {camera_sn} to {out}")
+
+
+def find(
+    root: str,
+    sn: Optional[str],
+    at: Optional[str],
+    start: Optional[str],
+    end: Optional[str],
+) -> None:
+    from mipc_camera_client.index import FrameIndex
+
+    index = FrameIndex(root)
+    cameras = [sn] if sn else index.cameras()
+    if at is not None:
+        when = _parse_time(at)
+        for camera_sn in cameras:
+            entry = index.nearest(camera_sn, when)
+            if entry is not None:
+                print(entry.path)
+        return
+    start_ts = _parse_time(start) or float("-inf")
+    end_ts = _parse_time(end) or float("inf")
+    for camera_sn in cameras:
+        for entry in index.between(camera_sn, start_ts, end_ts):
+            print(entry.path)
+
+
+def timelapse(
+    c: MipcCameraClient,
+    output_dir: str,
+    interval: float,
+    duration: Optional[float],
+    also_host: Optional[list],
+    writers: int,
+    queue_size: int,
+    fsync_every: int,
+    rotate: str,
+    archive: bool,
+    avi: bool,
+    avi_fps: float,
+    min_change: Optional[float],
+    change_method: str,
+) -> None:
+    from mipc_camera_client.timelapse import (
+        ArchiveFrameWriter,
+        AviFrameWriter,
+        FrameWriter,
+        Timelapse,
+    )
+
+    clients = [c]
+    for host in also_host or []:
+        LOGGER.info(f"Logging into {host}")
+        extra = MipcCameraClient(
+            host, session_cache=c.session_cache, metrics=c.metrics, timeout=c.timeout
+        )
+        extra.login(*c._credentials)
+        clients.append(extra)
+    if archive:
+        writer = ArchiveFrameWriter(
+            output_dir, queue_size=queue_size, fsync_every=fsync_every
+        )
+    elif avi:
+        writer = AviFrameWriter(
+            output_dir, fps=avi_fps, queue_size=queue_size, fsync_every=fsync_every
+        )
+    else:
+        writer = FrameWriter(
+            output_dir,
+            workers=writers,
+            queue_size=queue_size,
+            fsync_every=fsync_every,
+            rotate_format=rotate,
+        )
+    detector_factory = None
+    if min_change is not None:
+        # needs numpy and Pillow, only import them when asked to
+        from mipc_camera_client.change import ChangeDetector
+
+        def detector_factory():
+            return ChangeDetector(threshold=min_change, method=change_method)
+
+    t = Timelapse(clients, interval, writer, detector_factory)
+    LOGGER.info(
+        f"capturing {len(clients)} camera(s) every {interval}s into {output_dir}, Ctrl-C to stop"
+    )
+    try:
+        t.run(duration)
+    except KeyboardInterrupt:
+        LOGGER.info("stopping")
+    finally:
+        t.stop()
+        writer.close()
+    print(t.report(), file=sys.stderr)
+
+
+def _serve_metrics(port: Optional[int]):
+    """a `Metrics` served on `port`, None without a port"""
+    if port is None:
+        return None
+    from mipc_camera_client.metrics import Metrics, serve_metrics
+
+    metrics = Metrics()
+    serve_metrics(metrics, port)
+    return metrics
+
+
+def daemon(
+    socket_path: Optional[str], session_cache: bool, metrics_port: Optional[int]
+) -> None:
+    from mipc_camera_client.daemon import CameraDaemon
+
+    metrics = _serve_metrics(metrics_port)
+    d = CameraDaemon(
+        socket_path,
+        session_cache=SessionCache() if session_cache else None,
+        metrics=metrics,
+    )
+    # clean up the socket on kill too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        d.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("stopping")
+
+
+def relay(c: MipcCameraClient, bind: str, port: int, interval: float) -> None:
+    from mipc_camera_client.relay import RelayServer
+
+    with RelayServer([c], address=bind, port=port, interval=interval) as server:
+        print(f"{server.url}/latest.jpg")
+        print(f"{server.url}/stream.mjpeg")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            LOGGER.info("stopping")
+
+
+def _parse_position(value: str) -> "Position":
+    """`NAME=X,Y`"""
+    from mipc_camera_client.patrol import Position
+
+    try:
+        name, _, coords = value.partition("=")
+        x, y = coords.split(",")
+        return Position(name.strip(), int(x), int(y))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=X,Y, got {value!r}")
+
+
+def patrol(
+    c: MipcCameraClient,
+    output_dir: str,
+    position: List["Position"],
+    rounds: Optional[int],
+    duration: Optional[float],
+    speed_x: int,
+    speed_y: int,
+    rate: float,
+    settle: float,
+    rehome_every: int,
+) -> None:
+    from mipc_camera_client.patrol import MotionModel, Patrol
+
+    motion = MotionModel(speed_x, speed_y, rate, settle)
+    try:
+        p = Patrol(c, position, output_dir, motion, rehome_every)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+    LOGGER.info(
+        f"patrolling {' -> '.join(stop.name for stop in p.route)}, "
+        f"about {p.round_time:.1f}s of moving per round, Ctrl-C to stop"
+    )
+    try:
+        p.run(rounds, duration)
+    except KeyboardInterrupt:
+        LOGGER.info("stopping")
+    print(p.stats, file=sys.stderr)
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number, got {value}")
+    return number
+
+
+def _parse_origin(value: str) -> Tuple[int, int]:
+    try:
+        x, y = value.split(",")
+        return int(x), int(y)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected X,Y, got {value!r}")
+
+
+def panorama(
+    c: MipcCameraClient,
+    filename: str,
+    cols: int,
+    rows: int,
+    step_x: int,
+    step_y: int,
+    origin: Tuple[int, int],
+    scale: float,
+    speed_x: int,
+    speed_y: int,
+    rate: float,
+    settle: float,
+) -> None:
+    # needs numpy and Pillow, only import them when asked to
+    from mipc_camera_client.panorama import Panorama
+    from mipc_camera_client.patrol import MotionModel
+
+    motion = MotionModel(speed_x, speed_y, rate, settle)
+    p = Panorama(c, cols, rows, step_x, step_y, origin, motion, scale)
+    try:
+        image = p.run()
+    except (ValueError, OSError) as e:
+        # OSError: Pillow couldn't read a frame
+        raise SystemExit(f"Error: {e}")
+    image.save(filename, quality=90)
+    LOGGER.info(f"wrote {image.width}x{image.height} panorama to {filename}")
+
+
+# handlers that can run through the daemon when it's there
+DAEMON_HANDLERS = (snapshot, print_stream_url, ptz_handler)
+
+
+def _parse_hosts(value: Optional[str]) -> List[str]:
+    """`cam1,cam2`, or `@FILE` with one host per line (# comments allowed)"""
+    if not value:
+        return []
+    if value.startswith("@"):
+        lines = Path(value[1:]).read_text().splitlines()
+        return [h for line in lines if (h := line.split("#")[0].strip())]
+    return [h for h in value.replace(",", " ").split() if h]
+
+
+def _snapshot_many(args: argparse.Namespace) -> Callable[[MipcCameraClient], str]:
+    if args.archive:
+
+        def run(c):
+            snapshot(c, None, args.archive)
+            return args.archive
+
+        return run
+    directory = Path(args.filename or ".")
+    if not directory.is_dir():
+        raise SystemExit(
+            f"Error: with several hosts, snapshot needs a directory, not {directory}"
+        )
+
+    def run(c):
+        out_path = directory / _generate_filename(c)
+        size = _write_image_file(c, out_path)
+        return f"{out_path} ({size} bytes)"
+
+    return run
+
+
+def _ptz_many(args: argparse.Namespace) -> Callable[[MipcCameraClient], str]:
+    if args.stdin:
+        raise SystemExit("Error: ptz --stdin only works with a single host")
+
+    def run(c):
+        ptz_handler(c, args.x, args.y, args.zero, args.speed_x, args.speed_y, False)
+        return "ok"
+
+    return run
+
+
+# seconds to give each camera with several hosts, unless --timeout says otherwise
+MULTI_HOST_TIMEOUT = 30.0
+
+# how each command runs when given several hosts, returns what to print per camera
+MULTI_HOST_HANDLERS: Dict[Callable, Callable[[argparse.Namespace], Callable]] = {
+    snapshot: _snapshot_many,
+    print_stream_url: lambda args: lambda c: c.get_rtmp_stream(),
+    ptz_handler: _ptz_many,
+}
+
+
+def _run_many(
+    args: argparse.Namespace, hosts: List[str], password: str, metrics
+) -> int:
+    """run the command on all hosts concurrently, returns the number of failures"""
+    from mipc_camera_client.pool import MipcCameraPool
+    from mipc_camera_client.stats import LatencySummary
+
+    fn = MULTI_HOST_HANDLERS[args.handler](args)
+    session_cache = SessionCache() if args.session_cache else None
+    latencies = {}
+
+    def timed(c):
+        started = time.monotonic()
+        try:
+            return fn(c)
+        finally:
+            latencies[c.host] = time.monotonic() - started
+
+    def client_factory(host, **kwargs):
+        return MipcCameraClient(
+            host, session_cache=session_cache, metrics=metrics, **kwargs
+        )
+
+    LOGGER.info(f"running on {len(hosts)} cameras, {args.parallel} at a time")
+    with MipcCameraPool(
+        [(h, args.user, password) for h in hosts],
+        max_workers=args.parallel,
+        timeout=MULTI_HOST_TIMEOUT if args.timeout is None else args.timeout,
+        client_factory=client_factory,
+    ) as pool:
+        started = time.monotonic()
+        results = pool.map(timed, login=True)
+        elapsed = time.monotonic() - started
+        for c in pool.clients.values():
+            c.save_session()
+    failed = [h for h, r in results.items() if isinstance(r, BaseException)]
+    for host, result in results.items():
+        if host in failed:
+            print(f"{host}\tFAILED\t{result!r}", file=sys.stderr)
+        else:
+            print(f"{host}\t{result}")
+    summary = LatencySummary.of(latencies[h] for h in results if h not in failed)
+    print(
+        f"{len(results) - len(failed)} ok, {len(failed)} failed in {elapsed:.2f}s, "
+        f"per camera {summary}",
+        file=sys.stderr,
+    )
+    return len(failed)
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="CLI client for MIPC cameras")
     parser.add_argument(
         "--host",
         default=os.getenv("CAMERA_HOST"),
-        help="Camera address (hostname or IP), uses CAMERA_HOST env var if not supplied",
+        help="Camera address (hostname or IP), uses CAMERA_HOST env var if not supplied. "
+        "Several cameras as a comma separated list or @FILE with one per line "
+        "(snapshot, stream, ptz and timelapse only)",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=8,
+        metavar="N",
+        help="with several hosts, talk to up to N cameras at once (default: 8)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=_positive_float,
+        help="give up on a camera request after this many seconds "
+        f"(default: {MULTI_HOST_TIMEOUT:g} with several hosts, otherwise the HTTP timeouts)",
     )
     parser.add_argument(
         "--user",
@@ -79,6 +523,31 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         default=False,
         help="Silence all output except for the snapshot filename or stream URL")
+    parser.add_argument(
+        "--session-cache",
+        action="store_true",
+        default=False,
+        help="Reuse the camera session between runs instead of logging in every time "
+        "(stores the session key under ~/.cache/mipc_camera_client)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="serve request metrics for Prometheus on http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--socket",
+        dest="socket_path",
+        metavar="PATH",
+        help="Unix socket of the daemon (default: in $XDG_RUNTIME_DIR or /tmp)",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        default=False,
+        help="talk to the camera directly even if a daemon is running",
+    )
     subparsers = parser.add_subparsers(
         title="commands",
         description="Available commands",
@@ -94,6 +563,11 @@ def parse_args() -> argparse.Namespace:
         nargs="?",
         help="path to save to (use - for stdout or leave empty when piping)",
     )
+    snap_parser.add_argument(
+        "--archive",
+        metavar="DIR",
+        help="append the snapshot to the frame archive in DIR instead",
+    )
 
     stream_parser = subparsers.add_parser(
         "stream",
@@ -117,21 +591,260 @@ def parse_args() -> argparse.Namespace:
     ptz_parser.add_argument(
         "--speed-y", type=int, help="Y movement (relative)", default=50
     )
+    ptz_parser.add_argument(
+        "--stdin",
+        action="store_true",
+        help="read 'X Y' relative moves from stdin, one per line, merging moves that "
+        "arrive faster than the camera can follow",
+    )
     # --x=300 --y=80
 
     ptz_parser.set_defaults(handler=ptz_handler)
 
+    timelapse_parser = subparsers.add_parser(
+        "timelapse", help="take snapshots at a fixed interval until stopped"
+    )
+    timelapse_parser.set_defaults(handler=timelapse)
+    timelapse_parser.add_argument(
+        "output_dir", nargs="?", default="pictures", help="where to save the frames"
+    )
+    timelapse_parser.add_argument(
+        "--interval",
+        type=_positive_float,
+        default=5.0,
+        help="seconds between snapshots",
+    )
+    timelapse_parser.add_argument(
+        "--duration", type=float, help="stop after this many seconds (default: never)"
+    )
+    timelapse_parser.add_argument(
+        "--also-host",
+        action="append",
+        metavar="HOST",
+        help="capture this camera too (same credentials), can be repeated. "
+        "Same as adding it to --host",
+    )
+    timelapse_parser.add_argument(
+        "--writers", type=int, default=2, help="number of file writer threads"
+    )
+    timelapse_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=32,
+        help="frames waiting for the writers before new ones get dropped",
+    )
+    timelapse_parser.add_argument(
+        "--fsync-every",
+        type=int,
+        default=16,
+        help="fsync files in batches of this many (0 to never fsync)",
+    )
+    timelapse_parser.add_argument(
+        "--rotate",
+        default="%Y-%m-%d",
+        help="strftime format of the dated subdirectories, empty to disable",
+    )
+    timelapse_parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="append frames to segment archives in output_dir instead of one file each",
+    )
+    timelapse_parser.add_argument(
+        "--avi",
+        action="store_true",
+        help="append frames to an MJPEG AVI video per camera in output_dir instead",
+    )
+    timelapse_parser.add_argument(
+        "--avi-fps",
+        type=float,
+        default=25.0,
+        help="playback frame rate of the --avi videos",
+    )
+    timelapse_parser.add_argument(
+        "--min-change",
+        type=float,
+        metavar="FRACTION",
+        help="only store frames that differ from the last stored one by at least this "
+        "much (0-1, e.g. 0.02), needs numpy and Pillow",
+    )
+    timelapse_parser.add_argument(
+        "--change-method",
+        choices=["diff", "hash"],
+        default="diff",
+        help="pixel difference, or perceptual hash (ignores lighting changes)",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="export frames from an archive as JPEG files"
+    )
+    export_parser.set_defaults(handler=export, needs_camera=False)
+    export_parser.add_argument("archive_dir", help="the frame archive")
+    export_parser.add_argument("output_dir", help="where to write the JPEGs")
+    export_parser.add_argument(
+        "--sn", help="only this camera serial number (default: all)"
+    )
+    export_parser.add_argument(
+        "--start", help="ISO date/time of the first frame (UTC unless given)"
+    )
+    export_parser.add_argument(
+        "--end", help="ISO date/time of the last frame (UTC unless given)"
+    )
+
+    find_parser = subparsers.add_parser(
+        "find", help="find saved snapshots by time (keeps an index in ROOT/.mipc_index)"
+    )
+    find_parser.set_defaults(handler=find, needs_camera=False)
+    find_parser.add_argument(
+        "root", help="directory with the snapshots, searched recursively"
+    )
+    find_parser.add_argument(
+        "--sn", help="only this camera serial number (default: all)"
+    )
+    find_parser.add_argument(
+        "--at", help="the frame closest to this ISO date/time (UTC unless given)"
+    )
+    find_parser.add_argument(
+        "--start", help="ISO date/time of the first frame (UTC unless given)"
+    )
+    find_parser.add_argument(
+        "--end", help="ISO date/time of the last frame (UTC unless given)"
+    )
+
+    patrol_parser = subparsers.add_parser(
+        "patrol",
+        help="cycle through pan/tilt positions, taking a snapshot at each",
+    )
+    patrol_parser.set_defaults(handler=patrol)
+    patrol_parser.add_argument(
+        "output_dir", nargs="?", default="patrol", help="where to save the frames"
+    )
+    patrol_parser.add_argument(
+        "--position",
+        action="append",
+        type=_parse_position,
+        required=True,
+        metavar="NAME=X,Y",
+        help="a stop, X and Y relative to the --zero home position, can be repeated",
+    )
+    patrol_parser.add_argument(
+        "--rounds", type=int, help="stop after this many rounds (default: never)"
+    )
+    patrol_parser.add_argument(
+        "--duration", type=float, help="stop after this many seconds (default: never)"
+    )
+    patrol_parser.add_argument(
+        "--speed-x", type=int, default=80, help="pan motor speed"
+    )
+    patrol_parser.add_argument(
+        "--speed-y", type=int, default=50, help="tilt motor speed"
+    )
+    patrol_parser.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="units the camera moves per second per unit of speed, to estimate move times",
+    )
+    patrol_parser.add_argument(
+        "--settle",
+        type=float,
+        default=0.5,
+        help="seconds to let the picture steady after a move",
+    )
+    patrol_parser.add_argument(
+        "--rehome-every",
+        type=int,
+        default=0,
+        metavar="ROUNDS",
+        help="go back to the home position every this many rounds to undo drift",
+    )
+
+    panorama_parser = subparsers.add_parser(
+        "panorama",
+        help="sweep the camera over a grid of positions and stitch a panorama, "
+        "needs numpy and Pillow",
+    )
+    panorama_parser.set_defaults(handler=panorama)
+    panorama_parser.add_argument(
+        "filename", nargs="?", default="panorama.jpeg", help="where to save it"
+    )
+    panorama_parser.add_argument("--cols", type=int, default=3)
+    panorama_parser.add_argument("--rows", type=int, default=1)
+    panorama_parser.add_argument(
+        "--step-x",
+        type=int,
+        default=60,
+        help="pan between columns, frames should overlap by a third or more",
+    )
+    panorama_parser.add_argument(
+        "--step-y", type=int, default=40, help="tilt between rows"
+    )
+    panorama_parser.add_argument(
+        "--origin",
+        type=_parse_origin,
+        default=(0, 0),
+        metavar="X,Y",
+        help="first position, relative to the --zero home position",
+    )
+    panorama_parser.add_argument(
+        "--scale", type=float, default=1.0, help="scale the frames by this much"
+    )
+    panorama_parser.add_argument(
+        "--speed-x", type=int, default=80, help="pan motor speed"
+    )
+    panorama_parser.add_argument(
+        "--speed-y", type=int, default=50, help="tilt motor speed"
+    )
+    panorama_parser.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="units the camera moves per second per unit of speed, to estimate move times",
+    )
+    panorama_parser.add_argument(
+        "--settle",
+        type=float,
+        default=0.5,
+        help="seconds to let the picture steady after a move",
+    )
+
+    relay_parser = subparsers.add_parser(
+        "relay",
+        help="poll the camera once and serve the latest frame over HTTP to any number of viewers",
+    )
+    relay_parser.set_defaults(handler=relay)
+    relay_parser.add_argument(
+        "--bind", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)"
+    )
+    relay_parser.add_argument(
+        "--port", type=int, default=8080, help="port to listen on (default: 8080)"
+    )
+    relay_parser.add_argument(
+        "--interval",
+        type=_positive_float,
+        default=1.0,
+        help="seconds between snapshots",
+    )
+
+    daemon_parser = subparsers.add_parser(
+        "daemon",
+        help="keep camera sessions open and serve snapshot/stream/ptz from other runs",
+    )
+    daemon_parser.set_defaults(handler=daemon, needs_camera=False)
+
     return parser.parse_args()
 
 
-def _run_handler(args: argparse.Namespace, c: MipcCameraClient):
+def _run_handler(args: argparse.Namespace, c: Optional[MipcCameraClient]):
     # sorry
     handler_arg_names = inspect.getfullargspec(args.handler).args
     args_dict = vars(args)
     handler_args = {
         name: args_dict[name] for name in handler_arg_names if name not in ("c")
     }
-    args.handler(c, **handler_args)
+    if "c" in handler_arg_names:
+        args.handler(c, **handler_args)
+    else:
+        args.handler(**handler_args)
 
 
 def main():
@@ -143,14 +856,61 @@ def main():
     args = parse_args()
     if args.quiet:
         logging.getLogger().setLevel(logging.CRITICAL)
+    if not getattr(args, "needs_camera", True):
+        _run_handler(args, None)
+        return
     if "CAMERA_PASSWORD" not in os.environ:
         print("Error: environment variable CAMERA_PASSWORD not set", file=sys.stderr)
         sys.exit(2)
+    hosts = _parse_hosts(args.host)
+    if args.handler is timelapse:
+        # timelapse captures all the cameras itself, on one clock
+        hosts += args.also_host or []
+        args.also_host = hosts[1:]
+        hosts = hosts[:1]
+    if len(hosts) > 1:
+        if args.handler not in MULTI_HOST_HANDLERS:
+            print("Error: this command only works with a single host", file=sys.stderr)
+            sys.exit(2)
+        metrics = _serve_metrics(args.metrics_port)
+        failures = _run_many(args, hosts, os.environ["CAMERA_PASSWORD"], metrics)
+        sys.exit(1 if failures else 0)
+    args.host = hosts[0] if hosts else args.host
+    timeout = {} if args.timeout is None else {"timeout": args.timeout}
+    if args.handler in DAEMON_HANDLERS and not args.no_daemon:
+        from mipc_camera_client.daemon import DaemonCamera, DaemonUnavailable
+
+        try:
+            c = DaemonCamera.connect(
+                args.host,
+                args.user,
+                os.environ["CAMERA_PASSWORD"],
+                args.socket_path,
+                **timeout,
+            )
+        except DaemonUnavailable:
+            pass
+        else:
+            LOGGER.debug(f"using the daemon on {c.daemon.socket_path}")
+            try:
+                _run_handler(args, c)
+            finally:
+                c.close()
+            return
+    metrics = _serve_metrics(args.metrics_port)
     LOGGER.info(f"Logging into {args.host} as {args.user}")
-    c = MipcCameraClient(args.host)
+    c = MipcCameraClient(
+        args.host,
+        session_cache=SessionCache() if args.session_cache else None,
+        metrics=metrics,
+        **timeout,
+    )
     c.login(args.user, os.environ["CAMERA_PASSWORD"])
 
-    _run_handler(args, c)
+    try:
+        _run_handler(args, c)
+    finally:
+        c.save_session()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,405 @@
+"""
+A local daemon that keeps logged-in clients around, so short-lived CLI runs skip DH + login.
+
+The daemon listens on a Unix socket (only accessible to the current user). The
+protocol is one JSON line per request:
+
+    {"op": "snapshot", "host": ..., "user": ..., "password": ..., "args": {...}}
+
+answered by a JSON line `{"ok": true, "result": ..., "size": N}` followed by N bytes
+of payload (the JPEG for snapshots), or `{"ok": false, "error": "..."}`. A connection
+can carry any number of requests.
+"""
+import hmac
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from . import MipcCameraClient
+from .metrics import MetricsHook
+from .session_cache import SessionCache
+from .transport import Transport
+
+LOGGER = logging.getLogger(__name__)
+
+# seconds `DaemonCamera.connect` waits for the ping, a hung daemon shouldn't hold up the CLI
+PING_TIMEOUT = 2.0
+
+__all__ = [
+    "CameraDaemon",
+    "DaemonCamera",
+    "DaemonClient",
+    "DaemonError",
+    "DaemonUnavailable",
+    "default_socket_path",
+]
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "mipc_camera_client.sock"
+    # a directory of our own, anyone can create files directly in /tmp
+    directory = Path(tempfile.gettempdir()) / f"mipc_camera_client-{os.getuid()}"
+    return directory / "daemon.sock"
+
+
+class DaemonUnavailable(ConnectionError):
+    """no daemon is listening on the socket"""
+
+
+def _check_private(socket_path: Path) -> None:
+    """
+    raises `PermissionError` unless the socket's directory is ours with mode 0700, and
+    the socket (if it's there) ours too. Otherwise another user could have put a
+    socket there to collect the passwords sent to the daemon.
+    """
+    st = os.lstat(socket_path.parent)
+    if (
+        not stat.S_ISDIR(st.st_mode)
+        or st.st_uid != os.getuid()
+        or stat.S_IMODE(st.st_mode) != 0o700
+    ):
+        raise PermissionError(
+            f"{socket_path.parent} has to be a directory owned by the current user "
+            "with mode 0700"
+        )
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} is owned by another user")
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """uid of the process on the other end, None where SO_PEERCRED isn't supported"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    return struct.unpack("3i", creds)[1]
+
+
+class DaemonError(Exception):
+    """the daemon got the request but it failed"""
+
+
+class _Session:
+    def __init__(self, client: MipcCameraClient, password: str) -> None:
+        self.client = client
+        self.password = password
+        self.lock = threading.Lock()
+        self.logged_in = False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            payload = b""
+            try:
+                request = json.loads(line)
+                result, payload = self.server.daemon.dispatch(request)
+                header = {"ok": True, "result": result, "size": len(payload)}
+            except Exception as e:
+                LOGGER.warning(f"request failed: {e!r}")
+                header = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                payload = b""
+            self.wfile.write(json.dumps(header).encode() + b"\n" + payload)
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    daemon: "CameraDaemon"
+
+
+class CameraDaemon:
+    """
+    serves snapshot/stream/ptz requests over a Unix socket with one warm client per host+user.
+
+    A request with a different password than the one the client logged in with gets
+    a fresh login, which replaces the old client if it works.
+    """
+
+    def __init__(
+        self,
+        socket_path: Union[str, Path, None] = None,
+        session_cache: Optional[SessionCache] = None,
+        metrics: Optional[MetricsHook] = None,
+    ) -> None:
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.session_cache = session_cache
+        self.metrics = metrics
+        self.transport = Transport()
+        self._sessions: Dict[Tuple[str, str], _Session] = {}
+        # sessions still logging in, concurrent requests for them wait on the same login
+        self._pending: Dict[Tuple[str, str], _Session] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+
+    def __repr__(self) -> str:
+        return f"CameraDaemon(socket_path={str(self.socket_path)!r}, sessions={len(self._sessions)})"
+
+    def _client(self, host: str, user: str, password: str) -> MipcCameraClient:
+        key = (host, user)
+
+        def matches(session: Optional[_Session]) -> bool:
+            return session is not None and hmac.compare_digest(
+                session.password.encode(), password.encode()
+            )
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if not matches(session):
+                session = self._pending.get(key)
+                if not matches(session):
+                    session = _Session(
+                        MipcCameraClient(
+                            host,
+                            session_cache=self.session_cache,
+                            transport=self.transport,
+                            metrics=self.metrics,
+                        ),
+                        password,
+                    )
+                    self._pending[key] = session
+        try:
+            with session.lock:
+                if not session.logged_in:
+                    LOGGER.info(f"Logging into {host} as {user}")
+                    session.client.login(user, password)
+                    session.logged_in = True
+        finally:
+            with self._lock:
+                if self._pending.get(key) is session:
+                    del self._pending[key]
+                    if session.logged_in:
+                        self._sessions[key] = session
+        return session.client
+
+    def dispatch(self, request: Dict[str, Any]) -> Tuple[Any, bytes]:
+        """run one request, returns (JSON result, payload)"""
+        op = request["op"]
+        if op == "ping":
+            return "pong", b""
+        c = self._client(request["host"], request["user"], request["password"])
+        args = request.get("args", {})
+        if op == "info":
+            return {"sn": c.get_device_sn()}, b""
+        if op == "snapshot":
+            return None, c.get_image()
+        if op == "stream":
+            return c.get_rtmp_stream(**args), b""
+        if op == "ptz":
+            c.control_ptz(**args)
+            return None, b""
+        raise ValueError(f"unknown op {op!r}")
+
+    def bind(self) -> None:
+        try:
+            self.socket_path.parent.mkdir(mode=0o700, parents=True)
+        except FileExistsError:
+            pass
+        _check_private(self.socket_path)
+        if self.socket_path.exists():
+            try:
+                with DaemonClient(self.socket_path, timeout=5.0) as other:
+                    other.ping()
+            except DaemonUnavailable:
+                # left behind by a daemon that didn't exit cleanly
+                self.socket_path.unlink()
+            else:
+                raise RuntimeError(f"a daemon is already running on {self.socket_path}")
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(str(self.socket_path), _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+
+    def serve_forever(self) -> None:
+        if self._server is None:
+            self.bind()
+        LOGGER.info(f"listening on {self.socket_path}")
+        try:
+            self._server.serve_forever(poll_interval=0.1)
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        """stop `serve_forever` from another thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            self.socket_path.unlink(missing_ok=True)
+        with self._lock:
+            for session in self._sessions.values():
+                session.client.save_session()
+        self.transport.close()
+
+
+class DaemonClient:
+    """talks to a `CameraDaemon`, keeps one connection open for all requests"""
+
+    def __init__(
+        self, socket_path: Union[str, Path, None] = None, timeout: float = 60.0
+    ) -> None:
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+
+    def __repr__(self) -> str:
+        return f"DaemonClient(socket_path={str(self.socket_path)!r})"
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+            self._sock = self._rfile = None
+
+    def _connect(self) -> None:
+        try:
+            _check_private(self.socket_path)
+        except FileNotFoundError as e:
+            raise DaemonUnavailable(f"no daemon on {self.socket_path}: {e}") from e
+        except PermissionError as e:
+            LOGGER.warning(f"not using the daemon: {e}")
+            raise DaemonUnavailable(str(e)) from e
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except (FileNotFoundError, ConnectionRefusedError, TimeoutError) as e:
+            sock.close()
+            raise DaemonUnavailable(f"no daemon on {self.socket_path}: {e}") from e
+        uid = _peer_uid(sock)
+        if uid is not None and uid != os.getuid():
+            sock.close()
+            LOGGER.warning(
+                f"not using the daemon: {self.socket_path} belongs to uid {uid}"
+            )
+            raise DaemonUnavailable(f"{self.socket_path} is served by another user")
+        self._sock = sock
+        self._rfile = sock.makefile("rb")
+
+    def request(self, op: str, **fields) -> Tuple[Any, bytes]:
+        if self._sock is None:
+            self._connect()
+        try:
+            self._sock.sendall(json.dumps({"op": op, **fields}).encode() + b"\n")
+            line = self._rfile.readline()
+            if line:
+                header = json.loads(line)
+                size = header.get("size")
+                payload = self._rfile.read(size) if size else b""
+        except TimeoutError as e:
+            # the connection is out of step now, a late answer would go to the next request
+            self.close()
+            raise DaemonUnavailable(
+                f"daemon on {self.socket_path} did not answer within {self.timeout}s"
+            ) from e
+        if not line:
+            self.close()
+            raise DaemonUnavailable(f"daemon on {self.socket_path} hung up")
+        if not header["ok"]:
+            raise DaemonError(header["error"])
+        return header["result"], payload
+
+    def ping(self, timeout: Optional[float] = None) -> None:
+        """raises `DaemonUnavailable` unless the daemon answers within `timeout` (default: `self.timeout`)"""
+        if self._sock is None:
+            self._connect()
+        if timeout is not None:
+            self._sock.settimeout(timeout)
+        try:
+            self.request("ping")
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(self.timeout)
+
+
+class DaemonCamera:
+    """
+    stands in for a `MipcCameraClient` in the CLI handlers, running everything through
+    the daemon. Only the methods `snapshot`, `stream` and `ptz` need are there.
+    """
+
+    def __init__(
+        self, daemon: DaemonClient, host: str, user: str, password: str
+    ) -> None:
+        self.daemon = daemon
+        self.host = host
+        self._auth = {"host": host, "user": user, "password": password}
+        self._sn: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"DaemonCamera(host={self.host!r}, daemon={self.daemon!r})"
+
+    @classmethod
+    def connect(
+        cls,
+        host: str,
+        user: str,
+        password: str,
+        socket_path: Union[str, Path, None] = None,
+        timeout: float = 60.0,
+    ) -> "DaemonCamera":
+        """raises `DaemonUnavailable` if there's no daemon, or it doesn't answer the ping"""
+        daemon = DaemonClient(socket_path, timeout=timeout)
+        daemon.ping(min(timeout, PING_TIMEOUT))
+        return cls(daemon, host, user, password)
+
+    def _request(self, op: str, **args) -> Tuple[Any, bytes]:
+        return self.daemon.request(op, args=args, **self._auth)
+
+    def get_device_sn(self) -> Optional[str]:
+        if self._sn is None:
+            self._sn = self._request("info")[0]["sn"]
+        return self._sn
+
+    def get_image(self) -> bytes:
+        return self._request("snapshot")[1]
+
+    def get_image_into(self, target) -> int:
+        data = self.get_image()
+        write = getattr(target, "write", None) or target.sendall
+        write(data)
+        return len(data)
+
+    def get_rtmp_stream(self, token: str = "p0") -> str:
+        return self._request("stream", token=token)[0]
+
+    def control_ptz(self, tilt_x, tilt_y, speed_x=48, speed_y=16) -> None:
+        self._request(
+            "ptz", tilt_x=tilt_x, tilt_y=tilt_y, speed_x=speed_x, speed_y=speed_y
+        )
+
+    def save_session(self) -> None:
+        # the daemon owns the session
+        pass
+
+    def close(self) -> None:
+        self.daemon.close()
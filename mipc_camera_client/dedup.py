@@ -0,0 +1,131 @@
+"""
+Duplicate frame detection and a short-lived shared response cache for `get_image`.
+
+Polled faster than they refresh, some cameras hand out the exact same JPEG again.
+`SnapshotSource` hashes every frame and remembers the last few digests, so callers
+can tell (or skip) repeats. With `max_age`, callers asking within that many seconds
+of the last request get its response instead of hitting the camera again.
+"""
+import collections
+import hashlib
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from . import MipcCameraClient
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Snapshot", "SnapshotSource", "SnapshotSourceStats"]
+
+
+class Snapshot(NamedTuple):
+    data: bytes
+    # blake2b of the data, 16 bytes
+    digest: bytes
+    # time.monotonic() when the camera answered
+    fetched_at: float
+    # same bytes as one of the recent frames from this camera
+    duplicate: bool
+    # another caller's response, served from the cache
+    cached: bool
+
+
+class SnapshotSourceStats(NamedTuple):
+    # ccm_pic_get requests actually sent
+    requests: int
+    cache_hits: int
+    duplicates: int
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class SnapshotSource:
+    """
+    wraps a client's `get_image` with duplicate detection and an optional response cache.
+
+    `history` is how many recent digests are remembered (an LRU, a repeat moves its
+    digest to the front). `max_age` is in seconds, 0 disables the cache. One source
+    is meant to be shared by everything reading from the camera, it's thread safe:
+    while a request is running, other callers wait for it and share its result.
+    """
+
+    def __init__(
+        self, client: MipcCameraClient, max_age: float = 0.0, history: int = 16
+    ) -> None:
+        self.client = client
+        self.max_age = max_age
+        self.history = history
+        self._digests: "collections.OrderedDict[bytes, None]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._last: Optional[Snapshot] = None
+        self._requests = 0
+        self._cache_hits = 0
+        self._duplicates = 0
+
+    def __repr__(self) -> str:
+        return f"SnapshotSource(client={self.client!r}, max_age={self.max_age}, history={self.history})"
+
+    @property
+    def host(self) -> str:
+        return self.client.host
+
+    def get_device_sn(self) -> Optional[str]:
+        return self.client.get_device_sn()
+
+    def _seen(self, digest: bytes) -> bool:
+        """whether `digest` is in the recent history, and remember it"""
+        with self._lock:
+            self._requests += 1
+            if digest in self._digests:
+                self._digests.move_to_end(digest)
+                self._duplicates += 1
+                return True
+            self._digests[digest] = None
+            if len(self._digests) > self.history:
+                self._digests.popitem(last=False)
+            return False
+
+    def _fetch(self) -> Snapshot:
+        data = self.client.get_image()
+        digest = _digest(data)
+        duplicate = self._seen(digest)
+        if duplicate:
+            LOGGER.debug(f"{self.host}: camera returned a frame it already sent")
+        return Snapshot(data, digest, time.monotonic(), duplicate, cached=False)
+
+    def get(self) -> Snapshot:
+        """the current frame, fresh from the camera or from the cache"""
+        if self.max_age <= 0:
+            return self._fetch()
+        with self._fetch_lock:
+            last = self._last
+            if last is not None and time.monotonic() - last.fetched_at <= self.max_age:
+                with self._lock:
+                    self._cache_hits += 1
+                return last._replace(cached=True)
+            self._last = self._fetch()
+            return self._last
+
+    def get_image(self) -> Optional[bytes]:
+        """
+        the current frame, or None if the camera sent a duplicate. Cached responses
+        count as new, so several consumers can share a frame.
+        """
+        snapshot = self.get()
+        if snapshot.duplicate and not snapshot.cached:
+            return None
+        return snapshot.data
+
+    @property
+    def stats(self) -> SnapshotSourceStats:
+        with self._lock:
+            return SnapshotSourceStats(
+                self._requests, self._cache_hits, self._duplicates
+            )
@@ -0,0 +1,38 @@
+"""
+naming of saved snapshots: `{UTC timestamp}_{camera serial number}.jpeg`
+"""
+import datetime
+import re
+from typing import Optional, Tuple, Union
+
+__all__ = ["TIMESTAMP_FORMAT", "snapshot_filename", "parse_snapshot_filename"]
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H-%M-%S.%f%Z"
+
+
+def snapshot_filename(
+    sn: Optional[str], when: Union[datetime.datetime, float, None] = None
+) -> str:
+    """`when` is a datetime or a unix timestamp, defaults to now"""
+    if when is None:
+        when = datetime.datetime.now(datetime.timezone.utc)
+    elif not isinstance(when, datetime.datetime):
+        when = datetime.datetime.fromtimestamp(when, datetime.timezone.utc)
+    return (
+        f"{when.astimezone(datetime.timezone.utc).strftime(TIMESTAMP_FORMAT)}_{sn}.jpeg"
+    )
+
+
+_FILENAME_RE = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)T(\d\d)-(\d\d)-(\d\d)\.(\d{6})UTC_(?P<sn>.*)\.jpeg"
+)
+
+
+def parse_snapshot_filename(name: str) -> Optional[Tuple[float, str]]:
+    """(unix timestamp, serial number) of a `snapshot_filename`, None for other files"""
+    m = _FILENAME_RE.fullmatch(name)
+    if m is None:
+        return None
+    # strptime is slow, and this runs over every file in an archive
+    when = datetime.datetime(*map(int, m.groups()[:7]), tzinfo=datetime.timezone.utc)
+    return when.timestamp(), m.group("sn")
@@ -0,0 +1,188 @@
+"""
+Continuous snapshot capture on a background thread.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Deque, Iterator, NamedTuple, Optional
+
+from . import MipcCameraClient
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Frame", "FrameGrabber", "GrabberStats"]
+
+# seconds to wait after a failed grab when there's no capture rate to pace us
+ERROR_BACKOFF = 1.0
+
+
+class Frame(NamedTuple):
+    index: int
+    # wall clock time (time.time()) when the request was sent
+    timestamp: float
+    # seconds the camera took to deliver the frame
+    latency: float
+    data: bytes
+
+
+class GrabberStats(NamedTuple):
+    captured: int
+    # frames pushed out of the ring before anyone consumed them
+    dropped: int
+    # capture slots skipped because the camera was slower than the requested rate
+    missed_ticks: int
+    errors: int
+    # achieved capture rate over the last few frames
+    fps: float
+    # frames the client reported as repeats (get_image returned None), see `dedup`
+    duplicates: int = 0
+
+
+class FrameGrabber:
+    """
+    grabs frames with `client.get_image()` on a fixed-rate clock into a bounded ring.
+
+    Captures are scheduled at `start + n * interval` rather than sleeping after each
+    request, so the period doesn't drift by the request latency. With `fps=None` it
+    grabs back to back as fast as the camera allows. The capture thread never waits
+    for consumers: when the ring is full the oldest frame is dropped.
+
+    `client` can also be a `dedup.SnapshotSource`, duplicate frames are then skipped.
+    """
+
+    def __init__(
+        self,
+        client: MipcCameraClient,
+        fps: Optional[float] = None,
+        buffer_size: int = 4,
+        fps_window: int = 30,
+    ) -> None:
+        if fps is not None and fps <= 0:
+            raise ValueError(f"fps must be positive, got {fps}")
+        self.client = client
+        self.interval = 1 / fps if fps else 0.0
+        self._ring: Deque[Frame] = collections.deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._capture_times: Deque[float] = collections.deque(maxlen=fps_window)
+        self._captured = 0
+        self._dropped = 0
+        self._missed_ticks = 0
+        self._errors = 0
+        self._duplicates = 0
+
+    def __repr__(self) -> str:
+        return f"FrameGrabber(client={self.client!r}, interval={self.interval})"
+
+    def __enter__(self) -> "FrameGrabber":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "FrameGrabber":
+        if self.running:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"FrameGrabber-{self.client.host}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """stop capturing, frames already in the ring can still be read"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            sent_at = time.time()
+            started = time.monotonic()
+            failed = False
+            try:
+                data = self.client.get_image()
+            except Exception as e:
+                self._errors += 1
+                LOGGER.warning(f"{self.client.host}: failed to grab frame: {e!r}")
+                data, failed = None, True
+            now = time.monotonic()
+            if data is not None:
+                self._push(Frame(self._captured, sent_at, now - started, data), now)
+            elif not failed:
+                self._duplicates += 1
+            if not self.interval:
+                if failed:
+                    # don't spin on a camera that's down
+                    self._stop.wait(ERROR_BACKOFF)
+                continue
+            next_tick += self.interval
+            if next_tick < now:
+                # too slow for the requested rate, skip the slots we missed instead of bursting
+                missed = int((now - next_tick) // self.interval) + 1
+                self._missed_ticks += missed
+                next_tick += missed * self.interval
+            self._stop.wait(next_tick - now)
+
+    def _push(self, frame: Frame, now: float) -> None:
+        with self._cond:
+            if len(self._ring) == self._ring.maxlen:
+                self._dropped += 1
+            self._ring.append(frame)
+            self._captured += 1
+            self._capture_times.append(now)
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Frame]:
+        """take the oldest unread frame, waiting for one if needed. None on timeout/stop."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._ring or self._stop.is_set(), timeout=timeout
+            )
+            return self._ring.popleft() if self._ring else None
+
+    def latest(self, timeout: Optional[float] = None) -> Optional[Frame]:
+        """take the newest frame and discard the older unread ones"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._ring or self._stop.is_set(), timeout=timeout
+            )
+            if not self._ring:
+                return None
+            frame = self._ring.pop()
+            self._dropped += len(self._ring)
+            self._ring.clear()
+            return frame
+
+    def __iter__(self) -> Iterator[Frame]:
+        """yields frames in order until the grabber is stopped"""
+        while (frame := self.get()) is not None:
+            yield frame
+
+    @property
+    def stats(self) -> GrabberStats:
+        with self._cond:
+            times = self._capture_times
+            fps = (
+                (len(times) - 1) / (times[-1] - times[0])
+                if len(times) > 1 and times[-1] > times[0]
+                else 0.0
+            )
+            return GrabberStats(
+                captured=self._captured,
+                dropped=self._dropped,
+                missed_ticks=self._missed_ticks,
+                errors=self._errors,
+                fps=fps,
+                duplicates=self._duplicates,
+            )
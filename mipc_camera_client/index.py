@@ -0,0 +1,292 @@
+"""
+Time index over directories of snapshots named `{timestamp}_{sn}.jpeg`.
+
+The index lives in `{root}/.mipc_index/`: one `{sn}.tsv` per camera with sorted
+`timestamp<TAB>relative path` lines, and `dirs.json` with the mtime and number of
+indexed snapshots of every directory.
+
+Lookups binary search the memory-mapped TSV, so they read a few dozen lines however
+big the archive is. Updates stat the known directories and only list the ones whose
+mtime changed, new snapshots are looked up in the TSV to tell them from indexed ones.
+Snapshots that go after everything indexed are appended, anything else (older
+snapshots showing up, deleted ones) rewrites the camera's TSV.
+"""
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from .filenames import parse_snapshot_filename
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["FrameIndex", "IndexEntry"]
+
+INDEX_DIR = ".mipc_index"
+
+
+class IndexEntry(NamedTuple):
+    timestamp: float
+    path: Path
+
+
+def _parse_line(data, start: int) -> Tuple[float, str, int]:
+    """(timestamp, relative path, start of the next line) of the line at `start`"""
+    end = data.find(b"\n", start)
+    if end < 0:
+        end = len(data)
+    ts, _, rel = bytes(data[start:end]).decode().partition("\t")
+    return float(ts), rel, end + 1
+
+
+def _format_line(timestamp: float, rel: str) -> str:
+    return f"{timestamp!r}\t{rel}\n"
+
+
+class _Camera:
+    """the sorted TSV of one camera, memory-mapped for lookups"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+
+    @property
+    def data(self) -> bytes:
+        if self._map is None:
+            try:
+                with self.path.open("rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                # ValueError: empty file, can't map that
+                return b""
+        return self._map
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self) -> int:
+        return self.data[:].count(b"\n")
+
+    def seek(self, timestamp: float, after: bool = False) -> int:
+        """offset of the first line with a timestamp >= `timestamp` (> with `after`)"""
+        data = self.data
+        lo, hi = 0, len(data)
+        while lo < hi:
+            # the line that the middle falls into
+            start = data.rfind(b"\n", 0, (lo + hi) // 2) + 1
+            ts, _, end = _parse_line(data, start)
+            if ts < timestamp or (after and ts == timestamp):
+                lo = end
+            else:
+                hi = start
+        return lo
+
+    def entries(self, start: int, end: int) -> Iterator[Tuple[float, str]]:
+        data = self.data
+        while start < end:
+            ts, rel, start = _parse_line(data, start)
+            yield ts, rel
+
+    def contains(self, timestamp: float, rel: str) -> bool:
+        start = self.seek(timestamp)
+        return any(
+            r == rel for _, r in self.entries(start, self.seek(timestamp, after=True))
+        )
+
+    def last_timestamp(self) -> Optional[float]:
+        data = self.data
+        if not data:
+            return None
+        return _parse_line(data, data.rfind(b"\n", 0, len(data) - 1) + 1)[0]
+
+
+class FrameIndex:
+    """
+    nearest/range lookups over the snapshots under `root`.
+
+    `update()` (called on construction unless `update=False`) picks up new and
+    deleted files and saves the index.
+    """
+
+    def __init__(self, root: Union[str, Path], update: bool = True) -> None:
+        self.root = Path(root)
+        self._index_dir = self.root / INDEX_DIR
+        self._cameras: Dict[str, _Camera] = {}
+        # relative directory -> [mtime_ns, number of snapshots indexed in it]
+        self._dirs: Dict[str, List[int]] = {}
+        self._load()
+        if update:
+            self.update()
+
+    def __repr__(self) -> str:
+        return f"FrameIndex(root={str(self.root)!r}, cameras={self.cameras()})"
+
+    def _load(self) -> None:
+        try:
+            dirs = json.loads((self._index_dir / "dirs.json").read_text())
+        except FileNotFoundError:
+            return
+        if any(not isinstance(v, list) for v in dirs.values()):
+            # written before the counts were kept, index everything again
+            LOGGER.info(f"rebuilding the index of {self.root}")
+            for tsv in self._index_dir.glob("*.tsv"):
+                tsv.unlink()
+            return
+        self._dirs = dirs
+        for tsv in self._index_dir.glob("*.tsv"):
+            self._cameras[tsv.stem] = _Camera(tsv)
+
+    def _camera(self, sn: str) -> _Camera:
+        camera = self._cameras.get(sn)
+        if camera is None:
+            camera = self._cameras[sn] = _Camera(self._index_dir / f"{sn}.tsv")
+        return camera
+
+    def _walk(
+        self,
+    ) -> Iterator[Tuple[str, os.stat_result, Optional[List[os.DirEntry]]]]:
+        """
+        (relative dir, stat, entries) of every directory under root except the index,
+        entries are only listed for the directories that changed, None for the others
+        """
+        children: Dict[str, List[str]] = {}
+        for rel in self._dirs:
+            if rel:
+                children.setdefault(rel.rpartition("/")[0], []).append(rel)
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = self.root / rel if rel else self.root
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            known = self._dirs.get(rel)
+            if known is not None and known[0] == st.st_mtime_ns:
+                stack.extend(children.get(rel, ()))
+                yield rel, st, None
+                continue
+            with os.scandir(path) as it:
+                entries = list(it)
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and entry.name != INDEX_DIR:
+                    stack.append(f"{rel}/{entry.name}" if rel else entry.name)
+            yield rel, st, entries
+
+    def update(self) -> int:
+        """index new files and forget deleted ones, returns how many directories were rescanned"""
+        # before the walk, creating it changes the mtime of root
+        self._index_dir.mkdir(exist_ok=True)
+        rescanned = 0
+        seen = set()
+        added: Dict[str, List[Tuple[float, str]]] = {}
+        # directories that lost snapshots -> the names still in them
+        purged: Dict[str, Set[str]] = {}
+        for rel, st, entries in self._walk():
+            seen.add(rel)
+            if entries is None:
+                continue
+            rescanned += 1
+            prefix = f"{rel}/" if rel else ""
+            names = set()
+            indexed = 0
+            for entry in entries:
+                parsed = parse_snapshot_filename(entry.name)
+                if parsed is None or not entry.is_file():
+                    continue
+                names.add(entry.name)
+                ts, sn = parsed
+                if self._camera(sn).contains(ts, prefix + entry.name):
+                    indexed += 1
+                else:
+                    added.setdefault(sn, []).append((ts, prefix + entry.name))
+            known = self._dirs.get(rel)
+            if known is not None and indexed < known[1]:
+                purged[rel] = names
+            self._dirs[rel] = [st.st_mtime_ns, len(names)]
+        for rel in set(self._dirs) - seen:
+            # whole directory is gone
+            purged[rel] = set()
+            del self._dirs[rel]
+            rescanned += 1
+        if rescanned:
+            LOGGER.debug(f"rescanned {rescanned} directories under {self.root}")
+            self._save(added, purged)
+        return rescanned
+
+    def _save(
+        self, added: Dict[str, List[Tuple[float, str]]], purged: Dict[str, Set[str]]
+    ) -> None:
+        # without knowing which cameras the deleted snapshots were of, all are rewritten
+        for sn in set(self._cameras) if purged else set(added):
+            camera = self._camera(sn)
+            new = sorted(added.get(sn, ()))
+            last = camera.last_timestamp()
+            if not purged and (last is None or new[0][0] >= last):
+                camera.close()
+                with camera.path.open("a") as f:
+                    f.writelines(_format_line(ts, rel) for ts, rel in new)
+                continue
+            entries = [
+                (ts, rel)
+                for ts, rel in camera.entries(0, len(camera.data))
+                if not self._was_deleted(rel, purged)
+            ]
+            # two sorted runs, that's a merge for timsort
+            entries += new
+            entries.sort()
+            camera.close()
+            tmp = camera.path.with_suffix(".tmp")
+            with tmp.open("w") as f:
+                f.writelines(_format_line(ts, rel) for ts, rel in entries)
+            os.replace(tmp, camera.path)
+        tmp = self._index_dir / "dirs.json.tmp"
+        tmp.write_text(json.dumps(self._dirs))
+        os.replace(tmp, self._index_dir / "dirs.json")
+
+    @staticmethod
+    def _was_deleted(rel: str, purged: Dict[str, Set[str]]) -> bool:
+        directory, _, name = rel.rpartition("/")
+        remaining = purged.get(directory)
+        return remaining is not None and name not in remaining
+
+    def cameras(self) -> List[str]:
+        return sorted(sn for sn, c in self._cameras.items() if c.data)
+
+    def __len__(self) -> int:
+        return sum(len(c) for c in self._cameras.values())
+
+    def _entry(self, timestamp: float, rel: str) -> IndexEntry:
+        return IndexEntry(timestamp, self.root / rel)
+
+    def nearest(self, sn: str, timestamp: float) -> Optional[IndexEntry]:
+        """the frame of camera `sn` closest in time to `timestamp`"""
+        camera = self._cameras.get(sn)
+        if camera is None or not camera.data:
+            return None
+        data = camera.data
+        i = camera.seek(timestamp)
+        candidates = []
+        if i > 0:
+            candidates.append(_parse_line(data, data.rfind(b"\n", 0, i - 1) + 1))
+        if i < len(data):
+            candidates.append(_parse_line(data, i))
+        # the earlier one on a tie
+        ts, rel, _ = min(candidates, key=lambda c: abs(c[0] - timestamp))
+        return self._entry(ts, rel)
+
+    def between(self, sn: str, start: float, end: float) -> List[IndexEntry]:
+        """frames of camera `sn` with start <= timestamp <= end, in order"""
+        camera = self._cameras.get(sn)
+        if camera is None:
+            return []
+        return [
+            self._entry(ts, rel)
+            for ts, rel in camera.entries(
+                camera.seek(start), camera.seek(end, after=True)
+            )
+        ]
@@ -0,0 +1,78 @@
+"""
+parsing the JS object literals the cameras send back.
+
+json5 handles everything but it's pure python and slow. The camera responses are
+plain JSON apart from unquoted keys and single quoted strings, so we rewrite those
+with one regex pass and let the C json decoder do the rest, falling back to json5
+for anything fancier (comments, hex numbers, js escapes...).
+"""
+import json
+import re
+from typing import Any, Callable, Dict, Literal
+
+import json5
+
+__all__ = ["JsonpParser", "loads", "loads_fast", "PARSERS"]
+
+JsonpParser = Literal["fast", "json5"]
+
+# strings are matched first so anything that looks like a key inside a string is left alone
+_TOKENS = re.compile(
+    r"""
+    (?P<dq>"(?:[^"\\]|\\.)*")
+    | '(?P<sq>(?:[^'\\]|\\.)*)'
+    | (?P<key>[A-Za-z_$][\w$]*)(?=\s*:)
+    | ,(?P<trailing>\s*[}\]])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_SQ_ESCAPES = re.compile(r'\\.|"', re.DOTALL)
+
+
+def _sq_escape(m: re.Match) -> str:
+    s = m.group(0)
+    if s == "\\'":
+        return "'"
+    if s == '"':
+        return '\\"'
+    return s
+
+
+def _normalize_token(m: re.Match) -> str:
+    kind = m.lastgroup
+    if kind == "dq":
+        return m.group(0)
+    if kind == "sq":
+        return '"' + _SQ_ESCAPES.sub(_sq_escape, m.group("sq")) + '"'
+    if kind == "key":
+        return f'"{m.group("key")}"'
+    return m.group("trailing")
+
+
+def to_json(text: str) -> str:
+    """quote bare keys, turn 'strings' into "strings" and drop trailing commas"""
+    return _TOKENS.sub(_normalize_token, text)
+
+
+def loads_fast(text: str) -> Any:
+    """json.loads, then json.loads on the normalized text, then json5 as a last resort"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(to_json(text))
+    except ValueError:
+        return json5.loads(text)
+
+
+PARSERS: Dict[str, Callable[[str], Any]] = {
+    "fast": loads_fast,
+    "json5": json5.loads,
+}
+
+
+def loads(text: str, parser: JsonpParser = "fast") -> Any:
+    if parser not in PARSERS:
+        raise ValueError(f"unknown JSONP parser {parser!r}, use one of {list(PARSERS)}")
+    return PARSERS[parser](text)
@@ -0,0 +1,166 @@
+"""
+Request metrics: a hook called for every request the clients send, and a collector
+for it that can be scraped by Prometheus.
+
+Pass any callable taking a `RequestEvent` as `metrics=` to a client. `Metrics` is one
+that keeps per host and msg_type counts, errors, bytes received and latency histograms.
+Login and DH timings are the `cacs_login_req` and `cacs_dh_req` series.
+"""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Metrics", "MetricsHook", "RequestEvent", "serve_metrics"]
+
+# seconds, the embedded servers answer in anything from a few ms to several seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestEvent(NamedTuple):
+    host: str
+    msg_type: str
+    # seconds from sending the request to having the response (headers only for streams)
+    duration: float
+    # HTTP status, None if there was no response
+    status: Optional[int]
+    # response body size, from Content-Length for streamed responses
+    bytes: int
+    # exception class name if the request failed
+    error: Optional[str]
+
+
+MetricsHook = Callable[[RequestEvent], None]
+
+
+class _Series:
+    def __init__(self, buckets: int) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.bytes = 0
+        # per bucket, not cumulative
+        self.buckets = [0] * (buckets + 1)
+        self.errors: Dict[str, int] = {}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """thread safe collector of `RequestEvent`s, share one between clients"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+
+    def __repr__(self) -> str:
+        return f"Metrics(series={len(self._series)})"
+
+    def __call__(self, event: RequestEvent) -> None:
+        key = (event.host, event.msg_type)
+        bucket = bisect.bisect_left(self.buckets, event.duration)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            series.count += 1
+            series.sum += event.duration
+            series.bytes += event.bytes
+            series.buckets[bucket] += 1
+            if event.error is not None:
+                series.errors[event.error] = series.errors.get(event.error, 0) + 1
+
+    def count(self, msg_type: str, host: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(
+                s.count
+                for (h, m), s in self._series.items()
+                if m == msg_type and host in (None, h)
+            )
+
+    def errors(self, msg_type: str, host: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(
+                sum(s.errors.values())
+                for (h, m), s in self._series.items()
+                if m == msg_type and host in (None, h)
+            )
+
+    def render(self) -> str:
+        """everything in the Prometheus text exposition format"""
+        with self._lock:
+            series = sorted(self._series.items())
+            lines: List[str] = [
+                "# HELP mipc_request_duration_seconds Camera request latency.",
+                "# TYPE mipc_request_duration_seconds histogram",
+            ]
+            for (host, msg_type), s in series:
+                labels = f'host="{_label(host)}",msg_type="{_label(msg_type)}"'
+                cumulative = 0
+                for le, n in zip(self.buckets, s.buckets):
+                    cumulative += n
+                    lines.append(
+                        f'mipc_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'mipc_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}'
+                )
+                lines.append(f"mipc_request_duration_seconds_sum{{{labels}}} {s.sum}")
+                lines.append(
+                    f"mipc_request_duration_seconds_count{{{labels}}} {s.count}"
+                )
+            lines += [
+                "# HELP mipc_response_bytes_total Response body bytes received.",
+                "# TYPE mipc_response_bytes_total counter",
+            ]
+            for (host, msg_type), s in series:
+                labels = f'host="{_label(host)}",msg_type="{_label(msg_type)}"'
+                lines.append(f"mipc_response_bytes_total{{{labels}}} {s.bytes}")
+            lines += [
+                "# HELP mipc_request_errors_total Failed camera requests.",
+                "# TYPE mipc_request_errors_total counter",
+            ]
+            for (host, msg_type), s in series:
+                for error, n in sorted(s.errors.items()):
+                    labels = (
+                        f'host="{_label(host)}",msg_type="{_label(msg_type)}",'
+                        f'error="{_label(error)}"'
+                    )
+                    lines.append(f"mipc_request_errors_total{{{labels}}} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(
+    metrics: Metrics, port: int, address: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """serve `metrics.render()` at http://address:port/metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            LOGGER.debug(f"{self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="mipc-metrics", daemon=True
+    ).start()
+    LOGGER.info(
+        f"serving metrics on http://{address}:{server.server_address[1]}/metrics"
+    )
+    return server
@@ -0,0 +1,330 @@
+"""
+Panoramas: sweep the camera over a grid of overlapping positions and stitch the frames.
+
+Frames are aligned with phase correlation on small grayscale copies: the peak of the
+inverse FFT of the normalized cross-power spectrum is the shift between two frames.
+It's only known modulo the frame size, so of the possible shifts the one where the
+overlapping pixels correlate best wins, which also means the direction the motors
+move in doesn't need to be known. Every pair of grid neighbours gives a shift, and
+the frame positions are their least squares solution.
+
+Capturing is pipelined: while the camera moves on and settles, a worker thread
+decodes the last frame and aligns it with the neighbours already captured, so only
+the final blend is left when the sweep is done.
+
+needs numpy and Pillow: `pip install mipc-camera-client[panorama]`
+"""
+import io
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import MipcCameraClient
+from .patrol import MotionModel
+from .ptz import HOME_MOVE
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Panorama", "PanoramaFrame", "grid_positions", "phase_correlate"]
+
+# width in pixels of the grayscale copies used for alignment
+DEFAULT_ALIGN_WIDTH = 320
+
+# shifts whose overlap correlates worse than this are replaced by the typical one
+MIN_SCORE = 0.3
+
+# shifts that would leave less than this fraction of the frames overlapping are ignored
+MIN_OVERLAP = 0.05
+
+
+class PanoramaFrame(NamedTuple):
+    col: int
+    row: int
+    # control_ptz position, relative to the home position
+    x: int
+    y: int
+    # RGB, already scaled for the output
+    image: np.ndarray
+    # grayscale float32, DEFAULT_ALIGN_WIDTH wide
+    small: np.ndarray
+
+
+def grid_positions(
+    cols: int, rows: int, step_x: int, step_y: int, origin: Tuple[int, int] = (0, 0)
+) -> List[Tuple[int, int, int, int]]:
+    """(col, row, x, y) of a `cols` x `rows` grid, in snake order so no move crosses the grid"""
+    x0, y0 = origin
+    cells = []
+    for row in range(rows):
+        order = range(cols) if row % 2 == 0 else reversed(range(cols))
+        cells += [(col, row, x0 + col * step_x, y0 + row * step_y) for col in order]
+    return cells
+
+
+def _tukey(n: int, taper: float = 0.1) -> np.ndarray:
+    """
+    flat window with cosine edges over `taper` of the length on each side. A Hann
+    window would fade out the frame edges, which is where neighbours overlap.
+    """
+    edge = max(1, int(n * taper))
+    ramp = 0.5 - 0.5 * np.cos(np.pi * (np.arange(edge) + 0.5) / edge)
+    window = np.ones(n, dtype=np.float32)
+    window[:edge] = ramp
+    window[n - edge :] = ramp[::-1]
+    return window
+
+
+def phase_correlate(a: np.ndarray, b: np.ndarray) -> Tuple[float, float]:
+    """
+    (dy, dx) of the peak of the phase correlation of two same-sized grayscale images,
+    where b's content sits in a. It's modulo the image size: both (dy, dx) and e.g.
+    (dy - height, dx) are candidates.
+    """
+    h, w = a.shape
+    window = np.outer(_tukey(h), _tukey(w))
+    fa = np.fft.rfft2((a - a.mean()) * window)
+    fb = np.fft.rfft2((b - b.mean()) * window)
+    cross = fa * np.conj(fb)
+    cross /= np.abs(cross) + 1e-9
+    r = np.fft.irfft2(cross, s=(h, w))
+    py, px = np.unravel_index(np.argmax(r), r.shape)
+
+    def refine(before: float, peak: float, after: float) -> float:
+        # vertex of the parabola through the peak and its neighbours
+        denom = before - 2 * peak + after
+        return 0.5 * (before - after) / denom if denom else 0.0
+
+    dy = py + refine(r[py - 1, px], r[py, px], r[(py + 1) % h, px])
+    dx = px + refine(r[py, px - 1], r[py, px], r[py, (px + 1) % w])
+    return float(dy), float(dx)
+
+
+def _overlap_score(a: np.ndarray, b: np.ndarray, dy: int, dx: int) -> float:
+    """correlation of the pixels a and b share when b is placed at (dy, dx) in a"""
+    h, w = a.shape
+    top, bottom = max(0, dy), min(h, dy + h)
+    left, right = max(0, dx), min(w, dx + w)
+    if (bottom - top) * (right - left) < MIN_OVERLAP * h * w:
+        return -1.0
+    pa = a[top:bottom, left:right]
+    pb = b[top - dy : bottom - dy, left - dx : right - dx]
+    pa = pa - pa.mean()
+    pb = pb - pb.mean()
+    denom = np.sqrt((pa * pa).sum() * (pb * pb).sum())
+    return float((pa * pb).sum() / denom) if denom else -1.0
+
+
+def _align(a: np.ndarray, b: np.ndarray) -> Tuple[float, float, float]:
+    """(dy, dx, score): where b goes relative to a, and how well it fits"""
+    h, w = a.shape
+    dy, dx = phase_correlate(a, b)
+    candidates = [
+        (cy, cx)
+        for cy in (dy, dy - h)
+        if abs(cy) < h
+        for cx in (dx, dx - w)
+        if abs(cx) < w
+    ]
+    scores = [_overlap_score(a, b, round(cy), round(cx)) for cy, cx in candidates]
+    best = int(np.argmax(scores))
+    return (*candidates[best], scores[best])
+
+
+def _feather(h: int, w: int) -> np.ndarray:
+    """blend weights, highest in the middle and falling off towards the edges"""
+    ramp_y = np.minimum(np.arange(1, h + 1), np.arange(h, 0, -1))
+    ramp_x = np.minimum(np.arange(1, w + 1), np.arange(w, 0, -1))
+    return np.minimum.outer(ramp_y, ramp_x).astype(np.float32)
+
+
+class _Shift(NamedTuple):
+    a: int
+    b: int
+    dy: float
+    dx: float
+    score: float
+    vertical: bool
+
+
+class Panorama:
+    """
+    captures a `cols` x `rows` grid of frames `step_x`/`step_y` control_ptz units apart,
+    starting from `origin` (relative to the home position, see `patrol`), and stitches
+    them. The steps should leave the frames overlapping by a third or more.
+    """
+
+    def __init__(
+        self,
+        client: MipcCameraClient,
+        cols: int,
+        rows: int,
+        step_x: int,
+        step_y: int,
+        origin: Tuple[int, int] = (0, 0),
+        motion: MotionModel = MotionModel(),
+        scale: float = 1.0,
+        align_width: int = DEFAULT_ALIGN_WIDTH,
+    ) -> None:
+        if cols < 1 or rows < 1:
+            raise ValueError("need at least one row and one column")
+        self.client = client
+        self.cells = grid_positions(cols, rows, step_x, step_y, origin)
+        self.motion = motion
+        self.scale = scale
+        self.align_width = align_width
+        self.frames: Dict[Tuple[int, int], PanoramaFrame] = {}
+        self.shifts: List[_Shift] = []
+
+    def __repr__(self) -> str:
+        return f"Panorama(client={self.client!r}, cells={len(self.cells)})"
+
+    def _prepare(self, cell: Tuple[int, int, int, int], data: bytes) -> None:
+        """decode a frame and align it with its neighbours, on the worker thread"""
+        col, row, x, y = cell
+        image = Image.open(io.BytesIO(data))
+        full_size = image.size
+        size = (round(full_size[0] * self.scale), round(full_size[1] * self.scale))
+        image.draft("RGB", size)
+        rgb = image.convert("RGB")
+        small_size = (
+            self.align_width,
+            round(full_size[1] * self.align_width / full_size[0]),
+        )
+        small = np.asarray(
+            rgb.convert("L").resize(small_size, Image.Resampling.BILINEAR),
+            dtype=np.float32,
+        )
+        if rgb.size != size:
+            rgb = rgb.resize(size, Image.Resampling.LANCZOS)
+        frame = PanoramaFrame(col, row, x, y, np.asarray(rgb), small)
+        index = len(self.frames)
+        for neighbour, vertical in (
+            ((col - 1, row), False),
+            ((col + 1, row), False),
+            ((col, row - 1), True),
+        ):
+            other = self.frames.get(neighbour)
+            if other is None:
+                continue
+            if other.small.shape != small.shape:
+                raise ValueError("frames of different sizes, did the stream change?")
+            # keep all shifts left to right and top to bottom, so they're comparable
+            if neighbour[0] > col:
+                first, second = (index, frame), (self._index(other), other)
+            else:
+                first, second = (self._index(other), other), (index, frame)
+            dy, dx, score = _align(first[1].small, second[1].small)
+            self.shifts.append(_Shift(first[0], second[0], dy, dx, score, vertical))
+            LOGGER.debug(
+                f"{(col, row)} and {neighbour}: {dx:+.1f},{dy:+.1f} score {score:.2f}"
+            )
+        self.frames[(col, row)] = frame
+
+    def _index(self, frame: PanoramaFrame) -> int:
+        return list(self.frames).index((frame.col, frame.row))
+
+    def capture(self) -> None:
+        """home the camera, then go over the grid taking a frame at each position"""
+        self.frames.clear()
+        self.shifts.clear()
+        started = time.monotonic()
+        LOGGER.info("resetting pan/tilt position")
+        self.client.control_ptz(*HOME_MOVE, self.motion.speed_x, self.motion.speed_y)
+        position = (0, 0)
+        wait = self.motion.travel_time(-HOME_MOVE[0], -HOME_MOVE[1])
+        pending: List[Future] = []
+        with ThreadPoolExecutor(1, thread_name_prefix="panorama") as pool:
+            for cell in self.cells:
+                dx, dy = cell[2] - position[0], cell[3] - position[1]
+                if dx or dy:
+                    self.client.control_ptz(
+                        dx, dy, self.motion.speed_x, self.motion.speed_y
+                    )
+                    position = cell[2:]
+                    wait += self.motion.travel_time(dx, dy)
+                # the previous frame is being processed while this sleeps
+                time.sleep(wait)
+                wait = 0.0
+                data = self.client.get_image()
+                LOGGER.info(f"captured {cell[:2]}, {len(data)} bytes")
+                pending.append(pool.submit(self._prepare, cell, data))
+                # surface decoding errors before driving the camera any further
+                for f in pending:
+                    if f.done():
+                        f.result()
+        for f in pending:
+            f.result()
+        LOGGER.info(
+            f"captured {len(self.frames)} frames in {time.monotonic() - started:.1f}s"
+        )
+
+    def positions(self) -> np.ndarray:
+        """(y, x) of every frame in output pixels, the least squares fit to the shifts"""
+        n = len(self.frames)
+        good = [s for s in self.shifts if s.score >= MIN_SCORE]
+        typical = {}
+        for vertical in (False, True):
+            kind = [s for s in good if s.vertical == vertical]
+            if kind:
+                typical[vertical] = (
+                    np.median([s.dy for s in kind]),
+                    np.median([s.dx for s in kind]),
+                )
+        rows, targets, weights = [], [], []
+        for s in self.shifts:
+            dy, dx, weight = s.dy, s.dx, s.score
+            if s.score < MIN_SCORE:
+                if s.vertical not in typical:
+                    raise ValueError(
+                        "couldn't align the frames, do they overlap enough?"
+                    )
+                # most likely a featureless wall, assume the camera moved as usual
+                dy, dx = typical[s.vertical]
+                weight = 0.05
+                LOGGER.warning(
+                    f"weak alignment (score {s.score:.2f}), using {dx:+.1f},{dy:+.1f}"
+                )
+            row = np.zeros(n)
+            row[s.a], row[s.b] = -1, 1
+            rows.append(row)
+            targets.append((dy, dx))
+            weights.append(weight)
+        # pin the first frame at the origin
+        row = np.zeros(n)
+        row[0] = 1
+        rows.append(row)
+        targets.append((0.0, 0.0))
+        weights.append(1.0)
+        w = np.sqrt(np.array(weights))[:, None]
+        solution, *_ = np.linalg.lstsq(
+            np.array(rows) * w, np.array(targets) * w, rcond=None
+        )
+        frame = next(iter(self.frames.values()))
+        return solution * (frame.image.shape[1] / frame.small.shape[1])
+
+    def stitch(self) -> Image.Image:
+        """blend the captured frames into one image, feathering the seams"""
+        if not self.frames:
+            raise ValueError("nothing captured")
+        started = time.monotonic()
+        positions = np.round(self.positions()).astype(int)
+        positions -= positions.min(axis=0)
+        h, w = next(iter(self.frames.values())).image.shape[:2]
+        height, width = positions.max(axis=0) + (h, w)
+        canvas = np.zeros((height, width, 3), dtype=np.float32)
+        total = np.zeros((height, width), dtype=np.float32)
+        feather = _feather(h, w)
+        for frame, (y, x) in zip(self.frames.values(), positions):
+            canvas[y : y + h, x : x + w] += frame.image * feather[..., None]
+            total[y : y + h, x : x + w] += feather
+        canvas /= np.maximum(total, 1e-6)[..., None]
+        LOGGER.info(f"stitched {width}x{height} in {time.monotonic() - started:.1f}s")
+        return Image.fromarray(canvas.round().clip(0, 255).astype(np.uint8))
+
+    def run(self) -> Image.Image:
+        self.capture()
+        return self.stitch()
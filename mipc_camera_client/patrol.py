@@ -0,0 +1,275 @@
+"""
+PTZ patrol: cycle through named positions, taking a snapshot at each stop.
+
+Positions are in `control_ptz` units relative to the home position (`ptz --zero`,
+the end stops left and down), so they can only be positive. The camera moves by
+relative steps from there and the patrol keeps track of where it is. The stops are
+visited in the order that needs the least motor time per round, and instead of a
+fixed delay each move waits as long as `MotionModel` expects it to take.
+"""
+import itertools
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from . import MipcCameraClient
+from .filenames import snapshot_filename
+from .ptz import HOME_MOVE
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["MotionModel", "Patrol", "PatrolStats", "Position", "plan_route"]
+
+# up to this many stops the route is found by trying every order
+EXHAUSTIVE_LIMIT = 8
+
+# seconds to wait after a failed stop, so an unreachable camera isn't hammered
+ERROR_PAUSE = 1.0
+
+
+class Position(NamedTuple):
+    name: str
+    # control_ptz units right of / above the home position
+    x: int
+    y: int
+
+
+class MotionModel(NamedTuple):
+    speed_x: int = 80
+    speed_y: int = 50
+    # control_ptz units moved per second for each unit of speed
+    rate: float = 1.0
+    # seconds for the picture to be steady after the motors stop
+    settle: float = 0.5
+
+    def travel_time(self, dx: int, dy: int) -> float:
+        """seconds until the picture is steady after a move, both motors run at once"""
+        if dx == 0 and dy == 0:
+            return 0.0
+        return self.settle + max(
+            abs(dx) / (self.speed_x * self.rate), abs(dy) / (self.speed_y * self.rate)
+        )
+
+
+class PatrolStats(NamedTuple):
+    # snapshots taken
+    views: int
+    # complete rounds over all positions
+    rounds: int
+    errors: int
+    # seconds since the patrol started, and of that, waiting for the camera to move
+    elapsed: float
+    moving: float
+
+    @property
+    def views_per_minute(self) -> float:
+        return self.views * 60 / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"views={self.views} rounds={self.rounds} errors={self.errors} "
+            f"{self.views_per_minute:.1f} views/min, moving {self.moving:.1f}s "
+            f"of {self.elapsed:.1f}s"
+        )
+
+
+def _cycle_time(route: Sequence[Position], motion: MotionModel) -> float:
+    return sum(
+        motion.travel_time(b.x - a.x, b.y - a.y)
+        for a, b in zip(route, [*route[1:], route[0]])
+    )
+
+
+def _two_opt(route: List[Position], motion: MotionModel) -> List[Position]:
+    def cost(a: Position, b: Position) -> float:
+        return motion.travel_time(b.x - a.x, b.y - a.y)
+
+    n = len(route)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 1):
+            for j in range(i + 2, n if i else n - 1):
+                a, b = route[i], route[i + 1]
+                c, d = route[j], route[(j + 1) % n]
+                if cost(a, c) + cost(b, d) < cost(a, b) + cost(c, d) - 1e-9:
+                    route[i + 1 : j + 1] = reversed(route[i + 1 : j + 1])
+                    improved = True
+    return route
+
+
+def plan_route(
+    positions: Sequence[Position],
+    motion: MotionModel = MotionModel(),
+    start: Tuple[int, int] = (0, 0),
+) -> List[Position]:
+    """
+    order `positions` for the shortest round in motor time, starting with the stop
+    closest to `start`. Exact for up to `EXHAUSTIVE_LIMIT` stops, nearest neighbour
+    plus 2-opt above that.
+    """
+    if len(positions) <= 2:
+        route = list(positions)
+    elif len(positions) <= EXHAUSTIVE_LIMIT:
+        first, *rest = positions
+        route = min(
+            ([first, *order] for order in itertools.permutations(rest)),
+            key=lambda r: _cycle_time(r, motion),
+        )
+    else:
+        here = Position("", *start)
+        remaining = list(positions)
+        route = []
+        while remaining:
+            here = min(
+                remaining, key=lambda p: motion.travel_time(p.x - here.x, p.y - here.y)
+            )
+            remaining.remove(here)
+            route.append(here)
+        route = _two_opt(route, motion)
+    if not route:
+        return route
+    # it's a cycle, begin wherever is closest
+    x, y = start
+    i = min(
+        range(len(route)),
+        key=lambda i: motion.travel_time(route[i].x - x, route[i].y - y),
+    )
+    return route[i:] + route[:i]
+
+
+class Patrol:
+    """
+    visits `positions` round and round, saving a snapshot at each one to
+    `{output_dir}/{name}/{timestamp}_{sn}.jpeg`.
+
+    The camera is sent home at the start, after any failed move (the position isn't
+    known anymore) and every `rehome_every` rounds if set, to undo drift.
+    """
+
+    def __init__(
+        self,
+        client: MipcCameraClient,
+        positions: Sequence[Position],
+        output_dir: Union[str, Path],
+        motion: MotionModel = MotionModel(),
+        rehome_every: int = 0,
+    ) -> None:
+        for p in positions:
+            if p.x < 0 or p.y < 0:
+                raise ValueError(f"position {p.name} is past the home end stops")
+        if len({p.name for p in positions}) != len(positions):
+            raise ValueError("position names must be unique")
+        self.client = client
+        self.output_dir = Path(output_dir)
+        self.motion = motion
+        self.rehome_every = rehome_every
+        self.route = plan_route(positions, motion)
+        self.views: Dict[str, int] = {p.name: 0 for p in positions}
+        self._stop = threading.Event()
+        # None when it isn't known, e.g. before homing or after a failed move
+        self._position: Optional[Tuple[int, int]] = None
+        self._rehome = True
+        self._rounds = 0
+        self._errors = 0
+        self._moving = 0.0
+        self._started: Optional[float] = None
+        self._stopped: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"Patrol(client={self.client!r}, route={[p.name for p in self.route]})"
+
+    @property
+    def round_time(self) -> float:
+        """expected seconds of moving per round, without the snapshots"""
+        return _cycle_time(self.route, self.motion) if len(self.route) > 1 else 0.0
+
+    def _wait(self, seconds: float) -> None:
+        started = time.monotonic()
+        self._stop.wait(seconds)
+        self._moving += time.monotonic() - started
+
+    def _home(self) -> None:
+        LOGGER.info("resetting pan/tilt position")
+        x, y = self._position or (-HOME_MOVE[0], -HOME_MOVE[1])
+        self._position = None
+        self.client.control_ptz(*HOME_MOVE, self.motion.speed_x, self.motion.speed_y)
+        self._position = (0, 0)
+        self._rehome = False
+        self._wait(self.motion.travel_time(x, y))
+
+    def _visit(self, position: Position, sn: Optional[str]) -> None:
+        if self._position is None or self._rehome:
+            self._home()
+        dx = position.x - self._position[0]
+        dy = position.y - self._position[1]
+        if dx or dy:
+            try:
+                self.client.control_ptz(
+                    dx, dy, self.motion.speed_x, self.motion.speed_y
+                )
+            except Exception:
+                self._position = None
+                raise
+            self._position = (position.x, position.y)
+            self._wait(self.motion.travel_time(dx, dy))
+        if self._stop.is_set():
+            return
+        timestamp = time.time()
+        data = self.client.get_image()
+        directory = self.output_dir / position.name
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / snapshot_filename(sn, timestamp)).write_bytes(data)
+        self.views[position.name] += 1
+        LOGGER.debug(f"{position.name}: {len(data)} bytes")
+
+    def run(
+        self, rounds: Optional[int] = None, duration: Optional[float] = None
+    ) -> PatrolStats:
+        """patrol until `rounds` more rounds are done, `duration` seconds passed or `stop()`"""
+        self._stop.clear()
+        self._started = time.monotonic()
+        self._stopped = None
+        sn = self.client.get_device_sn()
+        if not self.route:
+            return self.stats
+        deadline = None if duration is None else self._started + duration
+        last_round = None if rounds is None else self._rounds + rounds
+        try:
+            while not self._stop.is_set() and (
+                last_round is None or self._rounds < last_round
+            ):
+                if self.rehome_every and self._rounds % self.rehome_every == 0:
+                    self._rehome = True
+                for position in self.route:
+                    if self._stop.is_set():
+                        break
+                    try:
+                        self._visit(position, sn)
+                    except Exception as e:
+                        self._errors += 1
+                        LOGGER.warning(f"{position.name}: {e!r}")
+                        self._stop.wait(ERROR_PAUSE)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self._stop.set()
+                else:
+                    self._rounds += 1
+        finally:
+            self._stopped = time.monotonic()
+        return self.stats
+
+    def stop(self) -> None:
+        """make `run` return after the current stop, from another thread"""
+        self._stop.set()
+
+    @property
+    def stats(self) -> PatrolStats:
+        if self._started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stopped or time.monotonic()) - self._started
+        return PatrolStats(
+            sum(self.views.values()), self._rounds, self._errors, elapsed, self._moving
+        )
@@ -0,0 +1,161 @@
+"""
+Managing a fleet of cameras: log in to all of them at once and grab snapshots in bulk.
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, TypeVar, Union
+
+from . import MipcCameraClient
+from .throttle import Throttle
+from .transport import Transport
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["CameraConfig", "MipcCameraPool"]
+
+T = TypeVar("T")
+
+
+class CameraConfig(NamedTuple):
+    host: str
+    username: str
+    password: str
+
+
+class MipcCameraPool:
+    """A bunch of `MipcCameraClient`s driven from a bounded thread pool.
+
+    `timeout` is per host: it's the HTTP timeout for every request and also how long
+    a batch waits for one camera before giving up on it, so one dead camera
+    doesn't hold up the rest. A camera that timed out still occupies its worker
+    until the HTTP timeout fires.
+
+    All clients share one `Transport` (pass your own to tune it), so connections
+    are kept alive per camera across batches. Pass a `Throttle` to limit the request
+    rate and concurrency per camera, it's shared by all the clients."""
+
+    def __init__(
+        self,
+        cameras: Iterable[Union[CameraConfig, tuple]],
+        max_workers: int = 16,
+        timeout: Optional[float] = 10.0,
+        client_factory: Callable[..., MipcCameraClient] = MipcCameraClient,
+        transport: Optional[Transport] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> None:
+        self.cameras: Dict[str, CameraConfig] = {
+            cfg.host: cfg for cfg in (CameraConfig(*c) for c in cameras)
+        }
+        self.timeout = timeout
+        # as many connections per camera as requests can be in flight to it, and at
+        # least 2 so a PTZ command doesn't open a throwaway one next to a snapshot
+        in_flight = throttle.max_in_flight if throttle is not None else None
+        self.transport = transport or Transport(
+            pool_connections=max(10, len(self.cameras)),
+            pool_maxsize=max(2, in_flight or max_workers),
+            timeout=timeout,
+        )
+        self.throttle = throttle
+        client_kwargs = {"timeout": timeout, "transport": self.transport}
+        if throttle is not None:
+            client_kwargs["throttle"] = throttle
+        self.clients: Dict[str, MipcCameraClient] = {
+            host: client_factory(host, **client_kwargs) for host in self.cameras
+        }
+        self._logged_in = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mipc-pool"
+        )
+
+    def __repr__(self) -> str:
+        return f"MipcCameraPool(hosts={list(self.cameras)})"
+
+    def __enter__(self) -> "MipcCameraPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # don't wait for hung cameras, their threads finish when the HTTP timeout hits
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _login(self, host: str) -> None:
+        cfg = self.cameras[host]
+        self.clients[host].login(cfg.username, cfg.password)
+        self._logged_in.add(host)
+
+    def _snapshot(self, host: str) -> bytes:
+        if host not in self._logged_in:
+            self._login(host)
+        return self.clients[host].get_image()
+
+    def map(
+        self,
+        fn: Callable[[MipcCameraClient], T],
+        hosts: Optional[Iterable[str]] = None,
+        login: bool = False,
+    ) -> Dict[str, Union[T, Exception]]:
+        """
+        run `fn(client)` for every camera concurrently, returning results or exceptions
+        per host. With `login`, cameras that aren't logged in yet are logged in first,
+        in the same worker.
+        """
+
+        def run(host):
+            if login and host not in self._logged_in:
+                self._login(host)
+            return fn(self.clients[host])
+
+        return self._map(run, hosts)
+
+    def _map(self, fn, hosts=None):
+        hosts = list(self.cameras if hosts is None else hosts)
+        started = {}
+
+        def timed(host):
+            started[host] = time.monotonic()
+            return fn(host)
+
+        pending = {self._executor.submit(timed, host): host for host in hosts}
+        results = {}
+        while pending:
+            wait_for = None
+            if self.timeout is not None:
+                # the clock for each host starts when a worker picks it up, not when it's queued
+                deadlines = [
+                    started[h] + self.timeout for h in pending.values() if h in started
+                ]
+                wait_for = (
+                    max(0.0, min(deadlines) - time.monotonic())
+                    if deadlines
+                    else self.timeout
+                )
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                host = pending.pop(future)
+                try:
+                    results[host] = future.result()
+                except Exception as e:
+                    LOGGER.warning(f"{host}: {e!r}")
+                    results[host] = e
+            if self.timeout is None:
+                continue
+            now = time.monotonic()
+            for future, host in list(pending.items()):
+                if host in started and now >= started[host] + self.timeout:
+                    LOGGER.warning(f"{host}: timed out after {self.timeout}s")
+                    del pending[future]
+                    results[host] = TimeoutError(
+                        f"{host} did not respond within {self.timeout}s"
+                    )
+        return {host: results[host] for host in hosts}
+
+    def login_all(self) -> Dict[str, Optional[Exception]]:
+        """DH + login on all cameras concurrently. Returns None for hosts that logged in."""
+        return self._map(self._login)
+
+    def snapshot_all(self) -> Dict[str, Union[bytes, Exception]]:
+        """grab a JPEG from every camera, logging in first where needed"""
+        return self._map(self._snapshot)
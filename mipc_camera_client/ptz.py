@@ -0,0 +1,190 @@
+"""
+PTZ control that keeps up with a joystick: moves are queued without blocking and a
+sender thread merges whatever piled up while the previous command was running.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Deque, NamedTuple, Optional
+
+from . import MipcCameraClient
+from .stats import LATENCY_WINDOW, LatencySummary
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["PtzController", "PtzStats"]
+
+DEFAULT_SPEED_X = 48
+DEFAULT_SPEED_Y = 16
+
+# what `home()` sends, far enough left and down to hit the end stops
+HOME_MOVE = (-360, -360)
+
+
+class PtzStats(NamedTuple):
+    # ccm_ptz_ctl requests sent
+    sent: int
+    # moves folded into another one instead of getting their own request
+    merged: int
+    # moves thrown away for being older than `max_age`
+    dropped: int
+    errors: int
+    # from the oldest move in a command being queued to the camera acknowledging it
+    latency: LatencySummary
+
+
+class _Pending:
+    def __init__(self, queued_at: float) -> None:
+        self.x = 0
+        self.y = 0
+        self.speed_x = DEFAULT_SPEED_X
+        self.speed_y = DEFAULT_SPEED_Y
+        self.moves = 0
+        # time.monotonic() of the oldest move in here
+        self.queued_at = queued_at
+        self.home = False
+
+
+class PtzController:
+    """
+    sends the moves given to `move()` on a background thread, one command at a time.
+
+    While a command is in flight, new relative moves are summed into one pending
+    command, so the camera gets a single request for everything that happened
+    meanwhile instead of working through a backlog. With `max_age`, pending moves
+    older than that many seconds are dropped rather than sent late.
+    """
+
+    def __init__(
+        self, client: MipcCameraClient, max_age: Optional[float] = None
+    ) -> None:
+        self.client = client
+        self.max_age = max_age
+        self._cond = threading.Condition()
+        # at most a home and then one summed move
+        self._pending: Deque[_Pending] = collections.deque()
+        self._busy = False
+        self._closed = False
+        self._latencies: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self._sent = 0
+        self._merged = 0
+        self._dropped = 0
+        self._errors = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"PtzController-{client.host}", daemon=True
+        )
+        self._thread.start()
+
+    def __repr__(self) -> str:
+        return f"PtzController(client={self.client!r}, max_age={self.max_age})"
+
+    def __enter__(self) -> "PtzController":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def move(
+        self,
+        tilt_x: int,
+        tilt_y: int,
+        speed_x: int = DEFAULT_SPEED_X,
+        speed_y: int = DEFAULT_SPEED_Y,
+    ) -> None:
+        """queue a relative move, returns right away"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PtzController is closed")
+            if self._pending and not self._pending[-1].home:
+                pending = self._pending[-1]
+                self._merged += 1
+            else:
+                # moves after a home go after it, they're relative to where it ends
+                pending = _Pending(time.monotonic())
+                self._pending.append(pending)
+            pending.x += tilt_x
+            pending.y += tilt_y
+            pending.speed_x = speed_x
+            pending.speed_y = speed_y
+            pending.moves += 1
+            self._cond.notify_all()
+
+    def home(
+        self, speed_x: int = DEFAULT_SPEED_X, speed_y: int = DEFAULT_SPEED_Y
+    ) -> None:
+        """queue a move to the end stops, replacing any moves not sent yet"""
+        with self._cond:
+            self._dropped += sum(p.moves for p in self._pending)
+            self._pending.clear()
+            pending = _Pending(time.monotonic())
+            self._pending.append(pending)
+            pending.x, pending.y = HOME_MOVE
+            pending.speed_x, pending.speed_y = speed_x, speed_y
+            pending.moves = 1
+            pending.home = True
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """wait until everything queued has been sent, False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def close(self) -> None:
+        """send what's still pending and stop the sender"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _take(self) -> Optional[_Pending]:
+        with self._cond:
+            while True:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return None
+                pending = self._pending.popleft()
+                age = time.monotonic() - pending.queued_at
+                if self.max_age is not None and age > self.max_age and not pending.home:
+                    self._dropped += pending.moves
+                    LOGGER.debug(
+                        f"dropping {pending.moves} moves queued {age:.2f}s ago"
+                    )
+                    continue
+                if pending.x == 0 and pending.y == 0:
+                    # moves that cancelled out
+                    continue
+                self._busy = True
+                return pending
+
+    def _run(self) -> None:
+        while (pending := self._take()) is not None:
+            try:
+                self.client.control_ptz(
+                    pending.x, pending.y, pending.speed_x, pending.speed_y
+                )
+            except Exception as e:
+                with self._cond:
+                    self._errors += 1
+                LOGGER.warning(f"{self.client.host}: ptz command failed: {e!r}")
+            else:
+                with self._cond:
+                    self._sent += 1
+                    self._latencies.append(time.monotonic() - pending.queued_at)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    @property
+    def stats(self) -> PtzStats:
+        with self._cond:
+            return PtzStats(
+                self._sent,
+                self._merged,
+                self._dropped,
+                self._errors,
+                LatencySummary.of(self._latencies),
+            )
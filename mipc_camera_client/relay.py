@@ -0,0 +1,237 @@
+"""
+Snapshot relay: polls each camera once and serves the latest frame to any number of viewers.
+
+    /latest.jpg, /stream.mjpeg            the first (or only) camera
+    /{sn}/latest.jpg, /{sn}/stream.mjpeg  a camera by serial number
+    /                                     list of cameras
+
+`latest.jpg` answers with an ETag (a hash of the frame), so a client sending it back
+in If-None-Match gets a bodyless 304 until the picture actually changes. The MJPEG
+stream only sends a part when the frame changed, too.
+"""
+import email.utils
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from . import MipcCameraClient
+from .grabber import FrameGrabber
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["RelayServer", "RelayFrame"]
+
+BOUNDARY = "mipcframe"
+
+
+class RelayFrame(NamedTuple):
+    data: bytes
+    # quoted, ready for the ETag header
+    etag: str
+    # time.time() when it was requested from the camera
+    timestamp: float
+
+
+class _Feed:
+    """the latest frame of one camera, and a condition to wait for the next one"""
+
+    def __init__(self, client: MipcCameraClient, interval: float) -> None:
+        self.client = client
+        self.sn = client.get_device_sn()
+        self.grabber = FrameGrabber(client, fps=1 / interval, buffer_size=1)
+        self.cond = threading.Condition()
+        self.frame: Optional[RelayFrame] = None
+        self.closed = False
+        self.viewers = 0
+
+    def run(self) -> None:
+        self.grabber.start()
+        while (frame := self.grabber.latest()) is not None:
+            etag = '"' + hashlib.blake2b(frame.data, digest_size=12).hexdigest() + '"'
+            with self.cond:
+                if self.frame is not None and self.frame.etag == etag:
+                    continue
+                self.frame = RelayFrame(frame.data, etag, frame.timestamp)
+                self.cond.notify_all()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def next_frame(
+        self, after: Optional[str], timeout: Optional[float] = None
+    ) -> Optional[RelayFrame]:
+        """the current frame once its etag differs from `after`, None when closed"""
+        with self.cond:
+            self.cond.wait_for(
+                lambda: self.closed
+                or (self.frame is not None and self.frame.etag != after),
+                timeout,
+            )
+            if self.closed:
+                return None
+            return self.frame
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        LOGGER.debug(f"{self.address_string()} {format % args}")
+
+    def _feed(self, sn: Optional[str]) -> Optional[_Feed]:
+        feeds = self.server.relay.feeds
+        if sn is None:
+            return next(iter(feeds.values()), None)
+        return feeds.get(sn)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].strip("/")
+        if path == "":
+            return self._index()
+        sn, _, name = path.rpartition("/")
+        feed = self._feed(sn or None)
+        if feed is None or name not in ("latest.jpg", "stream.mjpeg"):
+            self.send_error(404)
+            return
+        if name == "latest.jpg":
+            self._latest(feed)
+        else:
+            self._stream(feed)
+
+    def _index(self):
+        body = "".join(
+            f"{sn}\t/{sn}/latest.jpg\t/{sn}/stream.mjpeg\n"
+            for sn in self.server.relay.feeds
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _latest(self, feed: _Feed):
+        frame = feed.next_frame(None, timeout=self.server.relay.first_frame_timeout)
+        if frame is None:
+            self.send_error(503, "no frame from the camera yet")
+            return
+        etags = self.headers.get("If-None-Match", "")
+        if frame.etag in (t.strip() for t in etags.split(",")) or etags.strip() == "*":
+            self.send_response(304)
+            self.send_header("ETag", frame.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(frame.data)))
+        self.send_header("ETag", frame.etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header(
+            "Last-Modified", email.utils.formatdate(frame.timestamp, usegmt=True)
+        )
+        self.end_headers()
+        self.wfile.write(frame.data)
+
+    def _stream(self, feed: _Feed):
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+        )
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        with feed.cond:
+            feed.viewers += 1
+        etag = None
+        try:
+            while (frame := feed.next_frame(etag)) is not None:
+                etag = frame.etag
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(frame.data)}\r\nETag: {etag}\r\n\r\n".encode()
+                )
+                self.wfile.write(frame.data)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with feed.cond:
+                feed.viewers -= 1
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    relay: "RelayServer"
+
+
+class RelayServer:
+    """
+    grabs a frame from every client each `interval` seconds and serves them over HTTP.
+
+    However many viewers there are, each camera only sees one request per interval.
+    """
+
+    def __init__(
+        self,
+        clients: Iterable[MipcCameraClient],
+        address: str = "127.0.0.1",
+        port: int = 8080,
+        interval: float = 1.0,
+        first_frame_timeout: float = 10.0,
+    ) -> None:
+        self.interval = interval
+        self.first_frame_timeout = first_frame_timeout
+        self.feeds: Dict[str, _Feed] = {}
+        for client in clients:
+            feed = _Feed(client, interval)
+            self.feeds[feed.sn] = feed
+        self._threads: List[threading.Thread] = []
+        self._server = _Server((address, port), _Handler)
+        self._server.relay = self
+
+    def __repr__(self) -> str:
+        return f"RelayServer(url={self.url!r}, cameras={list(self.feeds)})"
+
+    def __enter__(self) -> "RelayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def url(self) -> str:
+        address, port = self._server.server_address[:2]
+        return f"http://{address}:{port}"
+
+    def start(self) -> "RelayServer":
+        """start polling the cameras and serving in background threads"""
+        for feed in self.feeds.values():
+            t = threading.Thread(
+                target=feed.run, name=f"relay-{feed.client.host}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(
+            target=self._server.serve_forever, args=(0.1,), name="relay", daemon=True
+        )
+        t.start()
+        self._threads.append(t)
+        LOGGER.info(f"relaying {len(self.feeds)} camera(s) on {self.url}")
+        return self
+
+    def latest(self, sn: Optional[str] = None) -> Optional[RelayFrame]:
+        feed = self.feeds[sn] if sn else next(iter(self.feeds.values()))
+        return feed.frame
+
+    def close(self) -> None:
+        for feed in self.feeds.values():
+            feed.grabber.stop()
+        if self._threads:
+            self._server.shutdown()
+        self._server.server_close()
+        for t in self._threads:
+            t.join()
@@ -0,0 +1,134 @@
+"""
+On-disk cache of camera sessions, so short-lived processes can skip DH + login.
+
+The files contain the DH private key and shared secret, so they're only readable by
+the current user. Use this only on machines you trust.
+
+Every process using a cached session takes nid sequence numbers from the same
+counter, so the `seq` in the file is where the next unreserved block starts:
+`load(reserve=N)` and `reserve_seq` hand out blocks under the lock, and `save`
+never moves it back.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["SessionCache"]
+
+# sessions older than this are not restored, the camera has probably forgotten them
+DEFAULT_TTL = 6 * 60 * 60
+
+
+def _default_directory() -> Path:
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "mipc_camera_client" / "sessions"
+
+
+class SessionCache:
+    """one JSON file per host+user, with a lock file so concurrent processes don't clash"""
+
+    def __init__(
+        self, directory: Union[str, Path, None] = None, ttl: float = DEFAULT_TTL
+    ) -> None:
+        self.directory = Path(directory) if directory else _default_directory()
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"SessionCache(directory={str(self.directory)!r}, ttl={self.ttl})"
+
+    def _path(self, host: str, username: str) -> Path:
+        key = hashlib.sha256(f"{host}\0{username}".encode()).hexdigest()[:32]
+        return self.directory / f"{key}.json"
+
+    @contextlib.contextmanager
+    def _locked(self, path: Path, exclusive: bool):
+        self.directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+        lock_path = path.with_suffix(".lock")
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read(self, path: Path, host: str, username: str) -> Optional[Dict[str, Any]]:
+        try:
+            state = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"ignoring unreadable session cache {path}: {e!r}")
+            return None
+        if state.get("host") != host or state.get("username") != username:
+            return None
+        if time.time() - state.get("created_at", 0) > self.ttl:
+            LOGGER.debug(f"cached session for {username}@{host} expired")
+            return None
+        return state
+
+    def _write(self, path: Path, state: Dict[str, Any]) -> None:
+        tmp = path.with_suffix(".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def load(
+        self, host: str, username: str, reserve: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        the cached session state, or None if there's none or it's expired. With
+        `reserve`, the seqs from the returned `seq` on are reserved for the caller:
+        the next `load` starts `reserve` further on.
+        """
+        path = self._path(host, username)
+        with self._locked(path, exclusive=reserve > 0):
+            state = self._read(path, host, username)
+            if state is not None and reserve:
+                self._write(path, {**state, "seq": state["seq"] + reserve})
+        return state
+
+    def reserve_seq(
+        self, host: str, username: str, sid: Any, seq: int, count: int
+    ) -> Optional[int]:
+        """
+        reserve `count` more seqs for session `sid`, starting at `seq` or wherever
+        the last reservation ended. None if the cached session isn't `sid` anymore.
+        """
+        path = self._path(host, username)
+        with self._locked(path, exclusive=True):
+            state = self._read(path, host, username)
+            if state is None or state.get("sid") != sid:
+                return None
+            start = max(state["seq"], seq)
+            self._write(path, {**state, "seq": start + count})
+        return start
+
+    def save(self, host: str, username: str, state: Dict[str, Any]) -> None:
+        path = self._path(host, username)
+        state = {**state, "host": host, "username": username}
+        state.setdefault("created_at", time.time())
+        with self._locked(path, exclusive=True):
+            old = self._read(path, host, username)
+            if old is not None and old.get("sid") == state.get("sid"):
+                # other processes may have reserved seqs past ours
+                state["seq"] = max(state["seq"], old["seq"])
+            self._write(path, state)
+
+    def delete(self, host: str, username: str) -> None:
+        path = self._path(host, username)
+        with self._locked(path, exclusive=True):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,62 @@
+"""
+Single-flight call coalescing: concurrent calls with the same key share one execution.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+__all__ = ["SingleFlight"]
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Any = None
+        # callers that got this call's result without running it
+        self.shared = 0
+
+
+class SingleFlight:
+    """
+    runs `fn` once for all callers of `do(key, fn)` that arrive while it's running.
+
+    The first caller runs it on its own thread, the others block until it's done and
+    get the same result, or the same exception raised. Calls arriving after it
+    finished start a new one, nothing is cached.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def __repr__(self) -> str:
+        return f"SingleFlight(in_flight={len(self._calls)}, coalesced={self.coalesced})"
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.shared += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,33 @@
+"""
+Latency summaries shared by the timelapse, PTZ and multi-host code.
+"""
+import statistics
+from typing import Iterable, NamedTuple
+
+__all__ = ["LATENCY_WINDOW", "LatencySummary"]
+
+# latency stats are over this many most recent samples
+LATENCY_WINDOW = 10_000
+
+
+class LatencySummary(NamedTuple):
+    count: int
+    p50: float
+    p99: float
+    max: float
+
+    @classmethod
+    def of(cls, samples: Iterable[float]) -> "LatencySummary":
+        ordered = sorted(samples)
+        if not ordered:
+            return cls(0, 0.0, 0.0, 0.0)
+        p99_idx = min(len(ordered) - 1, int(len(ordered) * 0.99))
+        return cls(
+            len(ordered), statistics.median(ordered), ordered[p99_idx], ordered[-1]
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"n={self.count} p50={self.p50 * 1000:.1f}ms "
+            f"p99={self.p99 * 1000:.1f}ms max={self.max * 1000:.1f}ms"
+        )
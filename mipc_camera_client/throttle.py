@@ -0,0 +1,182 @@
+"""
+Per-camera request throttling, since the cameras' tiny HTTP servers fall over when pushed.
+
+Each host gets a token bucket (`rate` requests per second, bursts of up to `burst`)
+and a cap on concurrent requests (`max_in_flight`). Requests waiting for a slot are
+served by priority, so a PTZ command doesn't queue up behind a pile of snapshots.
+One `Throttle` is meant to be shared by every client talking to the same cameras.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Throttle", "HostLimiter", "LimiterStats", "DEFAULT_PRIORITIES"]
+
+# lower goes first, anything not listed gets DEFAULT_PRIORITY
+DEFAULT_PRIORITIES = {
+    "ccm_ptz_ctl": 0,
+    "cacs_dh_req": 1,
+    "cacs_login_req": 1,
+    "ccm_pic_get": 9,
+}
+DEFAULT_PRIORITY = 5
+
+
+class LimiterStats(NamedTuple):
+    acquired: int
+    in_flight: int
+    waiting: int
+    # seconds requests spent waiting for a slot, in total
+    waited: float
+
+
+class _Slot:
+    """permission to send one request, `release()` it when the response is done"""
+
+    def __init__(self, limiter: "HostLimiter") -> None:
+        self._limiter = limiter
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+    def __enter__(self) -> "_Slot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class HostLimiter:
+    """token bucket + priority ordered semaphore for one host"""
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        max_in_flight: Optional[int] = 2,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # (priority, arrival) of the waiting requests, the smallest one goes next
+        self._waiters: List[Tuple[int, int]] = []
+        self._arrivals = itertools.count()
+        self._in_flight = 0
+        self._acquired = 0
+        self._waited = 0.0
+
+    def __repr__(self) -> str:
+        return f"HostLimiter(rate={self.rate}, burst={self.burst}, max_in_flight={self.max_in_flight})"
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def _wait_time(self, me: Tuple[int, int]) -> Optional[float]:
+        """0 if `me` can go now, else how long to wait (None: until notified)"""
+        if self._waiters[0] != me:
+            return None
+        if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+            return None
+        if not self.rate or self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, priority: int = DEFAULT_PRIORITY) -> _Slot:
+        """wait for a slot, lower `priority` values are served first"""
+        started = time.monotonic()
+        with self._cond:
+            me = (priority, next(self._arrivals))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    wait = self._wait_time(me)
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            if self.rate:
+                self._tokens -= 1
+            self._in_flight += 1
+            self._acquired += 1
+            self._waited += time.monotonic() - started
+            # the next in line may be able to go too
+            self._cond.notify_all()
+        return _Slot(self)
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @property
+    def stats(self) -> LimiterStats:
+        with self._cond:
+            return LimiterStats(
+                self._acquired, self._in_flight, len(self._waiters), self._waited
+            )
+
+
+class Throttle:
+    """
+    a `HostLimiter` per host, created on first use with the given settings.
+
+    `priorities` maps msg_type to priority (lower first), see `DEFAULT_PRIORITIES`.
+    Use `limiter(host)` to tune a single camera.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        max_in_flight: Optional[int] = 2,
+        priorities: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.priorities = dict(DEFAULT_PRIORITIES if priorities is None else priorities)
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Throttle(rate={self.rate}, burst={self.burst}, max_in_flight={self.max_in_flight})"
+
+    def limiter(self, host: str) -> HostLimiter:
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = HostLimiter(
+                    self.rate, self.burst, self.max_in_flight
+                )
+            return limiter
+
+    def acquire(self, host: str, msg_type: str) -> _Slot:
+        limiter = self.limiter(host)
+        priority = self.priorities.get(msg_type, DEFAULT_PRIORITY)
+        started = time.monotonic()
+        slot = limiter.acquire(priority)
+        waited = time.monotonic() - started
+        if waited > 1.0:
+            LOGGER.debug(f"{host} {msg_type} waited {waited:.2f}s for a request slot")
+        return slot
@@ -0,0 +1,420 @@
+"""
+Timelapse capture from one or more cameras, with capture and storage decoupled.
+
+Each camera is captured by a `FrameGrabber` on its own fixed-rate clock, frames go
+through a bounded queue to a pool of writer threads, so a slow disk never stretches
+the capture interval (frames are dropped and counted instead).
+"""
+import collections
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Union,
+)
+
+from . import MipcCameraClient
+from .archive import DEFAULT_SEGMENT_SIZE, ArchiveWriter
+from .avi import DEFAULT_MAX_SIZE, MjpegAviWriter
+from .filenames import snapshot_filename
+from .grabber import Frame, FrameGrabber
+from .stats import LATENCY_WINDOW, LatencySummary
+
+if TYPE_CHECKING:
+    from .change import ChangeDetector
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "ArchiveFrameWriter",
+    "AviFrameWriter",
+    "FrameWriter",
+    "Timelapse",
+    "LatencySummary",
+]
+
+# strftime format for the per-day output directories
+DEFAULT_ROTATE_FORMAT = "%Y-%m-%d"
+
+
+class _Item(NamedTuple):
+    sn: Optional[str]
+    frame: Frame
+
+
+class FrameWriter:
+    """
+    writes frames to `{output_dir}/{date}/{timestamp}_{sn}.jpeg` from a pool of threads.
+
+    Files are fsynced in batches of `fsync_every` (per writer thread, or whenever the
+    queue goes idle) instead of one by one. `fsync_every=0` leaves it to the OS.
+    `rotate_format` is the strftime format of the dated directories, "" to disable.
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        workers: int = 2,
+        queue_size: int = 32,
+        fsync_every: int = 16,
+        rotate_format: str = DEFAULT_ROTATE_FORMAT,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.fsync_every = fsync_every
+        self.rotate_format = rotate_format
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._dirs: Set[Path] = set()
+        self._write_latencies: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"FrameWriter-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def path_for(self, sn: Optional[str], frame: Frame) -> Path:
+        directory = self.output_dir
+        if self.rotate_format:
+            when = datetime.datetime.fromtimestamp(
+                frame.timestamp, datetime.timezone.utc
+            )
+            directory = directory / when.strftime(self.rotate_format)
+        return directory / snapshot_filename(sn, frame.timestamp)
+
+    def submit(self, sn: Optional[str], frame: Frame) -> bool:
+        """queue a frame for writing, never blocks. False if the queue was full and it got dropped."""
+        try:
+            self._queue.put_nowait(_Item(sn, frame))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            LOGGER.warning(f"write queue full, dropping frame {frame.index} of {sn}")
+            return False
+
+    def close(self) -> None:
+        """write everything still queued, fsync and stop the writers"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    @property
+    def write_latency(self) -> LatencySummary:
+        with self._lock:
+            return LatencySummary.of(self._write_latencies)
+
+    def _mkdir(self, directory: Path) -> None:
+        if directory in self._dirs:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._dirs.add(directory)
+
+    def _sync(self, pending: List[int]) -> None:
+        for fd in pending:
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                with self._lock:
+                    self.errors += 1
+                LOGGER.error(f"fsync failed: {e!r}")
+            finally:
+                os.close(fd)
+        pending.clear()
+
+    def _store(self, item: _Item, pending: list) -> None:
+        """write one frame, adding whatever needs an fsync later to `pending`"""
+        path = self.path_for(item.sn, item.frame)
+        self._mkdir(path.parent)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(item.frame.data)
+            while view:
+                view = view[os.write(fd, view) :]
+        except BaseException:
+            os.close(fd)
+            raise
+        if self.fsync_every:
+            pending.append(fd)
+        else:
+            os.close(fd)
+
+    def _run(self) -> None:
+        # written but not yet fsynced files, kept open so the batch fsync doesn't reopen them
+        pending = []
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._sync(pending)
+                continue
+            if item is None:
+                self._sync(pending)
+                return
+            started = time.monotonic()
+            try:
+                self._store(item, pending)
+                if self.fsync_every and len(pending) >= self.fsync_every:
+                    self._sync(pending)
+            except OSError as e:
+                with self._lock:
+                    self.errors += 1
+                LOGGER.error(f"failed to write frame of {item.sn}: {e!r}")
+                continue
+            with self._lock:
+                self.written += 1
+                self._write_latencies.append(time.monotonic() - started)
+
+
+class ArchiveFrameWriter(FrameWriter):
+    """
+    FrameWriter that appends to segment archives (see `archive`) instead of writing
+    a file per frame. Uses a single writer thread so frames stay in order.
+    """
+
+    def __init__(
+        self,
+        archive_dir: Union[str, Path],
+        queue_size: int = 32,
+        fsync_every: int = 16,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+    ) -> None:
+        self.segment_size = segment_size
+        self._archives: Dict[str, ArchiveWriter] = {}
+        super().__init__(
+            archive_dir,
+            workers=1,
+            queue_size=queue_size,
+            fsync_every=fsync_every,
+            rotate_format="",
+        )
+
+    def _store(self, item: _Item, pending: list) -> None:
+        archive = self._archives.get(item.sn)
+        if archive is None:
+            archive = self._archives[item.sn] = ArchiveWriter(
+                self.output_dir, str(item.sn), self.segment_size
+            )
+        archive.append(item.frame.timestamp, item.frame.data)
+        if self.fsync_every:
+            pending.append(archive)
+
+    def _sync(self, pending: list) -> None:
+        for archive in set(pending):
+            try:
+                archive.flush(fsync=True)
+            except OSError as e:
+                with self._lock:
+                    self.errors += 1
+                LOGGER.error(f"fsync failed: {e!r}")
+        pending.clear()
+
+    def close(self) -> None:
+        super().close()
+        for archive in self._archives.values():
+            archive.close()
+
+
+class AviFrameWriter(FrameWriter):
+    """
+    FrameWriter that appends the JPEGs to an MJPEG AVI per camera, playing back at
+    `fps`. A new file is started when one reaches `max_size`. Files left unfinished
+    in `output_dir` by an earlier run are completed first.
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        fps: float = 25.0,
+        queue_size: int = 32,
+        fsync_every: int = 16,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ) -> None:
+        self.fps = fps
+        self.max_size = max_size
+        self._videos: Dict[str, MjpegAviWriter] = {}
+        self.files: List[Path] = []
+        output_dir = Path(output_dir)
+        for index_path in sorted(output_dir.glob("*.avi.idx")):
+            path = index_path.with_suffix("")
+            if path.exists():
+                with MjpegAviWriter.recover(path) as video:
+                    LOGGER.info(
+                        f"finished {path} left from before, {video.frames} frames"
+                    )
+        super().__init__(
+            output_dir,
+            workers=1,
+            queue_size=queue_size,
+            fsync_every=fsync_every,
+            rotate_format="",
+        )
+
+    def path_for(self, sn: Optional[str], frame: Frame) -> Path:
+        return super().path_for(sn, frame).with_suffix(".avi")
+
+    def _store(self, item: _Item, pending: list) -> None:
+        video = self._videos.get(item.sn)
+        if video is not None and video.full(len(item.frame.data), self.max_size):
+            # it's finished and closed, nothing to flush later
+            pending[:] = [v for v in pending if v is not video]
+            video.close()
+            video = None
+        if video is None:
+            path = self.path_for(item.sn, item.frame)
+            self._mkdir(path.parent)
+            video = self._videos[item.sn] = MjpegAviWriter(path, self.fps)
+            self.files.append(path)
+        video.append(item.frame.data)
+        if self.fsync_every:
+            pending.append(video)
+
+    def _sync(self, pending: list) -> None:
+        for video in set(pending):
+            try:
+                video.flush(fsync=True)
+            except OSError as e:
+                with self._lock:
+                    self.errors += 1
+                LOGGER.error(f"fsync failed: {e!r}")
+        pending.clear()
+
+    def close(self) -> None:
+        super().close()
+        for video in self._videos.values():
+            video.close()
+
+
+class Timelapse:
+    """
+    captures every client at `interval` seconds into `writer` until stopped.
+
+    With `detector_factory` (e.g. `ChangeDetector` from `change`), each camera gets a
+    detector and frames that barely differ from the last stored one are not written.
+    """
+
+    def __init__(
+        self,
+        clients: Iterable[MipcCameraClient],
+        interval: float,
+        writer: FrameWriter,
+        detector_factory: Optional[Callable[[], "ChangeDetector"]] = None,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        self.clients = list(clients)
+        self.writer = writer
+        self.detectors: Dict[str, "ChangeDetector"] = (
+            {c.host: detector_factory() for c in self.clients}
+            if detector_factory
+            else {}
+        )
+        # change score of every frame, when there are detectors
+        self.change_scores: Dict[str, Deque[float]] = {
+            host: collections.deque(maxlen=LATENCY_WINDOW) for host in self.detectors
+        }
+        self.grabbers = [
+            FrameGrabber(c, fps=1 / interval, buffer_size=2) for c in self.clients
+        ]
+        self._stop = threading.Event()
+        self._capture_latencies: Dict[str, Deque[float]] = {
+            c.host: collections.deque(maxlen=LATENCY_WINDOW) for c in self.clients
+        }
+
+    def _forward(self, client: MipcCameraClient, grabber: FrameGrabber) -> None:
+        sn = None
+        detector = self.detectors.get(client.host)
+        for frame in grabber:
+            self._capture_latencies[client.host].append(frame.latency)
+            if sn is None:
+                # frames are filed under the serial number, keep trying until it works
+                try:
+                    sn = client.get_device_sn()
+                except Exception as e:
+                    LOGGER.error(
+                        f"{client.host}: can't get the serial number, dropping frame "
+                        f"{frame.index}: {e!r}"
+                    )
+                    continue
+            if detector is not None:
+                try:
+                    result = detector.check(frame.data)
+                except (OSError, ValueError) as e:
+                    # can't tell, better keep it
+                    LOGGER.warning(f"change detection failed for {sn}: {e!r}")
+                else:
+                    self.change_scores[client.host].append(result.score)
+                    if not result.changed:
+                        continue
+            self.writer.submit(sn, frame)
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """capture until `duration` seconds have passed or `stop()` is called"""
+        forwarders = []
+        for client, grabber in zip(self.clients, self.grabbers):
+            grabber.start()
+            t = threading.Thread(
+                target=self._forward, args=(client, grabber), daemon=True
+            )
+            t.start()
+            forwarders.append(t)
+        try:
+            self._stop.wait(duration)
+        finally:
+            for grabber in self.grabbers:
+                grabber.stop()
+            for t in forwarders:
+                t.join()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def capture_latency(self, host: Optional[str] = None) -> LatencySummary:
+        if host is not None:
+            return LatencySummary.of(self._capture_latencies[host])
+        return LatencySummary.of(
+            [s for samples in self._capture_latencies.values() for s in samples]
+        )
+
+    def report(self) -> str:
+        lines = []
+        for client, grabber in zip(self.clients, self.grabbers):
+            stats = grabber.stats
+            line = (
+                f"{client.host}: captured={stats.captured} missed_ticks={stats.missed_ticks} "
+                f"errors={stats.errors} capture latency {self.capture_latency(client.host)}"
+            )
+            detector = self.detectors.get(client.host)
+            if detector is not None:
+                line += f" unchanged={detector.skipped}"
+            lines.append(line)
+        w = self.writer
+        lines.append(
+            f"writer: written={w.written} dropped={w.dropped} errors={w.errors} "
+            f"write latency {w.write_latency}"
+        )
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+"""
+HTTP transport for the sync client: a tuned `requests.Session` that many clients can share.
+"""
+import logging
+from typing import NamedTuple, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LOGGER = logging.getLogger(__name__)
+
+__all__ = ["Transport", "TransportStats", "DEFAULT_TIMEOUT"]
+
+# (connect, read) seconds, see https://requests.readthedocs.io/en/latest/user/advanced/#timeouts
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+Timeout = Union[float, Tuple[float, float], None]
+
+
+class TransportStats(NamedTuple):
+    requests: int
+    # TCP connections opened, anything less than `requests` is keep-alive doing its job
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        return self.requests - self.connections
+
+
+class Transport:
+    """
+    connection pooling and timeouts for `MipcCameraClient`.
+
+    One transport can be passed to any number of clients (it's thread safe as long as
+    nobody changes the session settings while requests are running). `pool_connections`
+    is how many hosts keep a connection pool, `pool_maxsize` how many connections are
+    kept per host - set it to at least the number of threads hitting one camera to
+    avoid "connection pool is full" warnings. With `pool_block`, extra threads wait for
+    a free connection instead of opening throwaway ones.
+
+    Pass `session` or `adapter` to bring your own (proxies, retries, TLS...).
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        timeout: Timeout = DEFAULT_TIMEOUT,
+        session: Optional[requests.Session] = None,
+        adapter: Optional[HTTPAdapter] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.session = session if session is not None else requests.Session()
+        if adapter is None and session is None:
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+        if adapter is not None:
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def __repr__(self) -> str:
+        return f"Transport(timeout={self.timeout}, stats={self.stats})"
+
+    def __enter__(self) -> "Transport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    @property
+    def stats(self) -> TransportStats:
+        """request and connection counts of the host pools currently kept open"""
+        reqs, conns = 0, 0
+        for adapter in set(self.session.adapters.values()):
+            poolmanager = getattr(adapter, "poolmanager", None)
+            if poolmanager is None:
+                continue
+            for key in poolmanager.pools.keys():
+                pool = poolmanager.pools.get(key)
+                if pool is not None:
+                    reqs += pool.num_requests
+                    conns += pool.num_connections
+        return TransportStats(requests=reqs, connections=conns)
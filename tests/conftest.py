@@ -0,0 +1,9 @@
+import pytest
+
+from fake_camera import FakeCamera
+
+
+@pytest.fixture
+def camera():
+    with FakeCamera() as cam:
+        yield cam
@@ -0,0 +1,189 @@
+"""
+a tiny in-process stand-in for the camera's embedded web server.
+
+speaks just enough of /ccm/*.js (JSONP, with the unquoted keys the real thing uses)
+and /ccm/ccm_pic_get.jpg to log in and grab frames.
+"""
+import base64
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from mipc_camera_client.crypto_helpers import des_encrypt_password_hash, hash_password
+
+# smallest thing that starts and ends like a JPEG
+FAKE_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64 + b"\xff\xd9"
+
+
+def _nid_session(nid: str):
+    """pull the sid back out of a nid, see crypto_helpers.format_nid"""
+    raw = base64.b64decode(nid.translate(str.maketrans("_.", "+/")) + "==")
+    pos = 1 + raw[0] - 32  # skip the md5
+    while pos < len(raw):
+        code, length = raw[pos] & 0xE0, raw[pos] & 0x1F
+        if code == 96:
+            return int.from_bytes(raw[pos + 1 : pos + 1 + length], "big")
+        pos += 1 + length
+    return None
+
+
+def _js_value(v):
+    if isinstance(v, dict):
+        return "{" + ",".join(f"{k}:{_js_value(x)}" for k, x in v.items()) + "}"
+    if isinstance(v, str):
+        return "'" + v.replace("'", "\\'") + "'"
+    return str(v)
+
+
+class FakeCamera:
+    def __init__(self, username="admin", password="hunter2", sn="1jfiegbqfake"):
+        self.username = username
+        self.password = password
+        self.sn = sn
+        self.jpeg = FAKE_JPEG
+        # seconds every request takes, to make concurrent requests overlap
+        self.delay = 0.0
+        self.requests = []
+        self._sessions = {}
+        self._sids = set()
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    @property
+    def host(self) -> str:
+        addr, port = self._server.server_address[:2]
+        return f"{addr}:{port}"
+
+    def start(self) -> "FakeCamera":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, msg_type) -> int:
+        with self._lock:
+            return sum(1 for r in self.requests if r == msg_type)
+
+    def expire_sessions(self) -> None:
+        """forget every login, like the real thing does after a reboot"""
+        with self._lock:
+            self._sids.clear()
+
+    def fail_next(self, n: int = 1, status: int = 503) -> None:
+        """answer the next `n` requests with an HTTP error"""
+        with self._lock:
+            self._failures.extend([status] * n)
+
+    def handle(self, msg_type, params):
+        with self._lock:
+            self.requests.append(msg_type)
+            if self._failures:
+                return self._failures.pop(0)
+            if (
+                "dsess_nid" in params
+                and _nid_session(params["dsess_nid"]) not in self._sids
+            ):
+                return {
+                    "type": f"{msg_type}_ack",
+                    "data": {"result": "err.sess.invalid"},
+                }
+        if self.delay:
+            time.sleep(self.delay)
+        handler = getattr(self, f"_{msg_type}", None)
+        if handler is None:
+            return None
+        return handler(params)
+
+    def _cacs_dh_req(self, params):
+        prime = int(params["dbnum_prime"])
+        root = int(params["droot_num"])
+        b = random.randint(0, 2**63)
+        tid = random.randint(1, 2**31)
+        lid = f"{random.randint(1, 255):#x}"
+        self._sessions[lid] = str(pow(int(params["dkey_a2b"]), b, prime))
+        return {
+            "type": "cacs_dh_ack",
+            "data": {"tid": tid, "lid": lid, "key_b2a": str(pow(root, b, prime))},
+        }
+
+    def _cacs_login_req(self, params):
+        secret = self._sessions.get(params.get("dlid"))
+        expected = secret and des_encrypt_password_hash(
+            hash_password(self.password), secret
+        )
+        if params.get("duser") != self.username or params.get("dpass") != expected:
+            return {"type": "cacs_login_ack", "data": {"result": "err.params"}}
+        sid = random.randint(1, 2**32)
+        with self._lock:
+            self._sids.add(sid)
+        return {
+            "type": "cacs_login_ack",
+            "data": {
+                "result": "",
+                "sid": f"{sid:#x}",
+                "seq": 1,
+                "lid": params["dlid"],
+                "addr": "127.0.0.1",
+            },
+        }
+
+    def _ccm_info_get(self, params):
+        return {"type": "ccm_info_get_ack", "data": {"sn": self.sn}}
+
+    def _ccm_play(self, params):
+        return {
+            "type": "ccm_play_ack",
+            "data": {"uri": {"url": f"rtmp://{self.host}/live/{params['dtoken']}"}},
+        }
+
+    def _ccm_ptz_ctl(self, params):
+        return {"type": "ccm_ptz_ctl_ack", "data": {}}
+
+    def _ccm_pic_get(self, params):
+        return self.jpeg
+
+
+def _make_handler(camera: FakeCamera):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.removeprefix("/ccm/")
+            msg_type, _, ext = name.rpartition(".")
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            result = camera.handle(msg_type, params)
+            if result is None or isinstance(result, int):
+                self.send_error(result or 404)
+                return
+            if ext == "jpg" and isinstance(result, bytes):
+                body, content_type = result, "image/jpeg"
+            else:
+                body = f"message({_js_value(result)});".encode()
+                content_type = "application/javascript"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
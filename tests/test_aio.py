@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from fake_camera import FakeCamera
+from mipc_camera_client.aio import AsyncMipcCameraClient
+
+
+def test_async_login_and_snapshot(camera):
+    async def run():
+        async with AsyncMipcCameraClient(camera.host) as c:
+            await c.login(camera.username, camera.password)
+            assert await c.get_image() == camera.jpeg
+            assert (await c.get_rtmp_stream()).endswith("/live/p0")
+            await c.control_ptz(5, 5)
+
+    asyncio.run(run())
+    assert camera.count("ccm_info_get") == 1
+
+
+def test_async_many_cameras_one_loop():
+    import aiohttp
+
+    cameras = [FakeCamera(sn=f"cam{i}").start() for i in range(10)]
+    try:
+
+        async def grab(session, cam):
+            c = AsyncMipcCameraClient(cam.host, session=session)
+            await c.login(cam.username, cam.password)
+            return await c.get_device_sn(), await c.get_image()
+
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                return await asyncio.gather(*(grab(session, cam) for cam in cameras))
+
+        results = asyncio.run(run())
+    finally:
+        for cam in cameras:
+            cam.stop()
+    assert [sn for sn, _ in results] == [f"cam{i}" for i in range(10)]
+    assert all(jpeg == cameras[0].jpeg for _, jpeg in results)
@@ -0,0 +1,98 @@
+import pytest
+
+from mipc_camera_client.archive import ArchiveReader, ArchiveWriter, archived_cameras
+from mipc_camera_client.cli import export
+
+
+def _frame(i):
+    return b"\xff\xd8" + bytes([i]) * (50 + i) + b"\xff\xd9"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    with ArchiveWriter(tmp_path, "cam1", segment_size=500) as w:
+        for i in range(20):
+            w.append(1000.0 + i * 10, _frame(i))
+    return tmp_path
+
+
+def test_segments_and_lookup(archive):
+    assert archived_cameras(archive) == ["cam1"]
+    with ArchiveReader(archive, "cam1") as r:
+        assert len(r.segments) > 1
+        assert len(r) == 20
+        frame = r.nearest(1054)
+        assert frame.timestamp == 1050.0
+        assert isinstance(frame.data, memoryview)
+        assert frame.data == _frame(5)
+        assert [f.timestamp for f in r.between(1075, 1120)] == [
+            1080.0,
+            1090,
+            1100,
+            1110,
+            1120,
+        ]
+        assert [bytes(f.data) for f in r] == [_frame(i) for i in range(20)]
+        assert r.nearest(0).timestamp == 1000.0
+        assert r.nearest(10**9).timestamp == 1190.0
+
+
+def test_reopen_appends_and_recovers_torn_frame(archive):
+    seg = sorted((archive / "cam1").glob("*.seg"))[-1]
+    with seg.open("ab") as f:
+        f.write(b"half a frame")
+    with ArchiveWriter(archive, "cam1", segment_size=500) as w:
+        w.append(2000.0, _frame(99))
+    with ArchiveReader(archive, "cam1") as r:
+        assert len(r) == 21
+        assert r.nearest(2000).data == _frame(99)
+
+
+def test_clock_going_back_is_clamped(archive):
+    with ArchiveWriter(archive, "cam1", segment_size=500) as w:
+        w.append(5.0, b"clock was set back")
+        w.append(1195.0, b"caught up")
+    with ArchiveReader(archive, "cam1") as r:
+        frames = list(r)
+        assert [f.timestamp for f in frames[-3:]] == [1190.0, 1190.0, 1195.0]
+        assert bytes(frames[-2].data) == b"clock was set back"
+
+
+def test_segments_roll_over_with_clamped_timestamps(tmp_path):
+    with ArchiveWriter(tmp_path, "cam1", segment_size=100) as w:
+        w.append(1000.0, _frame(0))
+        w.append(1001.0, _frame(1))
+        for i in range(2, 30):
+            w.append(500.0, _frame(i))
+    names = sorted(p.name for p in (tmp_path / "cam1").glob("*.seg"))
+    assert len(names) > 2 and any("~" in name for name in names)
+    with ArchiveReader(tmp_path, "cam1") as r:
+        assert [bytes(f.data) for f in r] == [_frame(i) for i in range(30)]
+        assert [f.timestamp for f in r] == [1000.0] + [1001.0] * 29
+    # and a writer picks up at the last of them
+    with ArchiveWriter(tmp_path, "cam1", segment_size=100) as w:
+        w.append(1002.0, _frame(30))
+    with ArchiveReader(tmp_path, "cam1") as r:
+        assert [bytes(f.data) for f in r][-2:] == [_frame(29), _frame(30)]
+
+
+def test_concurrent_writers_share_archive(tmp_path):
+    a = ArchiveWriter(tmp_path, "cam1", segment_size=100)
+    b = ArchiveWriter(tmp_path, "cam1", segment_size=100)
+    with a, b:
+        for i in range(20):
+            (a if i % 3 else b).append(1000.0 + i, _frame(i))
+    with ArchiveReader(tmp_path, "cam1") as r:
+        assert [f.timestamp for f in r] == [1000.0 + i for i in range(20)]
+        assert [bytes(f.data) for f in r] == [_frame(i) for i in range(20)]
+
+
+def test_export(archive, tmp_path):
+    out = tmp_path / "out"
+    export(str(archive), str(out), None, "1970-01-01T00:16:50", "1970-01-01T00:17:00")
+    files = sorted(p.name for p in out.iterdir())
+    assert files == [
+        "1970-01-01T00-16-50.000000UTC_cam1.jpeg",
+        "1970-01-01T00-17-00.000000UTC_cam1.jpeg",
+    ]
+    assert (out / files[0]).read_bytes() == _frame(1)
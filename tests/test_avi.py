@@ -0,0 +1,109 @@
+import struct
+
+from mipc_camera_client.avi import MjpegAviWriter, jpeg_size
+from mipc_camera_client.grabber import Frame
+from mipc_camera_client.timelapse import AviFrameWriter
+
+
+def _jpeg(i, width=640, height=360):
+    # SOI, APP0, SOF0 with the size, then padding for the "scan"
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + b"\0" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 3) + b"\0" * 3
+    return b"\xff\xd8" + app0 + sof0 + bytes([i]) * (40 + i) + b"\xff\xd9"
+
+
+def _chunks(data, start, end):
+    while start < end:
+        fourcc, size = struct.unpack_from("<4sI", data, start)
+        yield fourcc, start, size
+        start += 8 + size + size % 2
+
+
+def _parse(path):
+    data = path.read_bytes()
+    assert data[:4] == b"RIFF" and data[8:12] == b"AVI "
+    assert struct.unpack_from("<I", data, 4)[0] == len(data) - 8
+    top = {}
+    for fourcc, pos, size in _chunks(data, 12, len(data)):
+        key = data[pos + 8 : pos + 12] if fourcc == b"LIST" else fourcc
+        top[key] = (pos, size)
+    avih = struct.unpack_from("<14I", data, top[b"hdrl"][0] + 20)
+    movi_pos, movi_size = top[b"movi"]
+    frames = [
+        (pos - (movi_pos + 8), data[pos + 8 : pos + 8 + size])
+        for fourcc, pos, size in _chunks(data, movi_pos + 12, movi_pos + 8 + movi_size)
+        if fourcc == b"00dc"
+    ]
+    idx_pos, idx_size = top[b"idx1"]
+    index = list(
+        struct.iter_unpack("<4sIII", data[idx_pos + 8 : idx_pos + 8 + idx_size])
+    )
+    return avih, frames, index
+
+
+def test_jpeg_size():
+    assert jpeg_size(_jpeg(0, 1920, 1080)) == (1920, 1080)
+    assert jpeg_size(b"\xff\xd8\xff\xd9") is None
+
+
+def test_writer_index_and_header(tmp_path):
+    path = tmp_path / "a.avi"
+    with MjpegAviWriter(path, fps=10) as w:
+        for i in range(5):
+            w.append(_jpeg(i))
+    assert not (tmp_path / "a.avi.idx").exists()
+    avih, frames, index = _parse(path)
+    assert avih[0] == 100_000
+    assert avih[3] == 0x10  # AVIF_HASINDEX
+    assert avih[4] == 5
+    assert avih[8:10] == (640, 360)
+    assert [data for _, data in frames] == [_jpeg(i) for i in range(5)]
+    assert [(fourcc, offset, size) for fourcc, _, offset, size in index] == [
+        (b"00dc", offset, len(data)) for offset, data in frames
+    ]
+
+
+def test_recover_drops_torn_frame(tmp_path):
+    path = tmp_path / "a.avi"
+    w = MjpegAviWriter(path, fps=5)
+    for i in range(3):
+        w.append(_jpeg(i))
+    w.flush()
+    size = path.stat().st_size
+    w.append(_jpeg(3))
+    w.flush()
+    # the writer died halfway through the last frame
+    with path.open("r+b") as f:
+        f.truncate(size + 20)
+    with MjpegAviWriter.recover(path) as r:
+        assert r.frames == 3
+        r.append(_jpeg(9))
+    avih, frames, index = _parse(path)
+    assert avih[0] == 200_000 and avih[4] == 4
+    assert [data for _, data in frames] == [_jpeg(i) for i in (0, 1, 2, 9)]
+    assert len(index) == 4
+
+
+def test_recover_keeps_exact_rate(tmp_path):
+    path = tmp_path / "a.avi"
+    w = MjpegAviWriter(path, fps=30000 / 1001)
+    w.append(_jpeg(0))
+    w.flush()
+    with MjpegAviWriter.recover(path) as r:
+        assert r.fps == 30000 / 1001
+    strh = struct.unpack_from("<4s4sIHHIIIIIIIIhhhh", path.read_bytes(), 108)
+    assert strh[0] == b"vids"
+    assert (strh[7], strh[6]) == (30000, 1001)
+
+
+def test_frame_writer_rolls_over(tmp_path):
+    with AviFrameWriter(tmp_path, fps=2, fsync_every=2, max_size=600) as writer:
+        for i in range(6):
+            assert writer.submit("sn1", Frame(i, 1000.0 + i, 0.01, _jpeg(i)))
+    assert writer.written == 6
+    assert len(writer.files) > 1
+    frames = []
+    for path in writer.files:
+        assert path.stat().st_size <= 600
+        frames += [data for _, data in _parse(path)[1]]
+    assert frames == [_jpeg(i) for i in range(6)]
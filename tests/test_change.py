@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from fake_camera import FakeCamera
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.change import ChangeDetector, dhash, thumbnail
+from mipc_camera_client.timelapse import FrameWriter, Timelapse
+
+
+def _jpeg(box=None, brightness=60):
+    # left to right gradient, with a dark box in it
+    ramp = np.linspace(brightness, brightness + 120, 320, dtype=np.uint8)
+    pixels = np.tile(ramp, (240, 1))
+    if box:
+        x0, y0, x1, y1 = box
+        pixels[y0:y1, x0:x1] = 0
+    image = Image.fromarray(pixels, "L")
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+def test_thumbnail_and_hash():
+    thumb = thumbnail(_jpeg(), size=32)
+    assert thumb.shape == (32, 32)
+    assert 0.0 <= thumb.min() and thumb.max() <= 1.0
+    assert dhash(thumb).shape == (8, 8)
+
+
+@pytest.mark.parametrize("method", ["diff", "hash"])
+def test_detector_skips_static_frames(method):
+    detector = ChangeDetector(method=method)
+    first = detector.check(_jpeg())
+    assert first.changed and first.score == 1.0
+    again = detector.check(_jpeg())
+    assert not again.changed and again.score < detector.threshold
+    moved = detector.check(_jpeg(box=(0, 0, 160, 120)))
+    assert moved.changed
+    assert detector.score(_jpeg(box=(0, 0, 160, 120))) < detector.threshold
+    assert (detector.kept, detector.skipped) == (2, 1)
+
+
+def test_hash_ignores_brightness():
+    detector = ChangeDetector(method="hash")
+    detector.check(_jpeg(brightness=30))
+    assert not detector.check(_jpeg(brightness=90)).changed
+    assert ChangeDetector(method="diff", threshold=0.02).score(_jpeg()) == 1.0
+
+
+def test_timelapse_stores_only_changes(tmp_path):
+    cam = FakeCamera()
+    cam.jpeg = _jpeg()
+    cam.start()
+    try:
+        c = MipcCameraClient(cam.host)
+        c.login(cam.username, cam.password)
+        writer = FrameWriter(tmp_path, rotate_format="")
+        t = Timelapse(
+            [c], interval=0.05, writer=writer, detector_factory=ChangeDetector
+        )
+        t.run(duration=0.3)
+        writer.close()
+    finally:
+        cam.stop()
+    assert writer.written == 1
+    assert t.detectors[c.host].skipped >= 3
+    assert len(t.change_scores[c.host]) == t.capture_latency().count
+    assert "unchanged=" in t.report()
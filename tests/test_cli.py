@@ -0,0 +1,138 @@
+import argparse
+import os
+
+import pytest
+import requests
+
+from fake_camera import FakeCamera
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.cli import (
+    _parse_hosts,
+    _run_many,
+    main,
+    print_stream_url,
+    snapshot,
+)
+
+
+def test_parse_hosts(tmp_path):
+    assert _parse_hosts("cam1") == ["cam1"]
+    assert _parse_hosts("cam1, cam2,cam3") == ["cam1", "cam2", "cam3"]
+    hosts = tmp_path / "hosts"
+    hosts.write_text("cam1\n\n# spare\ncam2  # garage\n")
+    assert _parse_hosts(f"@{hosts}") == ["cam1", "cam2"]
+    assert _parse_hosts(None) == []
+
+
+def _args(handler, **kwargs):
+    return argparse.Namespace(
+        handler=handler,
+        user="admin",
+        parallel=4,
+        timeout=5.0,
+        session_cache=False,
+        **kwargs,
+    )
+
+
+def test_snapshot_many(tmp_path, capsys):
+    cams = [FakeCamera(sn=f"cam{i}").start() for i in range(3)]
+    try:
+        hosts = [c.host for c in cams] + ["127.0.0.1:1"]
+        args = _args(snapshot, filename=str(tmp_path), archive=None)
+        assert _run_many(args, hosts, cams[0].password, None) == 1
+        out = capsys.readouterr()
+        assert sorted(p.name.split("_")[-1] for p in tmp_path.iterdir()) == [
+            "cam0.jpeg",
+            "cam1.jpeg",
+            "cam2.jpeg",
+        ]
+        assert len(out.out.splitlines()) == 3
+        assert "127.0.0.1:1\tFAILED" in out.err
+        assert "3 ok, 1 failed" in out.err
+
+        assert (
+            _run_many(_args(print_stream_url), hosts[:2], cams[0].password, None) == 0
+        )
+        assert capsys.readouterr().out.splitlines() == [
+            f"{c.host}\trtmp://{c.host}/live/p0" for c in cams[:2]
+        ]
+    finally:
+        for c in cams:
+            c.stop()
+
+
+def test_failed_snapshot_keeps_existing_file(camera, tmp_path):
+    c = MipcCameraClient(camera.host, retries=0)
+    c.login(camera.username, camera.password)
+    target = tmp_path / "snap.jpeg"
+    target.write_bytes(b"old picture")
+    camera.fail_next(1)
+    with pytest.raises(requests.HTTPError):
+        snapshot(c, str(target), None)
+    assert target.read_bytes() == b"old picture"
+    assert [p.name for p in tmp_path.iterdir()] == ["snap.jpeg"]
+    snapshot(c, str(target), None)
+    assert target.read_bytes() == camera.jpeg
+
+
+def test_snapshot_file_mode_leaves_umask_alone(camera, tmp_path, monkeypatch):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    old = os.umask(0o027)
+    try:
+        # the umask is process-wide, snapshots from other threads must not touch it
+        monkeypatch.setattr(os, "umask", lambda mask: pytest.fail("umask changed"))
+        snapshot(c, str(tmp_path / "snap.jpeg"), None)
+    finally:
+        monkeypatch.undo()
+        os.umask(old)
+    assert (tmp_path / "snap.jpeg").stat().st_mode & 0o777 == 0o640
+
+
+def _main(monkeypatch, password, *argv):
+    monkeypatch.setenv("CAMERA_PASSWORD", password)
+    monkeypatch.setenv("CAMERA_USER", "admin")
+    monkeypatch.setattr("sys.argv", ["mipc_camera_client", *argv])
+    main()
+
+
+def test_timelapse_takes_host_list(monkeypatch, tmp_path):
+    cams = [FakeCamera(sn=f"cam{i}").start() for i in range(3)]
+    try:
+        _main(
+            monkeypatch,
+            cams[0].password,
+            "--host",
+            f"{cams[0].host},{cams[1].host}",
+            "timelapse",
+            str(tmp_path),
+            "--also-host",
+            cams[2].host,
+            "--interval",
+            "0.1",
+            "--duration",
+            "0.25",
+            "--rotate",
+            "",
+        )
+        sns = {p.stem.split("_")[-1] for p in tmp_path.iterdir()}
+        assert sns == {"cam0", "cam1", "cam2"}
+    finally:
+        for c in cams:
+            c.stop()
+
+
+def test_timeout_applies_to_single_host(monkeypatch, camera):
+    camera.delay = 1.0
+    with pytest.raises(requests.exceptions.Timeout):
+        _main(
+            monkeypatch,
+            camera.password,
+            "--host",
+            camera.host,
+            "--timeout",
+            "0.1",
+            "--no-daemon",
+            "stream",
+        )
@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from mipc_camera_client import MipcCameraClient, SessionExpiredError
+
+
+def test_login_and_snapshot(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    assert c.sid
+    assert c.get_image() == camera.jpeg
+    assert c.get_device_sn() == camera.sn
+    assert camera.count("ccm_info_get") == 1
+
+
+def test_login_wrong_password(camera):
+    c = MipcCameraClient(camera.host)
+    with pytest.raises(Exception, match="failed to login"):
+        c.login(camera.username, "nope")
+
+
+def test_stream_and_ptz(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    assert c.get_rtmp_stream("p1").endswith("/live/p1")
+    c.control_ptz(10, -10)
+    assert camera.count("ccm_ptz_ctl") == 1
+
+
+def test_get_image_into_file_and_buffer(camera, tmp_path):
+    camera.jpeg = camera.jpeg[:-2] + bytes(200_000) + b"\xff\xd9"
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+
+    with (tmp_path / "snap.jpeg").open("wb") as fd:
+        assert c.get_image_into(fd, chunk_size=4096) == len(camera.jpeg)
+    assert (tmp_path / "snap.jpeg").read_bytes() == camera.jpeg
+
+    buf = bytearray(len(camera.jpeg) + 100)
+    size = c.get_image_into(buf)
+    assert buf[:size] == camera.jpeg
+
+    assert b"".join(c.iter_image(chunk_size=1000)) == camera.jpeg
+
+    with pytest.raises(BufferError):
+        c.get_image_into(bytearray(10))
+
+
+@pytest.fixture
+def client(camera):
+    c = MipcCameraClient(camera.host, retries=2, backoff=0.01)
+    c.login(camera.username, camera.password)
+    c.get_device_sn()
+    return c
+
+
+def test_retries_server_errors(client, camera):
+    camera.fail_next(2)
+    assert client.get_image() == camera.jpeg
+    assert camera.count("ccm_pic_get") == 3
+
+    camera.fail_next(3)
+    with pytest.raises(requests.HTTPError):
+        client.get_image()
+
+
+def test_ptz_not_retried(client, camera):
+    camera.fail_next(1)
+    with pytest.raises(requests.HTTPError):
+        client.control_ptz(10, 10)
+    assert camera.count("ccm_ptz_ctl") == 1
+
+
+def test_logs_in_again_after_camera_reboot(client, camera):
+    camera.expire_sessions()
+    assert client.get_image() == camera.jpeg
+    assert camera.count("cacs_login_req") == 2
+
+
+@pytest.mark.parametrize("failures", [1, 5])
+def test_rejected_dh_fails_login_without_relogin(camera, failures):
+    camera.fail_next(failures, status=401)
+    c = MipcCameraClient(camera.host)
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(c.login, camera.username, camera.password)
+        with pytest.raises(SessionExpiredError, match="cacs_dh_req"):
+            future.result(timeout=5)
+    assert camera.requests == ["cacs_dh_req"]
+
+
+def test_rejected_login_req_fails_login_without_relogin(camera):
+    c = MipcCameraClient(camera.host)
+    c.run_dh()
+    camera.fail_next(1, status=403)
+    with pytest.raises(SessionExpiredError, match="cacs_login_req"):
+        c.login(camera.username, camera.password)
+    assert camera.requests == ["cacs_dh_req", "cacs_login_req"]
+    # nothing got stuck, logging in works once the camera accepts it
+    c.login(camera.username, camera.password)
+    assert c.sid
+
+
+def test_concurrent_reads_are_coalesced(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    camera.delay = 0.2
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(lambda _: c.get_device_sn(), range(8))) == {camera.sn}
+        assert camera.count("ccm_info_get") == 1
+        assert all(
+            img == camera.jpeg for img in pool.map(lambda _: c.get_image(), range(8))
+        )
+    assert camera.count("ccm_pic_get") == 1
+
+    c.coalesce = False
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: c.get_image(), range(4)))
+    assert camera.count("ccm_pic_get") == 5
+
+
+def test_nids_are_unique_across_threads(client):
+    start = client.seq
+    with ThreadPoolExecutor(8) as pool:
+        nids = list(pool.map(lambda _: client.nid(), range(2000)))
+    assert len(set(nids)) == 2000
+    assert client.seq == start + 2000
+
+
+def test_concurrent_requests_log_in_again_once(client, camera):
+    client.coalesce = False
+    camera.expire_sessions()
+    camera.delay = 0.1
+    with ThreadPoolExecutor(4) as pool:
+        assert all(
+            img == camera.jpeg
+            for img in pool.map(lambda _: client.get_image(), range(4))
+        )
+    assert camera.count("cacs_login_req") == 2
+
+
+@pytest.mark.parametrize(
+    "result", ["err.params.invalid", "err.invalid", "err.unidentified"]
+)
+def test_ordinary_error_is_not_session_expiry(client, camera, result):
+    camera._ccm_ptz_ctl = lambda params: {
+        "type": "ccm_ptz_ctl_ack",
+        "data": {"result": result},
+    }
+    logins = camera.count("cacs_login_req")
+    # not a SessionExpiredError, and the move isn't sent again after a new login
+    client.control_ptz(10, 0)
+    assert camera.count("ccm_ptz_ctl") == 1
+    assert camera.count("cacs_login_req") == logins
+
+
+def test_session_error_codes():
+    from mipc_camera_client import SESSION_ERROR_RE
+
+    assert SESSION_ERROR_RE.search("err.sess.invalid")
+    assert SESSION_ERROR_RE.search("err.nid")
+    assert not SESSION_ERROR_RE.search("err.params.invalid")
+    assert not SESSION_ERROR_RE.search("err.unidentified")
@@ -0,0 +1,149 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from mipc_camera_client import daemon as daemon_module
+from mipc_camera_client.cli import print_stream_url, snapshot
+from mipc_camera_client.daemon import (
+    CameraDaemon,
+    DaemonCamera,
+    DaemonClient,
+    DaemonError,
+    DaemonUnavailable,
+    default_socket_path,
+)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    d = CameraDaemon(tmp_path / "d.sock")
+    d.bind()
+    thread = threading.Thread(target=d.serve_forever, daemon=True)
+    thread.start()
+    yield d
+    d.shutdown()
+    thread.join()
+
+
+def test_sessions_stay_warm(daemon, camera):
+    for _ in range(3):
+        c = DaemonCamera.connect(
+            camera.host, camera.username, camera.password, daemon.socket_path
+        )
+        assert c.get_image() == camera.jpeg
+        assert c.get_device_sn() == camera.sn
+        assert c.get_rtmp_stream().endswith("/live/p0")
+        c.control_ptz(1, 2)
+        c.close()
+    assert camera.count("cacs_login_req") == 1
+    assert camera.count("ccm_pic_get") == 3
+
+
+def test_errors_and_wrong_password(daemon, camera):
+    with DaemonClient(daemon.socket_path) as d:
+        auth = {"host": camera.host, "user": camera.username}
+        d.request("snapshot", password=camera.password, **auth)
+        with pytest.raises(DaemonError):
+            d.request("snapshot", password="wrong", **auth)
+        with pytest.raises(DaemonError):
+            d.request("nope", password=camera.password, **auth)
+        # the connection is still usable, and the good session is still there
+        assert d.request("snapshot", password=camera.password, **auth)[1] == camera.jpeg
+    assert camera.count("cacs_login_req") == 2
+
+
+def test_concurrent_requests_log_in_once(daemon, camera):
+    camera.delay = 0.1
+    barrier = threading.Barrier(4)
+    images = []
+
+    def grab():
+        with DaemonClient(daemon.socket_path) as d:
+            barrier.wait()
+            images.append(
+                d.request(
+                    "snapshot",
+                    host=camera.host,
+                    user=camera.username,
+                    password=camera.password,
+                )[1]
+            )
+
+    threads = [threading.Thread(target=grab) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert images == [camera.jpeg] * 4
+    assert camera.count("cacs_login_req") == 1
+
+
+def test_hung_daemon_is_unavailable(tmp_path):
+    path = tmp_path / "hung.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    # accepts connections (through the backlog) but never answers
+    server.listen()
+    try:
+        with pytest.raises(DaemonUnavailable):
+            DaemonCamera.connect("host", "user", "pass", path, timeout=0.2)
+        with DaemonClient(path, timeout=0.2) as d:
+            with pytest.raises(DaemonUnavailable):
+                d.request("snapshot")
+            assert d._sock is None
+    finally:
+        server.close()
+
+
+def test_cli_handlers_through_daemon(daemon, camera, tmp_path, capsys):
+    c = DaemonCamera.connect(
+        camera.host, camera.username, camera.password, daemon.socket_path
+    )
+    snapshot(c, str(tmp_path), None)
+    out = capsys.readouterr().out.strip()
+    assert out.endswith(f"_{camera.sn}.jpeg")
+    assert (tmp_path / out.split("/")[-1]).read_bytes() == camera.jpeg
+    print_stream_url(c)
+    assert capsys.readouterr().out.strip().endswith("/live/p0")
+    c.close()
+
+
+def test_no_daemon(tmp_path):
+    with pytest.raises(DaemonUnavailable):
+        DaemonCamera.connect("host", "user", "pass", tmp_path / "missing.sock")
+    # a stale socket file is replaced
+    stale = CameraDaemon(tmp_path / "stale.sock")
+    stale.bind()
+    stale._server.server_close()
+    stale._server = None
+    d = CameraDaemon(tmp_path / "stale.sock")
+    d.bind()
+    thread = threading.Thread(target=d.serve_forever, daemon=True)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        CameraDaemon(tmp_path / "stale.sock").bind()
+    d.shutdown()
+    thread.join()
+    assert not (tmp_path / "stale.sock").exists()
+
+
+def test_socket_outside_private_dir_is_refused(tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    shared.chmod(0o1777)
+    with pytest.raises(PermissionError):
+        CameraDaemon(shared / "d.sock").bind()
+    with pytest.raises(DaemonUnavailable):
+        DaemonCamera.connect("host", "user", "pass", shared / "d.sock")
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    path = default_socket_path()
+    assert path.parent.name == f"mipc_camera_client-{os.getuid()}"
+
+
+def test_daemon_of_another_user_is_refused(daemon, monkeypatch):
+    monkeypatch.setattr(daemon_module, "_peer_uid", lambda sock: os.getuid() + 1)
+    with pytest.raises(DaemonUnavailable):
+        DaemonCamera.connect("host", "user", "pass", daemon.socket_path)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.dedup import SnapshotSource
+from mipc_camera_client.grabber import FrameGrabber
+
+
+@pytest.fixture
+def client(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    c.get_device_sn()
+    return c
+
+
+def test_duplicates_are_reported(client, camera):
+    source = SnapshotSource(client, history=2)
+    first = source.get()
+    assert not first.duplicate and first.data == camera.jpeg
+    assert source.get().duplicate
+    assert source.get_image() is None
+
+    camera.jpeg = b"\xff\xd8new\xff\xd9"
+    assert source.get_image() == camera.jpeg
+    camera.jpeg = b"\xff\xd8newer\xff\xd9"
+    assert source.get_image() == camera.jpeg
+    # the first frame fell out of the 2 frame history
+    camera.jpeg = first.data
+    assert source.get_image() == first.data
+    assert source.stats.duplicates == 2
+
+
+def test_cache_shares_requests(client, camera):
+    source = SnapshotSource(client, max_age=60)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(source.get())) for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert camera.count("ccm_pic_get") == 1
+    assert sum(not s.cached for s in results) == 1
+    # cached responses are delivered even though it's the same frame
+    assert source.get_image() == camera.jpeg
+    assert source.stats.cache_hits == 8
+
+
+def test_cache_expires(client, camera):
+    source = SnapshotSource(client, max_age=0.05)
+    source.get()
+    time.sleep(0.1)
+    assert not source.get().cached
+    assert camera.count("ccm_pic_get") == 2
+
+
+def test_grabber_skips_duplicates(client):
+    with FrameGrabber(SnapshotSource(client), fps=50) as grabber:
+        time.sleep(0.2)
+    stats = grabber.stats
+    assert stats.captured == 1
+    assert stats.duplicates >= 3
+    assert stats.errors == 0
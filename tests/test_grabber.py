@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.grabber import FrameGrabber
+
+
+@pytest.fixture
+def client(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    return c
+
+
+def test_fixed_rate(client, camera):
+    with FrameGrabber(client, fps=20) as grabber:
+        frames = [grabber.get(timeout=1) for _ in range(10)]
+    assert [f.index for f in frames] == list(range(10))
+    assert all(f.data == camera.jpeg for f in frames)
+    # scheduled on a clock, so 10 frames take ~9 periods, not 9 * (period + latency)
+    assert frames[-1].timestamp - frames[0].timestamp == pytest.approx(0.45, abs=0.1)
+    assert 15 < grabber.stats.fps < 25
+
+
+def test_drop_oldest(client):
+    grabber = FrameGrabber(client, buffer_size=3).start()
+    time.sleep(0.3)
+    grabber.stop()
+    stats = grabber.stats
+    assert stats.captured > 3
+    assert stats.dropped == stats.captured - 3
+    frames = list(grabber)
+    assert [f.index for f in frames] == list(range(stats.captured - 3, stats.captured))
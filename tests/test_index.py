@@ -0,0 +1,137 @@
+import os
+
+from mipc_camera_client.cli import find
+from mipc_camera_client.filenames import parse_snapshot_filename, snapshot_filename
+from mipc_camera_client import index as index_module
+from mipc_camera_client.index import FrameIndex
+
+
+def _touch(directory, sn, timestamp):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / snapshot_filename(sn, timestamp)
+    path.write_bytes(b"\xff\xd8\xff\xd9")
+    return path
+
+
+def test_parse_snapshot_filename():
+    name = snapshot_filename("ABC_123", 1700000000.25)
+    assert parse_snapshot_filename(name) == (1700000000.25, "ABC_123")
+    assert parse_snapshot_filename("notes.txt") is None
+
+
+def test_nearest_and_between(tmp_path):
+    for i in range(10):
+        _touch(tmp_path / f"day{i % 2}", "cam1", 1000.0 + i * 10)
+    _touch(tmp_path, "cam2", 1000.0)
+    (tmp_path / "unrelated.jpeg").write_bytes(b"")
+    index = FrameIndex(tmp_path)
+    assert index.cameras() == ["cam1", "cam2"]
+    assert len(index) == 11
+    entry = index.nearest("cam1", 1034)
+    assert entry.timestamp == 1030.0
+    assert entry.path == tmp_path / "day1" / snapshot_filename("cam1", 1030.0)
+    assert index.nearest("cam1", 0).timestamp == 1000.0
+    assert index.nearest("cam1", 10**9).timestamp == 1090.0
+    assert index.nearest("nope", 1000) is None
+    assert [e.timestamp for e in index.between("cam1", 1015, 1040)] == [
+        1020.0,
+        1030.0,
+        1040.0,
+    ]
+
+
+def test_incremental_update(tmp_path):
+    old = _touch(tmp_path / "a", "cam1", 1000.0)
+    _touch(tmp_path / "b", "cam1", 2000.0)
+    FrameIndex(tmp_path)
+
+    index = FrameIndex(tmp_path, update=False)
+    assert len(index) == 2
+    # nothing changed, nothing rescanned
+    assert index.update() == 0
+
+    _touch(tmp_path / "b", "cam1", 3000.0)
+    _touch(tmp_path / "c", "cam1", 1500.0)
+    old.unlink()
+    # make sure the mtime changes even on coarse filesystems
+    st = os.stat(tmp_path / "a")
+    os.utime(tmp_path / "a", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    # a, b, c and the root, where c appeared
+    assert index.update() == 4
+    assert [e.timestamp for e in index.between("cam1", 0, 10**9)] == [
+        1500.0,
+        2000.0,
+        3000.0,
+    ]
+
+    reloaded = FrameIndex(tmp_path, update=False)
+    assert [e.timestamp for e in reloaded.between("cam1", 0, 10**9)] == [
+        1500.0,
+        2000.0,
+        3000.0,
+    ]
+
+
+def _lookup_cost(root, monkeypatch):
+    """lines parsed by a nearest and a short between lookup, on a loaded index"""
+    index = FrameIndex(root, update=False)
+    parsed = []
+    original = index_module._parse_line
+
+    def counting(data, start):
+        parsed.append(start)
+        return original(data, start)
+
+    monkeypatch.setattr(index_module, "_parse_line", counting)
+    middle = 1000.0 + len(index) // 2 * 10
+    assert index.nearest("cam1", middle + 3).timestamp == middle
+    assert len(index.between("cam1", middle - 5, middle + 25)) == 3
+    monkeypatch.undo()
+    return len(parsed)
+
+
+def test_lookup_cost_does_not_grow_with_archive(tmp_path, monkeypatch):
+    small, big = tmp_path / "small", tmp_path / "big"
+    for i in range(16):
+        _touch(small / f"d{i // 8}", "cam1", 1000.0 + i * 10)
+    for i in range(4096):
+        _touch(big / f"d{i // 512}", "cam1", 1000.0 + i * 10)
+    FrameIndex(small)
+    FrameIndex(big)
+    # binary search: the big index costs a few more lines per halving, not 256x
+    assert _lookup_cost(big, monkeypatch) <= _lookup_cost(small, monkeypatch) + 40
+
+    # nothing changed: every known directory is stat'ed, none of them listed
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda p: listed.append(p) or scandir(p))
+    assert FrameIndex(big).update() == 0
+    assert listed == [big / ".mipc_index"]
+
+
+def test_deleted_directory_and_old_index(tmp_path):
+    for i in range(6):
+        _touch(tmp_path / f"d{i % 3}", "cam1", 1000.0 + i)
+    FrameIndex(tmp_path)
+    for path in (tmp_path / "d1").iterdir():
+        path.unlink()
+    (tmp_path / "d1").rmdir()
+    index = FrameIndex(tmp_path)
+    assert [e.timestamp for e in index.between("cam1", 0, 10**9)] == [
+        1000.0,
+        1002.0,
+        1003.0,
+        1005.0,
+    ]
+    # an index written before the per-directory counts is rebuilt
+    (tmp_path / ".mipc_index" / "dirs.json").write_text('{"": 1, "d0": 1}')
+    assert len(FrameIndex(tmp_path)) == 4
+
+
+def test_find_command(tmp_path, capsys):
+    _touch(tmp_path, "cam1", 1000.0)
+    path = _touch(tmp_path, "cam1", 1060.0)
+    find(str(tmp_path), "cam1", "1970-01-01T00:17:30", None, None)
+    assert capsys.readouterr().out == f"{path}\n"
+    find(str(tmp_path), None, None, "1970-01-01T00:16:50", None)
+    assert capsys.readouterr().out == f"{path}\n"
@@ -0,0 +1,42 @@
+import json5
+import pytest
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.jsonp import loads, loads_fast, to_json
+
+responses = [
+    "{type:'cacs_login_ack',data:{result:'',sid:'0x1e',seq:1,lid:'0x4c',addr:'1.2.3.4'}}",
+    '{"type":"ccm_info_get_ack","data":{"sn":"1jfiegbq"}}',
+    "{data:{p:[{n:'s.mode',v:'day'},{n:'s.flip',v:'0'},]},}",
+    "{msg:'it\\'s \"quoted\"',x:-1.5e3,ok:true,no:null}",
+    "{url:'rtmp://1.2.3.4:1935/live/p0?a=b:c'}",
+    "{'quoted key':'v',\"dq\":'x:y'}",
+    "{hex:0x1f,inf:Infinity}",
+    "// comment\n{a:1}",
+    "{}",
+]
+
+
+@pytest.mark.parametrize("text", responses)
+def test_fast_matches_json5(text):
+    assert loads_fast(text) == json5.loads(text)
+
+
+def test_to_json_leaves_strings_alone():
+    assert to_json("{a:'b:c',\"d:\":1}") == '{"a":"b:c","d:":1}'
+
+
+def test_parser_switch():
+    text = "message({type:'ccm_ptz_ctl_ack'});"
+    for parser in ("fast", "json5"):
+        assert MipcCameraClient._parse_jsonp(text, parser) == {
+            "type": "ccm_ptz_ctl_ack"
+        }
+    with pytest.raises(ValueError):
+        loads("{}", "yaml")
+
+
+def test_client_parser_option(camera):
+    c = MipcCameraClient(camera.host, jsonp_parser="json5")
+    c.login(camera.username, camera.password)
+    assert c.get_device_sn() == camera.sn
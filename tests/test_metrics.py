@@ -0,0 +1,54 @@
+import urllib.request
+
+import pytest
+import requests
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.metrics import Metrics, RequestEvent, serve_metrics
+
+
+def test_client_reports_requests(camera):
+    metrics = Metrics()
+    events = []
+    c = MipcCameraClient(
+        camera.host,
+        retries=1,
+        backoff=0.01,
+        metrics=lambda e: (events.append(e), metrics(e)),
+    )
+    c.login(camera.username, camera.password)
+    assert [e.msg_type for e in events] == ["cacs_dh_req", "cacs_login_req"]
+    c.get_image()
+    c.get_image_into(bytearray(1 << 20))
+    camera.fail_next(2)
+    with pytest.raises(requests.HTTPError):
+        c.get_image()
+
+    assert metrics.count("ccm_pic_get") == 4
+    assert metrics.errors("ccm_pic_get") == 2
+    assert metrics.count("ccm_info_get", host=camera.host) == 1
+    last_ok = [e for e in events if e.msg_type == "ccm_pic_get"][1]
+    assert last_ok.status == 200 and last_ok.bytes == len(camera.jpeg)
+    assert events[-1].error == "HTTPError" and events[-1].status == 503
+
+
+def test_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics(RequestEvent("cam", "ccm_pic_get", 0.05, 200, 1000, None))
+    metrics(RequestEvent("cam", "ccm_pic_get", 0.5, None, 0, "ConnectTimeout"))
+    text = metrics.render()
+    labels = 'host="cam",msg_type="ccm_pic_get"'
+    assert f'mipc_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'mipc_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'mipc_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"mipc_response_bytes_total{{{labels}}} 1000" in text
+    assert f'mipc_request_errors_total{{{labels},error="ConnectTimeout"}} 1' in text
+
+    server = serve_metrics(metrics, 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as resp:
+            assert resp.read().decode() == text
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,6 +1,14 @@
+import random
+
 import pytest
 
-from mipc_camera_client.crypto_helpers import format_nid, str_2_b64, _encode_magic
+from mipc_camera_client.crypto_helpers import (
+    NidEncoder,
+    _encode_magic,
+    format_nid,
+    format_nid_fast,
+    str_2_b64,
+)
 
 b64_examples = [
     ("abcde", "YWJjZGU"),
@@ -123,3 +131,26 @@ encode_examples = [
 )
 def test_encode(input, out):
     assert _encode_magic(input) == out
+
+
+@pytest.mark.parametrize(
+    "e", nid_examples, ids=lambda e: ", ".join(map(repr, e["args"].values()))
+)
+def test_nid_fast(e):
+    assert format_nid_fast(**e["args"]) == e["out"]
+
+
+def test_nid_encoder_matches_reference():
+    rng = random.Random(1234)
+    for _ in range(200):
+        c = rng.choice(["", "0x4c", "0x1e", f"{rng.getrandbits(24):#x}", "0xABC"])
+        e = str(rng.getrandbits(120))
+        g = rng.choice([0, 1, 2])
+        encoder = NidEncoder(c, e, g)
+        for a in (0, 1, rng.getrandbits(8), rng.getrandbits(20), rng.getrandbits(40)):
+            assert encoder(a) == format_nid(a, c, e, g, None, None)
+
+
+def test_nid_encoder_falls_back_for_wide_chars():
+    args = ("0x4c", "secret☃", 2, None, None)
+    assert NidEncoder(*args[:3])(7) == format_nid(7, *args)
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.panorama import Panorama, grid_positions
+from mipc_camera_client.patrol import MotionModel
+
+FAST = MotionModel(rate=1000.0, settle=0.0)
+
+# control_ptz units to scene pixels
+PIXELS_PER_UNIT = 2
+
+
+def _scene(width=1000, height=500):
+    rng = np.random.default_rng(1)
+    noise = (rng.random((height // 10, width // 10, 3)) * 255).astype(np.uint8)
+    return np.asarray(
+        Image.fromarray(noise).resize((width, height), Image.Resampling.BICUBIC)
+    )
+
+
+def _jpeg(pixels):
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+def test_grid_positions_snake():
+    assert grid_positions(3, 2, 10, 5, origin=(1, 2)) == [
+        (0, 0, 1, 2),
+        (1, 0, 11, 2),
+        (2, 0, 21, 2),
+        (2, 1, 21, 7),
+        (1, 1, 11, 7),
+        (0, 1, 1, 7),
+    ]
+
+
+def test_capture_and_stitch(camera):
+    scene = _scene()
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    position = [0, 0]
+    control_ptz = c.control_ptz
+
+    def move(tilt_x, tilt_y, *args):
+        control_ptz(tilt_x, tilt_y, *args)
+        position[0] = max(0, position[0] + tilt_x)
+        position[1] = max(0, position[1] + tilt_y)
+        # tilting up moves the picture up the scene
+        x = position[0] * PIXELS_PER_UNIT
+        y = 150 - position[1] * PIXELS_PER_UNIT
+        camera.jpeg = _jpeg(scene[y : y + 300, x : x + 400])
+
+    c.control_ptz = move
+    p = Panorama(c, cols=3, rows=2, step_x=100, step_y=50, motion=FAST, align_width=200)
+    image = p.run()
+    assert camera.count("ccm_ptz_ctl") == 6
+    assert len(p.frames) == 6
+    assert all(s.score > 0.9 for s in p.shifts)
+    assert image.size == (800, 400)
+    error = np.abs(np.asarray(image, dtype=float) - scene[50:450, 0:800]).mean()
+    assert error < 6
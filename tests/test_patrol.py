@@ -0,0 +1,70 @@
+import itertools
+
+import pytest
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.patrol import (
+    MotionModel,
+    Patrol,
+    Position,
+    _cycle_time,
+    plan_route,
+)
+
+FAST = MotionModel(speed_x=80, speed_y=50, rate=1000.0, settle=0.0)
+
+
+def test_travel_time_runs_both_motors_at_once():
+    motion = MotionModel(speed_x=80, speed_y=40, rate=1.0, settle=0.5)
+    assert motion.travel_time(0, 0) == 0
+    assert motion.travel_time(160, 40) == pytest.approx(2.5)
+    assert motion.travel_time(-40, -80) == pytest.approx(2.5)
+
+
+def test_plan_route_is_shortest_round():
+    positions = [
+        Position("a", 0, 0),
+        Position("c", 200, 0),
+        Position("b", 100, 10),
+        Position("d", 100, 100),
+        Position("e", 10, 90),
+    ]
+    motion = MotionModel()
+    route = plan_route(positions, motion)
+    assert route[0].name == "a"
+    best = min(
+        _cycle_time([positions[0], *order], motion)
+        for order in itertools.permutations(positions[1:])
+    )
+    assert _cycle_time(route, motion) == pytest.approx(best)
+
+
+def test_plan_route_many_stops():
+    # a row of stops given in shuffled order should be swept along, not zig-zagged
+    xs = [70, 10, 110, 30, 90, 0, 50, 20, 100, 60, 40, 80]
+    route = plan_route([Position(str(x), x, 0) for x in xs])
+    assert len(route) == len(xs)
+    assert _cycle_time(route, MotionModel()) == pytest.approx(
+        _cycle_time([Position(str(x), x, 0) for x in sorted(xs)], MotionModel())
+    )
+
+
+def test_patrol_moves_relative_and_saves_views(camera, tmp_path):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    moves = []
+    control_ptz = c.control_ptz
+    c.control_ptz = lambda *args: moves.append(args[:2]) or control_ptz(*args)
+    positions = [Position("left", 10, 0), Position("right", 100, 20)]
+    p = Patrol(c, positions, tmp_path, FAST)
+    stats = p.run(rounds=2)
+    assert moves == [(-360, -360), (10, 0), (90, 20), (-90, -20), (90, 20)]
+    assert (stats.views, stats.rounds, stats.errors) == (4, 2, 0)
+    assert stats.views_per_minute > 0
+    assert len(list((tmp_path / "left").glob("*.jpeg"))) == 2
+    assert len(list((tmp_path / "right").glob("*.jpeg"))) == 2
+
+
+def test_positions_past_home_rejected(camera, tmp_path):
+    with pytest.raises(ValueError):
+        Patrol(MipcCameraClient(camera.host), [Position("x", -5, 0)], tmp_path)
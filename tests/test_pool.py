@@ -0,0 +1,54 @@
+import socket
+import time
+
+from fake_camera import FakeCamera
+from mipc_camera_client.pool import CameraConfig, MipcCameraPool
+from mipc_camera_client.throttle import Throttle
+
+
+def test_snapshot_all():
+    cameras = [FakeCamera(sn=f"cam{i}").start() for i in range(5)]
+    try:
+        configs = [CameraConfig(c.host, c.username, c.password) for c in cameras]
+        with MipcCameraPool(configs, max_workers=3, timeout=5) as pool:
+            assert all(e is None for e in pool.login_all().values())
+            snaps = pool.snapshot_all()
+    finally:
+        for c in cameras:
+            c.stop()
+    assert list(snaps) == [c.host for c in cameras]
+    assert all(s == cameras[0].jpeg for s in snaps.values())
+
+
+def test_dead_camera_does_not_stall_batch(camera):
+    # accepts connections but never answers
+    black_hole = socket.socket()
+    black_hole.bind(("127.0.0.1", 0))
+    black_hole.listen()
+    dead_host = "%s:%d" % black_hole.getsockname()
+    try:
+        pool = MipcCameraPool(
+            [
+                (dead_host, "admin", "x"),
+                (camera.host, camera.username, camera.password),
+            ],
+            timeout=0.5,
+        )
+        started = time.monotonic()
+        snaps = pool.snapshot_all()
+        pool.close()
+    finally:
+        black_hole.close()
+    assert time.monotonic() - started < 2
+    assert isinstance(snaps[dead_host], Exception)
+    assert snaps[camera.host] == camera.jpeg
+
+
+def test_connection_pool_sized_for_throttle():
+    def pool_maxsize(**kwargs):
+        with MipcCameraPool([("cam1", "admin", "pw")], **kwargs) as pool:
+            return pool.transport.session.get_adapter("http://cam1")._pool_maxsize
+
+    assert pool_maxsize(throttle=Throttle(max_in_flight=4)) == 4
+    assert pool_maxsize(throttle=Throttle(max_in_flight=1)) == 2
+    assert pool_maxsize(max_workers=8) == 8
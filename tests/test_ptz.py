@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.ptz import HOME_MOVE, PtzController
+
+
+@pytest.fixture
+def client(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    c.get_device_sn()
+    return c
+
+
+def test_merges_moves_queued_while_busy(client, camera):
+    camera.delay = 0.1
+    sent = []
+    control_ptz = client.control_ptz
+    client.control_ptz = lambda *args: sent.append(args) or control_ptz(*args)
+    with PtzController(client) as ptz:
+        ptz.move(1, 0)
+        time.sleep(0.02)
+        for _ in range(20):
+            ptz.move(2, -1, speed_x=30)
+        assert ptz.flush(timeout=2)
+        stats = ptz.stats
+    assert sent == [(1, 0, 48, 16), (40, -20, 30, 16)]
+    assert camera.count("ccm_ptz_ctl") == 2
+    assert (stats.sent, stats.merged, stats.dropped) == (2, 19, 0)
+    assert stats.latency.count == 2
+    assert stats.latency.max >= 0.1
+
+
+def test_drops_stale_moves_and_home_replaces_pending(client, camera):
+    camera.delay = 0.1
+    with PtzController(client, max_age=0.05) as ptz:
+        ptz.move(1, 1)
+        time.sleep(0.02)
+        ptz.move(5, 5)
+        assert ptz.flush(timeout=2)
+        assert ptz.stats.dropped == 1
+
+        ptz.move(1, 1)
+        time.sleep(0.02)
+        ptz.move(3, 3)
+        ptz.home()
+    stats = ptz.stats
+    assert stats.dropped == 2
+    assert stats.sent == 3
+    with pytest.raises(RuntimeError):
+        ptz.move(1, 1)
+
+
+def test_move_queued_behind_home_does_not_block(client, camera):
+    camera.delay = 0.1
+    sent = []
+    control_ptz = client.control_ptz
+    client.control_ptz = lambda *args: sent.append(args[:2]) or control_ptz(*args)
+    with PtzController(client) as ptz:
+        ptz.move(1, 0)
+        time.sleep(0.02)
+        ptz.home()
+        started = time.monotonic()
+        ptz.move(5, 5)
+        ptz.move(1, 1)
+        assert time.monotonic() - started < 0.05
+        assert ptz.flush(timeout=2)
+    assert sent == [(1, 0), HOME_MOVE, (6, 6)]
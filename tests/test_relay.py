@@ -0,0 +1,100 @@
+import http.client
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_camera import FakeCamera
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.relay import BOUNDARY, RelayServer
+
+
+def _client(cam):
+    c = MipcCameraClient(cam.host)
+    c.login(cam.username, cam.password)
+    return c
+
+
+@pytest.fixture
+def relay(camera):
+    with RelayServer([_client(camera)], port=0, interval=0.05) as r:
+        yield r
+
+
+def test_latest_with_etag(relay, camera):
+    with urllib.request.urlopen(f"{relay.url}/latest.jpg") as resp:
+        assert resp.read() == camera.jpeg
+        etag = resp.headers["ETag"]
+    with urllib.request.urlopen(f"{relay.url}/{camera.sn}/latest.jpg") as resp:
+        assert resp.headers["ETag"] == etag
+
+    req = urllib.request.Request(
+        f"{relay.url}/latest.jpg", headers={"If-None-Match": etag}
+    )
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(req)
+    assert e.value.code == 304
+
+    camera.jpeg = b"\xff\xd8changed\xff\xd9"
+    time.sleep(0.2)
+    with urllib.request.urlopen(req) as resp:
+        assert resp.read() == camera.jpeg
+        assert resp.headers["ETag"] != etag
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{relay.url}/nope/latest.jpg")
+    assert e.value.code == 404
+
+
+def test_viewers_share_one_poller(relay, camera):
+    before = camera.count("ccm_pic_get")
+    for _ in range(20):
+        with urllib.request.urlopen(f"{relay.url}/latest.jpg") as resp:
+            resp.read()
+    # 20 viewers, but the camera is still polled at the relay's own pace
+    assert camera.count("ccm_pic_get") - before < 20
+
+
+def test_mjpeg_stream_sends_changes_only(relay, camera):
+    host, port = relay.url.removeprefix("http://").split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=5)
+    conn.request("GET", "/stream.mjpeg")
+    resp = conn.getresponse()
+    assert resp.headers["Content-Type"].startswith("multipart/x-mixed-replace")
+
+    def read_part():
+        assert resp.readline() == f"--{BOUNDARY}\r\n".encode()
+        headers = {}
+        while (line := resp.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            headers[name.lower()] = value.strip()
+        data = resp.read(int(headers["content-length"]))
+        assert resp.readline() == b"\r\n"
+        return data
+
+    assert read_part() == camera.jpeg
+    time.sleep(0.2)
+    camera.jpeg = b"\xff\xd8next\xff\xd9"
+    # the unchanged frames polled in between were not sent
+    assert read_part() == camera.jpeg
+    conn.close()
+
+
+def test_multiple_cameras():
+    cams = [FakeCamera(sn=f"cam{i}").start() for i in range(2)]
+    try:
+        cams[1].jpeg = b"\xff\xd8second\xff\xd9"
+        with RelayServer([_client(c) for c in cams], port=0, interval=0.05) as relay:
+            with urllib.request.urlopen(f"{relay.url}/") as resp:
+                assert [
+                    l.split("\t")[0] for l in resp.read().decode().splitlines()
+                ] == [
+                    "cam0",
+                    "cam1",
+                ]
+            with urllib.request.urlopen(f"{relay.url}/cam1/latest.jpg") as resp:
+                assert resp.read() == cams[1].jpeg
+    finally:
+        for c in cams:
+            c.stop()
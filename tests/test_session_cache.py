@@ -0,0 +1,94 @@
+import pytest
+
+from mipc_camera_client import SEQ_BLOCK, MipcCameraClient, SessionExpiredError
+from mipc_camera_client.session_cache import SessionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SessionCache(tmp_path)
+
+
+def test_restore_skips_login(camera, cache):
+    c = MipcCameraClient(camera.host, session_cache=cache)
+    c.login(camera.username, camera.password)
+    c.get_image()
+    c.save_session()
+    assert camera.count("cacs_login_req") == 1
+
+    c2 = MipcCameraClient(camera.host, session_cache=cache)
+    c2.login(camera.username, camera.password)
+    assert c2.get_image() == camera.jpeg
+    assert c2.seq > c.seq
+    assert camera.count("cacs_dh_req") == 1
+    assert camera.count("cacs_login_req") == 1
+    assert camera.count("ccm_info_get") == 1
+
+
+def test_rejected_session_logs_in_again(camera, cache):
+    MipcCameraClient(camera.host, session_cache=cache).login(
+        camera.username, camera.password
+    )
+    camera.expire_sessions()
+
+    c = MipcCameraClient(camera.host, session_cache=cache)
+    c.login(camera.username, camera.password)
+    assert c.get_image() == camera.jpeg
+    assert camera.count("cacs_login_req") == 2
+    # the fresh session was written back
+    assert cache.load(camera.host, camera.username)["sid"] == c.sid
+
+
+def test_expired_without_credentials_raises(camera):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    c._credentials = None
+    camera.expire_sessions()
+    with pytest.raises(SessionExpiredError):
+        c.get_image()
+
+
+def test_ttl_and_keys(cache):
+    cache.save("h", "u", {"seq": 1, "created_at": 0})
+    assert cache.load("h", "u") is None
+    cache.save("h", "u", {"seq": 1})
+    assert cache.load("h", "u")["seq"] == 1
+    assert cache.load("h", "other") is None
+    cache.delete("h", "u")
+    assert cache.load("h", "u") is None
+
+
+def test_load_reserves_seq_blocks(cache):
+    cache.save("h", "u", {"sid": 7, "seq": 10})
+    first = cache.load("h", "u", reserve=100)["seq"]
+    second = cache.load("h", "u", reserve=100)["seq"]
+    assert (first, second) == (10, 110)
+    # saving an older seq doesn't hand out the reserved ones again
+    cache.save("h", "u", {"sid": 7, "seq": 50})
+    assert cache.load("h", "u")["seq"] == 210
+    assert cache.reserve_seq("h", "u", 7, 0, 10) == 210
+    assert cache.reserve_seq("h", "u", 8, 0, 10) is None
+
+
+def _seqs(client, n):
+    seqs = []
+    for _ in range(n):
+        client.nid()
+        seqs.append(client.seq)
+    return seqs
+
+
+def test_processes_sharing_a_session_never_reuse_seqs(camera, cache):
+    clients = [MipcCameraClient(camera.host, session_cache=cache) for _ in range(3)]
+    for c in clients:
+        c.login(camera.username, camera.password)
+    assert camera.count("cacs_login_req") == 1
+    used = [_seqs(c, SEQ_BLOCK + 10) for c in clients]
+    clients[0].save_session()
+    used.append(_seqs(clients[0], 5))
+    later = MipcCameraClient(camera.host, session_cache=cache)
+    later.login(camera.username, camera.password)
+    used.append(_seqs(later, 5))
+    flat = [seq for seqs in used for seq in seqs]
+    assert len(set(flat)) == len(flat)
+    assert later.get_image() == camera.jpeg
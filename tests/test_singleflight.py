@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mipc_camera_client.singleflight import SingleFlight
+
+
+def test_shares_result_and_error():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flights.do, "k", slow) for _ in range(4)]
+        while flights.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        assert [f.result() for f in futures] == [1, 1, 1, 1]
+    assert flights.do("k", slow) == 2
+
+    def boom():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        flights.do("k", boom)
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.throttle import HostLimiter, Throttle
+
+
+def test_rate_limit():
+    limiter = HostLimiter(rate=50, burst=2, max_in_flight=None)
+    started = time.monotonic()
+    for _ in range(7):
+        limiter.acquire().release()
+    # 2 from the burst, 5 more at 50/s
+    assert 0.09 < time.monotonic() - started < 0.3
+
+
+def test_priority_order():
+    limiter = HostLimiter(max_in_flight=1)
+    order = []
+    held = limiter.acquire()
+
+    def request(name, priority):
+        with limiter.acquire(priority):
+            order.append(name)
+
+    threads = []
+    for name, priority in [("pic1", 9), ("pic2", 9), ("ptz", 0)]:
+        t = threading.Thread(target=request, args=(name, priority))
+        t.start()
+        threads.append(t)
+        while limiter.stats.waiting < len(threads):
+            time.sleep(0.001)
+    held.release()
+    for t in threads:
+        t.join()
+    assert order == ["ptz", "pic1", "pic2"]
+
+
+def test_clients_share_the_cap(camera):
+    throttle = Throttle(max_in_flight=1)
+    clients = []
+    for _ in range(2):
+        c = MipcCameraClient(camera.host, throttle=throttle, coalesce=False)
+        c.login(camera.username, camera.password)
+        c.get_device_sn()
+        clients.append(c)
+    camera.delay = 0.05
+    started = time.monotonic()
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda i: clients[i % 2].get_image(), range(4)))
+    assert time.monotonic() - started >= 0.2
+    # streamed snapshots hold their slot until the body is read
+    assert clients[0].get_image_into(bytearray(1 << 20)) == len(camera.jpeg)
+    stats = throttle.limiter(camera.host).stats
+    assert stats.in_flight == 0
+    assert stats.acquired == 2 * 3 + 4 + 1
@@ -0,0 +1,72 @@
+import pytest
+
+from fake_camera import FakeCamera
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.grabber import Frame
+from mipc_camera_client.timelapse import FrameWriter, Timelapse
+
+
+def test_writer_rotates_into_dated_dirs(tmp_path):
+    with FrameWriter(tmp_path, fsync_every=2) as writer:
+        for i, ts in enumerate([0.0, 1.0, 86400.5]):
+            assert writer.submit("sn1", Frame(i, ts, 0.01, b"jpeg%d" % i))
+    assert writer.written == 3
+    files = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*.jpeg"))
+    assert files == [
+        "1970-01-01/1970-01-01T00-00-00.000000UTC_sn1.jpeg",
+        "1970-01-01/1970-01-01T00-00-01.000000UTC_sn1.jpeg",
+        "1970-01-02/1970-01-02T00-00-00.500000UTC_sn1.jpeg",
+    ]
+
+
+def test_writer_drops_when_full(tmp_path):
+    writer = FrameWriter(tmp_path, workers=0, queue_size=1)
+    assert writer.submit("sn", Frame(0, 0.0, 0.0, b"a"))
+    assert not writer.submit("sn", Frame(1, 1.0, 0.0, b"b"))
+    assert writer.dropped == 1
+
+
+def test_timelapse_multiple_cameras(tmp_path):
+    cameras = [FakeCamera(sn=f"cam{i}").start() for i in range(2)]
+    try:
+        clients = []
+        for cam in cameras:
+            c = MipcCameraClient(cam.host)
+            c.login(cam.username, cam.password)
+            clients.append(c)
+        writer = FrameWriter(tmp_path, rotate_format="")
+        t = Timelapse(clients, interval=0.05, writer=writer)
+        t.run(duration=0.3)
+        writer.close()
+    finally:
+        for cam in cameras:
+            cam.stop()
+    for i in range(2):
+        assert len(list(tmp_path.glob(f"*_cam{i}.jpeg"))) >= 4
+    assert t.capture_latency().count == writer.written
+    assert "written=" in t.report()
+
+
+def test_timelapse_keeps_going_when_sn_lookup_fails(camera, tmp_path):
+    c = MipcCameraClient(camera.host)
+    c.login(camera.username, camera.password)
+    get_device_sn = c.get_device_sn
+    calls = []
+
+    def flaky_sn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("camera went away")
+        return get_device_sn()
+
+    c.get_device_sn = flaky_sn
+    writer = FrameWriter(tmp_path, rotate_format="")
+    t = Timelapse([c], interval=0.05, writer=writer)
+    t.run(duration=0.3)
+    writer.close()
+    assert len(list(tmp_path.glob(f"*_{camera.sn}.jpeg"))) >= 3
+
+
+def test_timelapse_rejects_non_positive_interval(tmp_path):
+    with pytest.raises(ValueError):
+        Timelapse([], interval=0, writer=FrameWriter(tmp_path, workers=0))
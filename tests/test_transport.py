@@ -0,0 +1,41 @@
+import requests
+
+from fake_camera import FakeCamera
+from mipc_camera_client import MipcCameraClient
+from mipc_camera_client.transport import Transport
+
+
+def test_shared_transport_reuses_connections():
+    cameras = [FakeCamera(sn=f"cam{i}").start() for i in range(3)]
+    try:
+        transport = Transport(pool_connections=3, pool_maxsize=1)
+        clients = [MipcCameraClient(c.host, transport=transport) for c in cameras]
+        for cam, client in zip(cameras, clients):
+            client.login(cam.username, cam.password)
+            for _ in range(5):
+                client.get_image()
+    finally:
+        for c in cameras:
+            c.stop()
+    stats = transport.stats
+    # dh, login, info and 5 snapshots per camera over one connection each
+    assert stats.requests == 3 * 8
+    assert stats.connections == 3
+    assert stats.reused == 3 * 7
+
+
+def test_injected_session_and_timeout(camera):
+    session = requests.Session()
+    c = MipcCameraClient(camera.host, transport=session, timeout=1.5)
+    assert c.transport.session is session
+    assert c.timeout == 1.5
+    c.login(camera.username, camera.password)
+    assert c.get_image() == camera.jpeg
+
+
+def test_keep_alive_off(camera):
+    transport = Transport(keep_alive=False)
+    c = MipcCameraClient(camera.host, transport=transport)
+    assert transport.session.headers["Connection"] == "close"
+    c.login(camera.username, camera.password)
+    assert c.get_image() == camera.jpeg